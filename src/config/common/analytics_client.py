@@ -36,21 +36,45 @@ class Client(object):
 
     def request(self, path, fqdn_uuid, user_token=None,
                 data=None):
+        resp = self._get(path, fqdn_uuid, user_token, data)
+        return resp.json()
+
+    def conditional_request(self, path, fqdn_uuid, etag=None,
+                            user_token=None, data=None):
+        """Same as request but only returns the content if it changed since
+        the response tagged etag was received.
+
+        Returns the ETag of the response (None if the server does not tag
+        its responses) and the content, None if not modified.
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        resp = self._get(path, fqdn_uuid, user_token, data, headers,
+                         ok_status=(200, 304))
+        if resp.status_code == 304:
+            return etag, None
+        return resp.headers.get('ETag'), resp.json()
+
+    def _get(self, path, fqdn_uuid, user_token, data, headers=None,
+             ok_status=(200,)):
         req_data = dict(self.data)
         if data:
             req_data.update(data)
 
         req_params = self._get_req_params(user_token, data=req_data)
+        if headers:
+            req_params['headers'].update(headers)
 
         url = urlparse.urljoin(self.endpoint, path + fqdn_uuid)
         resp = requests.get(url, **req_params)
 
-        if resp.status_code != 200:
+        if resp.status_code not in ok_status:
             raise OpenContrailAPIFailed(
                 ('Opencontrail API returned %(status)s %(reason)s') %
                 {'status': resp.status_code, 'reason': resp.reason})
 
-        return resp.json()
+        return resp
 
     def _get_req_params(self, user_token, data=None):
         req_params = {
@@ -83,3 +83,21 @@ class TestOpenContrailClient(unittest.TestCase):
                          'key3': 'value3',
                          'key4': 'value4'}
         self.assertEqual(expected_data, data)
+
+    def test_analytics_conditional_request(self):
+        self.get_resp.headers = {'ETag': '"v1"'}
+        self.get_resp.json.return_value = {'value': []}
+        etag, content = self.client.conditional_request('/fake/path/',
+                                                        'fake_uuid')
+        self.assertEqual(etag, '"v1"')
+        self.assertEqual(content, {'value': []})
+        headers = self.get.call_args_list[0][1]['headers']
+        self.assertNotIn('If-None-Match', headers)
+
+        self.get_resp.status_code = 304
+        etag, content = self.client.conditional_request(
+            '/fake/path/', 'fake_uuid', etag=etag)
+        self.assertEqual(etag, '"v1"')
+        self.assertIsNone(content)
+        headers = self.get.call_args_list[1][1]['headers']
+        self.assertEqual(headers['If-None-Match'], '"v1"')
@@ -375,6 +375,24 @@ class DBBase(object):
             return []
         return objs
 
+    @classmethod
+    def list_obj_pages(cls, obj_type=None, fields=None, page_size=1000):
+        # Same as list_obj but reads the objects page_size at a time so that
+        # the caller can process (and release) each page before the next one
+        obj_type = obj_type or cls.obj_type
+        ok, result, _ = cls._object_db.object_list(obj_type)
+        if not ok:
+            return
+        uuids = [uuid for _, uuid in result]
+        for i in range(0, len(uuids), page_size):
+            ok, objs = cls._object_db.object_read(
+                obj_type, uuids[i:i + page_size], field_names=fields)
+            if not ok:
+                cls._logger.error('Cannot read %s page %d, error %s' %
+                                  (obj_type, i / page_size, objs))
+                continue
+            yield objs
+
     @classmethod
     def list_vnc_obj(cls, obj_type=None, fields=None):
         obj_type = obj_type or cls.obj_type
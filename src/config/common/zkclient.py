@@ -506,12 +506,13 @@ class ZookeeperClient(object):
     def quota_counter(self, path, max_count=sys.maxint, default=0):
         return ZookeeperCounter(self._zk_client, path, max_count, default=default)
 
-    def create_node(self, path, value=None):
+    def create_node(self, path, value=None, ephemeral=False):
         try:
             if value is None:
                 value = uuid.uuid4()
             retry = self._retry.copy()
-            retry(self._zk_client.create, path, str(value), makepath=True)
+            retry(self._zk_client.create, path, str(value), makepath=True,
+                  ephemeral=ephemeral)
         except kazoo.exceptions.NodeExistsError:
             current_value = self.read_node(path)
             if current_value == value:
@@ -547,6 +548,17 @@ class ZookeeperClient(object):
             return []
     # end read_node
 
+    def watch_children(self, path, func):
+        # func is called with the list of children now and on every change
+        retry = self._retry.copy()
+        retry(self._zk_client.ensure_path, path)
+        return self._zk_client.ChildrenWatch(path, func)
+    # end watch_children
+
+    def lock(self, path, identifier=None):
+        return self._zk_client.Lock(path, identifier)
+    # end lock
+
     def exists(self, path):
         try:
             retry = self._retry.copy()
@@ -10,6 +10,8 @@ from device_conf import DeviceConf
 from dm_utils import PushConfigState
 from dm_utils import DMUtils
 from dm_utils import DMIndexer
+from dm_utils import PushLimiter
+from dm_utils import DMPartition
 from sandesh.dm_introspect import ttypes as sandesh
 from cfgm_common.vnc_db import DBBase
 from cfgm_common.uve.physical_router.ttypes import *
@@ -104,6 +106,11 @@ class PhysicalRouterDM(DBBaseDM):
         self.vn_ip_map = {'irb': {}, 'lo0': {}}
         self.ae_id_map = {}
         self.config_sent = False
+        # whether the next push is for a config change or a re-push
+        self.config_changed = False
+        self.push_priority = PushLimiter.PRIORITY_REPUSH
+        # with partitioned device managers, only the owner pushes config
+        self.owned = DMPartition.owns(uuid)
         self.ae_index_allocator = DMIndexer(
                         DMUtils.get_max_ae_device_count(), DMIndexer.ALLOC_DECREMENT)
         self.init_cs_state()
@@ -204,10 +211,14 @@ class PhysicalRouterDM(DBBaseDM):
             if self.nc_q.get(True, timeout) is not None:
                 self.set_config_state()
         except queue.Empty:
-            self.set_config_state()
+            self.set_config_state(repush=True)
     # end block_and_set_config_state
 
-    def set_config_state(self):
+    def set_config_state(self, repush=False):
+        if not self.owned:
+            return
+        if not repush:
+            self.config_changed = True
         try:
             self.nc_q.put_nowait(1)
         except queue.Full:
@@ -216,12 +227,77 @@ class PhysicalRouterDM(DBBaseDM):
 
     def nc_handler(self):
         while self.nc_q.get() is not None:
+            if self.owned:
+                self.push_priority = PushLimiter.PRIORITY_CHANGE \
+                    if self.config_changed else PushLimiter.PRIORITY_REPUSH
+                self.config_changed = False
+                try:
+                    # waits for the previous owner to be done with the router
+                    with DMPartition.lock(self.uuid):
+                        if self.owned:
+                            self.push_config()
+                except Exception as e:
+                    tb = traceback.format_exc()
+                    self._logger.error("Exception: " + str(e) + tb)
+            if not self.owned:
+                # another device manager took the router over
+                if self.config_manager:
+                    self.config_manager.device_disconnect()
+                self.set_conf_sent_state(False)
+    # end
+
+    def hand_over(self):
+        self.owned = False
+        self.config_changed = False
+        # drop the pending push and wake nc_handler up to close the device
+        # session once the push in progress, if any, is done
+        try:
+            self.nc_q.get_nowait()
+        except queue.Empty:
+            pass
+        self.nc_q.put_nowait(1)
+        self.uve_send(True)
+    # end hand_over
+
+    def take_over(self):
+        # the previous owner may have changed the allocations of the router
+        self.vn_ip_map = {'irb': {}, 'lo0': {}}
+        self.ae_id_map = {}
+        self.ae_index_allocator = DMIndexer(
+                        DMUtils.get_max_ae_device_count(), DMIndexer.ALLOC_DECREMENT)
+        self.init_cs_state()
+        self.owned = True
+        self.set_config_state(repush=True)
+        self.uve_send()
+    # end take_over
+
+    @classmethod
+    def rebalance(cls):
+        gained = []
+        lost = []
+        for pr in cls.values():
+            owned = DMPartition.owns(pr.uuid)
+            if owned and not pr.owned:
+                gained.append(pr)
+            elif pr.owned and not owned:
+                lost.append(pr)
+        if not gained and not lost:
+            return
+        cls._logger.info("Device Manager members %s: taking over %d, "
+                         "handing over %d physical routers" % (
+                             DMPartition.get_members(), len(gained),
+                             len(lost)))
+        for pr in lost:
+            pr.hand_over()
+        if gained:
+            cls._object_db.reload_pr_maps()
+        for pr in gained:
             try:
-                self.push_config()
+                pr.take_over()
             except Exception as e:
                 tb = traceback.format_exc()
-                self._logger.error("Exception: " + str(e) + tb)
-    # end
+                cls._logger.error("Exception: " + str(e) + tb)
+    # end rebalance
 
     def is_valid_ip(self, ip_str):
         try:
@@ -422,7 +498,8 @@ class PhysicalRouterDM(DBBaseDM):
                 self.uve_send()
                 return False
             # user must have unset the vnc managed property
-            self.config_manager.push_conf(is_delete=True)
+            with PushLimiter.slot(self.push_priority):
+                self.config_manager.push_conf(is_delete=True)
             if self.config_manager.retry():
                 # failed commit: set repush interval upto max value
                 self.config_repush_interval = min([2 * self.config_repush_interval,
@@ -521,8 +598,14 @@ class PhysicalRouterDM(DBBaseDM):
                   "device configuration=%s" % (self.uuid, \
                            str(self.config_manager.get_device_config())))
             return
-        config_size = self.config_manager.push_conf()
+        commits_skipped = self.config_manager.get_commit_stats().get(
+            'total_commits_skipped_since_up', 0)
+        with PushLimiter.slot(self.push_priority):
+            config_size = self.config_manager.push_conf()
         if not config_size:
+            if commits_skipped != self.config_manager.get_commit_stats().get(
+                    'total_commits_skipped_since_up', 0):
+                self.uve_send()
             return
         self.set_conf_sent_state(True)
         self.uve_send()
@@ -553,6 +636,8 @@ class PhysicalRouterDM(DBBaseDM):
     # end is_service_port_id_valid
 
     def uve_send(self, deleted=False):
+        if not deleted and not self.owned:
+            return
         pr_trace = UvePhysicalRouterConfig(
             name=self.name,
             ip_address=self.management_ip,
@@ -581,6 +666,8 @@ class PhysicalRouterDM(DBBaseDM):
                    commit_stats.get('commit_status_message', '')
             pr_trace.total_commits_sent_since_up = \
                    commit_stats.get('total_commits_sent_since_up', 0)
+            pr_trace.total_commits_skipped_since_up = \
+                   commit_stats.get('total_commits_skipped_since_up', 0)
         else:
             pr_trace.netconf_enabled_status = False
 
@@ -1518,6 +1605,8 @@ class DMCassandraDB(VncObjectDBClient):
     _PNF_MAX_UNIT = 16385
     _PNF_UNIT_ALLOC_PATH = "/id/pnf/unit_id"
 
+    _PNF_ALLOC_LOCK_PATH = "/id/pnf/alloc_lock"
+
     dm_object_db_instance = None
 
     @classmethod
@@ -1605,7 +1694,21 @@ class DMCassandraDB(VncObjectDBClient):
             return None
         if si_id in self.pnf_resources_map:
             return self.pnf_resources_map[si_id]
+        if not DMPartition.is_partitioned():
+            return self._alloc_pnf_resources(si_id, pi_id, pr_id)
+
+        # the routers of the service instance may be owned by other device
+        # managers, the first one allocates the resources
+        with self._zkclient.lock(self._zk_path_pfx + self._PNF_ALLOC_LOCK_PATH,
+                                 DMPartition.get_member_id()):
+            pnf_resources = self.pnf_cf.multiget([si_id]).get(si_id)
+            if pnf_resources:
+                self.pnf_resources_map[si_id] = pnf_resources
+                return pnf_resources
+            return self._alloc_pnf_resources(si_id, pi_id, pr_id)
+    # end
 
+    def _alloc_pnf_resources(self, si_id, pi_id, pr_id):
         network_id = self.pnf_network_allocator.alloc(si_id)
         vlan_alloc = self.get_pnf_vlan_allocator(pr_id)
         try:
@@ -1695,6 +1798,15 @@ class DMCassandraDB(VncObjectDBClient):
                 self.pr_ae_id_map[pr_uuid][esi] = ae_id
     # end
 
+    def reload_pr_maps(self):
+        # the routers owned by other device managers are updated behind our
+        # back, re-read their state before taking them over
+        self.pr_vn_ip_map = {}
+        self.pr_ae_id_map = {}
+        self.init_pr_map()
+        self.init_pr_ae_map()
+    # end
+
     def get_ip(self, key, ip_used_for):
         return self.get_one_col(self._PR_VN_IP_CF, key,
                       DMUtils.get_ip_cs_column_name(ip_used_for))
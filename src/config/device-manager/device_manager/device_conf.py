@@ -46,6 +46,7 @@ class DeviceConf(object):
             'last_commit_duration': '',
             'commit_status_message': '',
             'total_commits_sent_since_up': 0,
+            'total_commits_skipped_since_up': 0,
         }
         self.device_connect()
     # end __init__
@@ -173,6 +174,11 @@ class DeviceConf(object):
         pass
     # end device_disconnect
 
+    def device_probe(self):
+        """check that the device connection is alive, close it if not"""
+        return True
+    # end device_probe
+
     @abc.abstractmethod
     def retry(self):
         """Should I retry to send conf"""
@@ -20,6 +20,7 @@ import time
 import hashlib
 import signal
 import random
+import uuid
 import traceback
 from pprint import pformat
 
@@ -47,6 +48,9 @@ from db import DBBaseDM, BgpRouterDM, PhysicalRouterDM, PhysicalInterfaceDM,\
     NetworkDeviceConfigDM, E2ServiceProviderDM, PeeringPolicyDM
 from dm_amqp import DMAmqpHandle
 from dm_utils import PushConfigState
+from dm_utils import PushLimiter
+from dm_utils import DeviceSessionPool
+from dm_utils import DMPartition
 from device_conf import DeviceConf
 from cfgm_common.dependency_tracker import DependencyTracker
 from cfgm_common import vnc_cgitb
@@ -205,6 +209,12 @@ class DeviceManager(object):
         PushConfigState.set_push_delay_per_kb(float(self._args.push_delay_per_kb))
         PushConfigState.set_push_delay_max(int(self._args.push_delay_max))
         PushConfigState.set_push_delay_enable(bool(self._args.push_delay_enable))
+        PushConfigState.set_max_incremental_pushes(
+            int(self._args.max_incremental_pushes))
+        PushLimiter.set_max_parallel_pushes(
+            int(self._args.max_parallel_pushes))
+        DeviceSessionPool.set_keepalive_interval(
+            int(self._args.netconf_keepalive_interval))
 
         self._chksum = "";
         if self._args.collectors:
@@ -212,6 +222,7 @@ class DeviceManager(object):
 
         # Initialize logger
         self.logger = dm_logger or DeviceManagerLogger(args)
+        DeviceSessionPool.set_logger(self.logger)
 
         # Register Plugins
         try:
@@ -255,6 +266,7 @@ class DeviceManager(object):
         self._object_db = DMCassandraDB.get_instance(self, _zookeeper_client)
         DBBaseDM.init(self, self.logger, self._object_db)
         DBBaseDM._sandesh = self.logger._sandesh
+        DMPartition.set_rebalance_cb(PhysicalRouterDM.rebalance)
 
         for obj in GlobalSystemConfigDM.list_obj():
             GlobalSystemConfigDM.locate(obj['uuid'], obj)
@@ -344,7 +356,7 @@ class DeviceManager(object):
             PeeringPolicyDM.locate(obj['uuid'], obj)
 
         for pr in PhysicalRouterDM.values():
-            pr.set_config_state()
+            pr.set_config_state(repush=True)
 
         DeviceManager._device_manager = self
         self._vnc_amqp._db_resync_done.set()
@@ -365,6 +377,7 @@ class DeviceManager(object):
         if not inst:
             return
         inst._vnc_amqp.close()
+        DMPartition.set_rebalance_cb(None)
         for obj_cls in DBBaseDM.get_obj_type_map().values():
             obj_cls.reset()
         DBBase.clear()
@@ -426,6 +439,10 @@ def parse_args(args_str):
                          --push_delay_per_kb 0.01
                          --push_delay_max 100
                          --push_delay_enable True
+                         --max_incremental_pushes 20
+                         --max_parallel_pushes 20
+                         --netconf_keepalive_interval 60
+                         --partitioned False
                          [--reset_config]
     '''
 
@@ -466,6 +483,10 @@ def parse_args(args_str):
         'push_delay_per_kb': '0.01',
         'push_delay_max': '100',
         'push_delay_enable': True,
+        'max_incremental_pushes': '20',
+        'max_parallel_pushes': '20',
+        'netconf_keepalive_interval': '60',
+        'partitioned': False,
         'rabbit_use_ssl': False,
         'kombu_ssl_version': '',
         'kombu_ssl_keyfile': '',
@@ -579,6 +600,20 @@ def parse_args(args_str):
                         help="max time delay between two successful commits")
     parser.add_argument("--push_delay_enable",
                         help="enable delay between two successful commits")
+    parser.add_argument("--max_incremental_pushes",
+                        help="number of config pushes sending only the changes "
+                             "before the full config is pushed again, 0 always "
+                             "pushes the full config")
+    parser.add_argument("--max_parallel_pushes",
+                        help="max number of routers pushing config at the "
+                             "same time, 0 for no limit")
+    parser.add_argument("--netconf_keepalive_interval",
+                        help="idle time in seconds after which a netconf "
+                             "session is probed, 0 disables the probes")
+    parser.add_argument("--partitioned",
+                        help="run active with the other device managers, "
+                             "each one owning a share of the physical "
+                             "routers, instead of electing a master")
     parser.add_argument("--cassandra_user",
                         help="Cassandra user name")
     parser.add_argument("--cassandra_password",
@@ -589,6 +624,8 @@ def parse_args(args_str):
         args.cassandra_server_list = args.cassandra_server_list.split()
     if type(args.collectors) is str:
         args.collectors = args.collectors.split()
+    if type(args.partitioned) is str:
+        args.partitioned = args.partitioned.lower() == 'true'
     args.sandesh_config = SandeshConfig.from_parser_arguments(args)
 
     args.conf_file = saved_conf_file
@@ -627,6 +664,15 @@ def main(args_str=None):
 
     _zookeeper_client = ZookeeperClient(client_pfx+"device-manager",
                                         args.zk_server_ip)
+    if args.partitioned:
+        DMPartition.init(_zookeeper_client,
+                         zk_path_pfx+"/device-manager-members",
+                         zk_path_pfx+"/device-manager-locks",
+                         '%s:%s' % (socket.gethostname(), uuid.uuid4()))
+        dm_logger.notice("Joined the Device Manager members %s" %
+                         DMPartition.get_members())
+        run_device_manager(dm_logger, args)
+        return
     dm_logger.notice("Waiting to be elected as master...")
     _zookeeper_client.master_election(zk_path_pfx+"/device-manager",
                                       os.getpid(), run_device_manager,
@@ -635,7 +681,8 @@ def main(args_str=None):
 
 
 def run_device_manager(dm_logger, args):
-    dm_logger.notice("Elected master Device Manager node. Initializing... ")
+    if not DMPartition.is_partitioned():
+        dm_logger.notice("Elected master Device Manager node. Initializing... ")
     dm_logger.introspect_init()
     DeviceManager(dm_logger, args)
 # end run_device_manager
@@ -6,8 +6,21 @@
 This file contains  utility methods used by device manager module
 """
 
+import bisect
+import contextlib
+import copy
+import hashlib
+import heapq
+import itertools
+import os
+import time
+import gevent
+import gevent.event
+import gevent.pool
+from cfgm_common.exceptions import ResourceExistsError
 from netaddr import IPNetwork
 from bitarray import bitarray
+from lxml import etree
 
 class PushConfigState(object):
     PUSH_STATE_INIT = 0
@@ -18,6 +31,7 @@ class PushConfigState(object):
     PUSH_DELAY_PER_KB = 0.01
     PUSH_DELAY_MAX = 100
     PUSH_DELAY_ENABLE = True
+    MAX_INCREMENTAL_PUSHES = 20
 
     @classmethod
     def set_repush_interval(cls, value):
@@ -44,6 +58,11 @@ class PushConfigState(object):
         cls.PUSH_DELAY_ENABLE = value
     # end set_push_delay_enable
 
+    @classmethod
+    def set_max_incremental_pushes(cls, value):
+        cls.MAX_INCREMENTAL_PUSHES = value
+    # end set_max_incremental_pushes
+
     @classmethod
     def get_repush_interval(cls):
         return cls.REPUSH_INTERVAL
@@ -69,8 +88,478 @@ class PushConfigState(object):
         return cls.PUSH_DELAY_ENABLE
     # end get_push_delay_enable
 
+    @classmethod
+    def get_max_incremental_pushes(cls):
+        return cls.MAX_INCREMENTAL_PUSHES
+    # end get_max_incremental_pushes
+
 # end PushConfigState
 
+
+class ConfigDiff(object):
+    """Structural diff of two netconf configuration trees.
+
+    The diff is a tree to be merged into the old configuration to get the
+    new one: added and changed elements are copied from the new tree and
+    removed ones are marked with operation="delete". Elements are matched
+    by tag and by their <name> child (or their text for leaf lists), an
+    element whose children can not be matched that way is replaced as a
+    whole.
+
+    The order of some lists matters (e.g. the terms of a firewall filter or
+    of a policy statement), while a merge keeps the existing elements in
+    place and appends the added ones. An element whose ordered children
+    were reordered, or got new ones before existing ones, is replaced as a
+    whole too.
+    """
+    _ORDERED_TAGS = frozenset(['term'])
+
+    @classmethod
+    def diff(cls, old, new):
+        """Return the diff element of two trees, None if they are equal"""
+        old_children = cls._index(old)
+        new_children = cls._index(new)
+        if old_children is None or new_children is None:
+            return cls._replace(new)
+        if not cls._order_kept(old_children, new_children):
+            return cls._replace(new)
+        old_by_key = dict(old_children)
+        changes = []
+        for key, child in new_children:
+            old_child = old_by_key.get(key)
+            if old_child is None:
+                changes.append(copy.deepcopy(child))
+            elif cls._attrib(child) != cls._attrib(old_child):
+                changes.append(cls._replace(child))
+            elif len(child) == 0 and len(old_child) == 0:
+                if (child.text or '').strip() != (old_child.text or '').strip():
+                    changes.append(copy.deepcopy(child))
+            elif len(child) == 0 or len(old_child) == 0:
+                changes.append(cls._replace(child))
+            elif (etree.tostring(child, with_tail=False) ==
+                    etree.tostring(old_child, with_tail=False)):
+                # most of the config does not change between two pushes,
+                # skip the unchanged subtrees without walking them
+                continue
+            else:
+                child_diff = cls.diff(old_child, child)
+                if child_diff is not None:
+                    changes.append(child_diff)
+        new_keys = set(key for key, _ in new_children)
+        for key, old_child in old_children:
+            if key not in new_keys:
+                changes.append(cls._delete(old_child, key))
+        if not changes:
+            return None
+        ele = etree.Element(new.tag, cls._attrib(new), nsmap=new.nsmap)
+        name = new.find('name')
+        if name is not None:
+            ele.append(copy.deepcopy(name))
+        ele.extend(changes)
+        return ele
+    # end diff
+
+    @staticmethod
+    def _attrib(ele):
+        return dict((k, v) for k, v in ele.attrib.items() if k != 'operation')
+    # end _attrib
+
+    @staticmethod
+    def _index(ele):
+        # key the children by tag and name (or text for leaves repeated in a
+        # leaf list), None if some children can not be told apart
+        tags = {}
+        for child in ele:
+            tags[child.tag] = tags.get(child.tag, 0) + 1
+        children = []
+        keys = set()
+        for child in ele:
+            if not isinstance(child.tag, basestring):
+                # xml comments
+                continue
+            name = child.find('name')
+            if name is not None:
+                key = (child.tag, name.text, None)
+            elif len(child) == 0 and tags[child.tag] > 1:
+                key = (child.tag, None, (child.text or '').strip())
+            else:
+                key = (child.tag, None, None)
+            if key in keys:
+                return None
+            keys.add(key)
+            children.append((key, child))
+        return children
+    # end _index
+
+    @classmethod
+    def _order_kept(cls, old_children, new_children):
+        # whether merging the diff keeps the ordered children in the new
+        # order: the kept ones in the same order, followed by the added ones
+        old_keys = [key for key, _ in old_children
+                    if key[0] in cls._ORDERED_TAGS]
+        if not old_keys:
+            return True
+        new_keys = [key for key, _ in new_children
+                    if key[0] in cls._ORDERED_TAGS]
+        old_key_set = set(old_keys)
+        new_key_set = set(new_keys)
+        kept = [key for key in new_keys if key in old_key_set]
+        if kept != [key for key in old_keys if key in new_key_set]:
+            return False
+        return new_keys[:len(kept)] == kept
+    # end _order_kept
+
+    @staticmethod
+    def _replace(ele):
+        ele = copy.deepcopy(ele)
+        ele.set('operation', 'replace')
+        return ele
+    # end _replace
+
+    @staticmethod
+    def _delete(ele, key):
+        deleted = etree.Element(ele.tag, operation='delete')
+        name = ele.find('name')
+        if name is not None:
+            deleted.append(copy.deepcopy(name))
+        elif key[2] is not None:
+            deleted.text = ele.text
+        return deleted
+    # end _delete
+
+# end ConfigDiff
+
+
+class PushLimiter(object):
+    """Bounds the number of physical routers pushing config at the same time.
+
+    Routers whose config changed get the free slots before the routers
+    re-pushing their config (resync at startup, retry after a failure).
+    """
+    PRIORITY_CHANGE = 0
+    PRIORITY_REPUSH = 1
+    # 0: no limit
+    _max_parallel_pushes = 0
+    _active = 0
+    _waiters = []
+    _seq = itertools.count()
+
+    @classmethod
+    def set_max_parallel_pushes(cls, value):
+        cls._max_parallel_pushes = value
+    # end set_max_parallel_pushes
+
+    @classmethod
+    def get_active(cls):
+        return cls._active
+    # end get_active
+
+    @classmethod
+    def get_waiting(cls):
+        return len(cls._waiters)
+    # end get_waiting
+
+    @classmethod
+    def acquire(cls, priority=PRIORITY_CHANGE):
+        if cls._max_parallel_pushes <= 0 or (
+                cls._active < cls._max_parallel_pushes and not cls._waiters):
+            cls._active += 1
+            return
+        waiter = [priority, next(cls._seq), gevent.event.Event()]
+        heapq.heappush(cls._waiters, waiter)
+        try:
+            waiter[2].wait()
+        except BaseException:
+            # killed while waiting, e.g. the router was deleted
+            if waiter[2].is_set():
+                cls.release()
+            else:
+                cls._waiters.remove(waiter)
+                heapq.heapify(cls._waiters)
+            raise
+    # end acquire
+
+    @classmethod
+    def release(cls):
+        if cls._waiters:
+            # hand the slot over to the next waiter
+            heapq.heappop(cls._waiters)[2].set()
+            return
+        cls._active -= 1
+    # end release
+
+    @classmethod
+    @contextlib.contextmanager
+    def slot(cls, priority=PRIORITY_CHANGE):
+        cls.acquire(priority)
+        try:
+            yield
+        finally:
+            cls.release()
+    # end slot
+
+# end PushLimiter
+
+
+class DeviceSessionPool(object):
+    """Keeps the device sessions alive: the sessions idle for longer than the
+    keepalive interval are probed, the broken ones are closed and reopened by
+    the next push. The sessions are probed concurrently, so that a device
+    slow to answer does not delay the probes of the others.
+    """
+    # 0: no keepalive
+    _keepalive_interval = 0
+    _max_parallel_probes = 64
+    _devices = {}
+    _keepalive_gl = None
+    _logger = None
+
+    @classmethod
+    def set_keepalive_interval(cls, value):
+        cls._keepalive_interval = value
+    # end set_keepalive_interval
+
+    @classmethod
+    def set_logger(cls, logger):
+        cls._logger = logger
+    # end set_logger
+
+    @classmethod
+    def register(cls, device):
+        cls._devices[id(device)] = device
+        if cls._keepalive_interval > 0 and cls._keepalive_gl is None:
+            cls._keepalive_gl = gevent.spawn(cls._keepalive)
+    # end register
+
+    @classmethod
+    def unregister(cls, device):
+        cls._devices.pop(id(device), None)
+    # end unregister
+
+    @classmethod
+    def size(cls):
+        return len(cls._devices)
+    # end size
+
+    @classmethod
+    def probe_idle_sessions(cls):
+        now = time.time()
+        pool = gevent.pool.Pool(cls._max_parallel_probes)
+        for device in cls._devices.values():
+            if device.session_in_use or \
+                    now - device.last_used < cls._keepalive_interval:
+                continue
+            pool.spawn(cls._probe_session, device)
+        pool.join()
+    # end probe_idle_sessions
+
+    @classmethod
+    def _probe_session(cls, device):
+        try:
+            if not device.device_probe():
+                cls.unregister(device)
+        except Exception as e:
+            cls._log_error("netconf session probe of %s failed: %s" %
+                           (getattr(device, 'management_ip', None), str(e)))
+    # end _probe_session
+
+    @classmethod
+    def _keepalive(cls):
+        while True:
+            gevent.sleep(cls._keepalive_interval)
+            try:
+                cls.probe_idle_sessions()
+            except Exception as e:
+                cls._log_error("netconf session keepalive failed: %s" %
+                               str(e))
+    # end _keepalive
+
+    @classmethod
+    def _log_error(cls, msg):
+        if cls._logger:
+            cls._logger.error(msg)
+    # end _log_error
+
+# end DeviceSessionPool
+
+
+class ConsistentHashRing(object):
+    """Maps keys to a set of members so that a member joining or leaving
+    only moves the keys it gains or loses.
+    """
+
+    def __init__(self, members=None, replicas=100):
+        self._replicas = replicas
+        self._members = set()
+        self._hashes = []
+        self._owners = []
+        self.set_members(members or [])
+    # end __init__
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key).hexdigest()[:16], 16)
+    # end _hash
+
+    def set_members(self, members):
+        points = sorted((self._hash('%s-%d' % (member, replica)), member)
+                        for member in set(members)
+                        for replica in range(self._replicas))
+        self._members = set(members)
+        self._hashes = [point[0] for point in points]
+        self._owners = [point[1] for point in points]
+    # end set_members
+
+    def get_members(self):
+        return sorted(self._members)
+    # end get_members
+
+    def get_member(self, key):
+        if not self._hashes:
+            return None
+        idx = bisect.bisect(self._hashes, self._hash(key))
+        return self._owners[idx % len(self._owners)]
+    # end get_member
+
+# end ConsistentHashRing
+
+
+class DMPartition(object):
+    """Splits the physical routers between the device managers running in
+    partitioned mode. Each device manager registers an ephemeral node under
+    the members path, the routers are spread on the live members with a
+    consistent hash and rebalanced whenever a member joins or leaves.
+    The config pushes of a router are done under a per router lock, so that
+    a new owner waits for the previous one to be done with the router.
+
+    Until init() is called (master election mode) every router is owned.
+    """
+    _ring = None
+    _member_id = None
+    _zk_client = None
+    _members_path = None
+    _locks_path = None
+    _rebalance_cb = None
+    _rebalance_gl = None
+    _rebalance_needed = False
+
+    @classmethod
+    def init(cls, zk_client, members_path, locks_path, member_id):
+        # member_id must be unique to the process, two device managers can
+        # run on the same host
+        cls._zk_client = zk_client
+        cls._members_path = members_path
+        cls._locks_path = locks_path
+        cls._member_id = member_id
+        cls._ring = ConsistentHashRing()
+        cls._register()
+        zk_client.watch_children(members_path, cls._members_changed)
+    # end init
+
+    @classmethod
+    def reset(cls):
+        # back to owning every router
+        cls._ring = None
+        cls._member_id = None
+        cls._zk_client = None
+        cls._members_path = None
+        cls._locks_path = None
+        cls._schedule_rebalance()
+    # end reset
+
+    @classmethod
+    def is_partitioned(cls):
+        return cls._ring is not None
+    # end is_partitioned
+
+    @classmethod
+    def get_member_id(cls):
+        return cls._member_id
+    # end get_member_id
+
+    @classmethod
+    def get_members(cls):
+        if cls._ring is None:
+            return []
+        return cls._ring.get_members()
+    # end get_members
+
+    @classmethod
+    def set_rebalance_cb(cls, rebalance_cb=None):
+        # called, from its own greenlet, after the members changed
+        cls._rebalance_cb = rebalance_cb
+    # end set_rebalance_cb
+
+    @classmethod
+    def owns(cls, key):
+        if cls._ring is None:
+            return True
+        return cls._ring.get_member(key) == cls._member_id
+    # end owns
+
+    @classmethod
+    @contextlib.contextmanager
+    def lock(cls, key):
+        zk_client = cls._zk_client
+        if zk_client is None:
+            yield
+            return
+        with zk_client.lock(cls._locks_path + '/' + key, cls._member_id):
+            yield
+    # end lock
+
+    @classmethod
+    def _register(cls):
+        path = cls._members_path + '/' + cls._member_id
+        value = str(os.getpid())
+        try:
+            cls._zk_client.create_node(path, value, ephemeral=True)
+        except ResourceExistsError:
+            # already registered again by another greenlet
+            pass
+    # end _register
+
+    @classmethod
+    def _members_changed(cls, members):
+        if cls._ring is None:
+            # reset, stop watching
+            return False
+        if cls._member_id not in members:
+            # our node went away with the zookeeper session, own nothing
+            # until it is back
+            gevent.spawn(cls._register)
+        cls.set_members(members)
+    # end _members_changed
+
+    @classmethod
+    def set_members(cls, members):
+        if cls._ring is None:
+            cls._ring = ConsistentHashRing()
+        if set(members) == set(cls._ring.get_members()):
+            return
+        cls._ring.set_members(members)
+        cls._schedule_rebalance()
+    # end set_members
+
+    @classmethod
+    def _schedule_rebalance(cls):
+        cls._rebalance_needed = True
+        if cls._rebalance_cb is not None and cls._rebalance_gl is None:
+            cls._rebalance_gl = gevent.spawn(cls._rebalance)
+    # end _schedule_rebalance
+
+    @classmethod
+    def _rebalance(cls):
+        try:
+            while cls._rebalance_needed:
+                cls._rebalance_needed = False
+                cls._rebalance_cb()
+        finally:
+            cls._rebalance_gl = None
+    # end _rebalance
+
+# end DMPartition
+
 class DMUtils(object):
 
     MAX_VRF_NAME_LENGTH = 127
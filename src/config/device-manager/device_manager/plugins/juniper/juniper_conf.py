@@ -9,10 +9,16 @@ This file contains generic plugin implementation for juniper devices
 from ncclient import manager
 from ncclient.xml_ import new_ele
 from ncclient.operations.errors import TimeoutExpiredError
+from lxml import etree
+import contextlib
+import gevent
+from gevent.lock import Semaphore
 import time
 import datetime
 from cStringIO import StringIO
 from dm_utils import DMUtils
+from dm_utils import ConfigDiff
+from dm_utils import DeviceSessionPool
 from device_conf import DeviceConf
 from dm_utils import PushConfigState
 from db import PhysicalInterfaceDM
@@ -45,6 +51,20 @@ class JuniperConf(DeviceConf):
         self.management_ip = self.physical_router.management_ip
         self.timeout = 120
         self.push_config_state = PushConfigState.PUSH_STATE_INIT
+        # the netconf session is used by one greenlet at a time, pushes and
+        # queries wait for it while keepalive probes skip it
+        self._session_lock = Semaphore()
+        self.session_in_use = False
+        self.last_used = time.time()
+        # contrail group of the last config committed to the device, the
+        # next push only sends the difference to it. A full push only keeps
+        # the xml, which is parsed if the next push can be incremental
+        self._last_config = None
+        self._last_config_xml = None
+        self._incremental_pushes = 0
+        # xml of the full config last committed to the device in the
+        # current netconf session, unchanged configs are not pushed
+        self._committed_config_xml = None
         super(JuniperConf, self).__init__()
     # end __init__
 
@@ -85,6 +105,10 @@ class JuniperConf(DeviceConf):
                              timeout=self.timeout,
                              device_params = {'name':'junos'},
                              unknown_host_cb=lambda x, y: True)
+                self.last_used = time.time()
+                # the device config may have changed since the last commit
+                self._committed_config_xml = None
+                DeviceSessionPool.register(self)
             except Exception as e:
                if self._logger:
                    self._logger.error("could not establish netconf session with "
@@ -92,6 +116,12 @@ class JuniperConf(DeviceConf):
     # end device_connect
 
     def device_disconnect(self):
+        # the device config may change while not connected, the next push
+        # replaces the whole group, even if the config did not change
+        self._last_config = None
+        self._last_config_xml = None
+        self._committed_config_xml = None
+        DeviceSessionPool.unregister(self)
         if self._nc_manager and self._nc_manager.connected:
             try:
                 self._nc_manager.close_session()
@@ -106,6 +136,39 @@ class JuniperConf(DeviceConf):
         return self._nc_manager and self._nc_manager.connected
     # end is_connected
 
+    @contextlib.contextmanager
+    def use_session(self):
+        with self._session_lock:
+            self.session_in_use = True
+            try:
+                yield
+            finally:
+                self.session_in_use = False
+                self.last_used = time.time()
+    # end use_session
+
+    def device_probe(self):
+        if not self.is_connected():
+            return False
+        if not self._session_lock.acquire(blocking=False):
+            # in use, which keeps it alive
+            return True
+        self.session_in_use = True
+        try:
+            self._nc_manager.rpc(new_ele('get-system-uptime-information'))
+            self.last_used = time.time()
+            return True
+        except Exception as e:
+            if self._logger:
+                self._logger.warning("netconf session probe failed, closing "
+                        "it: router %s: %s" % (self.management_ip, str(e)))
+            self.device_disconnect()
+        finally:
+            self.session_in_use = False
+            self._session_lock.release()
+        return False
+    # end device_probe
+
     def initialize(self):
         self.ri_config = None
         self.routing_instances = {}
@@ -126,9 +189,94 @@ class JuniperConf(DeviceConf):
         self.external_peers = {}
     # ene initialize
 
+    def get_config_tree(self, xml_str):
+        try:
+            return etree.fromstring(xml_str)
+        except etree.XMLSyntaxError as e:
+            self._logger.error("Router %s: could not parse config: %s" % (
+                                   self.management_ip, str(e)))
+        return None
+    # end get_config_tree
+
+    @staticmethod
+    def _get_groups(config_tree):
+        for configuration in config_tree:
+            for groups in configuration:
+                if groups.tag == 'groups':
+                    return groups
+        return None
+    # end _get_groups
+
+    def can_push_incremental(self):
+        if self._last_config is None and self._last_config_xml is None:
+            return False
+        return (self._incremental_pushes <
+                PushConfigState.get_max_incremental_pushes())
+    # end can_push_incremental
+
+    def get_incremental_config(self, config_tree):
+        """Returns the changes of the contrail group since the last commit,
+        '' if it did not change and None if the whole group must be sent
+        """
+        if config_tree is None or not self.can_push_incremental():
+            return None
+        if self._last_config is None:
+            last_config_tree = self.get_config_tree(self._last_config_xml)
+            self._last_config_xml = None
+            if last_config_tree is None:
+                return None
+            self._last_config = self._get_groups(last_config_tree)
+            if self._last_config is None:
+                return None
+        groups = self._get_groups(config_tree)
+        if groups is None:
+            return None
+        groups_diff = ConfigDiff.diff(self._last_config, groups)
+        if groups_diff is None:
+            return ''
+        configuration = groups.getparent()
+        root = etree.Element(config_tree.tag, config_tree.attrib,
+                             nsmap=config_tree.nsmap)
+        etree.SubElement(root, configuration.tag, configuration.attrib,
+                         nsmap=configuration.nsmap).append(groups_diff)
+        return self.to_junos_xml(etree.tostring(root))
+    # end get_incremental_config
+
     def device_send(self, conf, default_operation="merge",
                      operation="replace"):
-        config_str = self.serialize(conf)
+        with self.use_session():
+            return self._device_send(conf, default_operation, operation)
+    # end device_send
+
+    def _device_send(self, conf, default_operation, operation):
+        # the config is rendered once per push, and the other greenlets get
+        # to run between the steps of preparing a large config
+        xml_str = self.export_xml(conf)
+        gevent.sleep(0)
+        config_tree = None
+        config_str = None
+        if operation == "replace":
+            # comparing with the last committed xml is cheaper than hashing
+            # it, strings of different lengths are not even scanned
+            if xml_str == self._committed_config_xml and self.is_connected():
+                self._logger.info("Router %s: config did not change since the "
+                                  "last commit, not pushing" % (
+                                      self.management_ip))
+                self.commit_stats['total_commits_skipped_since_up'] += 1
+                self.push_config_state = PushConfigState.PUSH_STATE_SUCCESS
+                return 0
+            # the config is only parsed and diffed if it can be pushed
+            # incrementally
+            if self.can_push_incremental():
+                config_tree = self.get_config_tree(xml_str)
+                gevent.sleep(0)
+                config_str = self.get_incremental_config(config_tree) or None
+        incremental = config_str is not None
+        if not incremental:
+            config_str = self.to_junos_xml(xml_str)
+        self._last_config = None
+        self._last_config_xml = None
+        self._committed_config_xml = None
         self.push_config_state = PushConfigState.PUSH_STATE_INIT
         start_time = None
         config_size = 0
@@ -151,6 +299,14 @@ class JuniperConf(DeviceConf):
             self.commit_stats['last_commit_duration'] = str(
                     end_time - start_time)
             self.push_config_state = PushConfigState.PUSH_STATE_SUCCESS
+            if operation == "replace":
+                if config_tree is not None:
+                    self._last_config = self._get_groups(config_tree)
+                else:
+                    self._last_config_xml = xml_str
+                self._incremental_pushes = \
+                    self._incremental_pushes + 1 if incremental else 0
+                self._committed_config_xml = xml_str
         except TimeoutExpiredError as e:
             self._logger.error("Could not commit(timeout error): "
                           "(%s, %ss)" % (self.management_ip, self.timeout))
@@ -160,6 +316,17 @@ class JuniperConf(DeviceConf):
         except Exception as e:
             self._logger.error("Router %s: %s" % (self.management_ip,
                                                       e.message))
+            if incremental:
+                # the device config may have drifted from the last commit,
+                # fall back to replacing the whole group
+                self._logger.info("Router %s: incremental config push failed, "
+                                  "pushing the full config" % (
+                                      self.management_ip))
+                try:
+                    self._nc_manager.discard_changes()
+                except Exception:
+                    pass
+                return self._device_send(conf, default_operation, operation)
             self.commit_stats[
                     'commit_status_message'] = 'failed to apply config,\
                                                 router response: ' + e.message
@@ -171,7 +338,7 @@ class JuniperConf(DeviceConf):
                         time.time() - start_time)
             self.push_config_state = PushConfigState.PUSH_STATE_RETRY
         return config_size
-    # end device_send
+    # end _device_send
 
     def get_xpath_data(self, res, path_name, is_node=False):
         data = ''
@@ -196,7 +363,8 @@ class JuniperConf(DeviceConf):
         try:
             self.device_connect()
             sw_info = new_ele('get-software-information')
-            res = self._nc_manager.rpc(sw_info)
+            with self.use_session():
+                res = self._nc_manager.rpc(sw_info)
             dev_conf['product-name'] = self.get_xpath_data(res,
                                              '//software-information/product-name')
             dev_conf['product-model'] = self.get_xpath_data(res,
@@ -218,7 +386,9 @@ class JuniperConf(DeviceConf):
     def device_get_config(self, filters = {}):
         try:
             self.device_connect()
-            config_data = self._nc_manager.get_config(source='running').data_xml
+            with self.use_session():
+                config_data = self._nc_manager.get_config(
+                    source='running').data_xml
         except Exception as e:
             if self._logger:
                 self._logger.error("could not fetch config from router %s: %s" % (
@@ -286,11 +456,22 @@ class JuniperConf(DeviceConf):
         return conf
     # end build_conf
 
-    def serialize(self, config):
+    @staticmethod
+    def export_xml(config):
         xml_data = StringIO()
         config.export_xml(xml_data, 1)
-        xml_str = xml_data.getvalue()
-        return xml_str.replace("comment>", "junos:comment>", -1)
+        return xml_data.getvalue()
+    # end export_xml
+
+    @staticmethod
+    def to_junos_xml(xml_str):
+        # "comment>" can only end a comment tag: no other tag of the schema
+        # ends with it and the exported text and attributes escape ">"
+        return xml_str.replace("comment>", "junos:comment>")
+    # end to_junos_xml
+
+    def serialize(self, config):
+        return self.to_junos_xml(self.export_xml(config))
     # end serialize
 
     def prepare_conf(self, default_operation="merge", operation="replace"):
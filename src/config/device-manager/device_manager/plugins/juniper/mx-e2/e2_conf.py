@@ -885,7 +885,8 @@ class MxE2Conf(JuniperConf):
     # end build_e2_telemetry_config
 
     def service_request_rpc(self, rpc_command):
-        res = self._nc_manager.rpc(rpc_command)
+        with self.use_session():
+            res = self._nc_manager.rpc(rpc_command)
         return res
     # end service_request_rpc
 
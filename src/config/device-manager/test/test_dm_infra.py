@@ -2,8 +2,11 @@
 # Copyright (c) 2013 Juniper Infra, Inc. All rights reserved.
 #
 import sys
+import time
 import gevent
+import gevent.lock
 from time import sleep
+from lxml import etree
 sys.path.append("../common/tests")
 from test_utils import *
 from vnc_api.vnc_api import *
@@ -14,6 +17,8 @@ from gevent import monkey
 monkey.patch_all()
 from device_manager.db import DMCassandraDB
 from device_manager.db import DBBaseDM
+from device_manager.db import PhysicalRouterDM
+from device_manager.juniper_conf import JuniperConf
 from device_manager.device_manager import DeviceManager
 from test_common import *
 from test_dm_common import *
@@ -51,6 +56,318 @@ class TestInfraDM(TestCommonDM):
         self.delete_routers(bgp_router, pr)
         self.wait_for_routers_delete(bgp_router_fq, pr_fq)
 
+    # only the changes since the last commit are pushed
+    def test_dm_incremental_config(self):
+        bgp_router, pr = self.create_router('router1' + self.id(), '1.1.1.1',
+                                                          product=self.product)
+        self.check_if_xml_is_generated()
+        pr_config = FakeDeviceConnect.params.get("pr_config")
+        groups = FakeDeviceConnect.params.get("config")
+        conf = pr_config.build_conf(groups, 'replace')
+        pr_config._last_config = pr_config._get_groups(
+            pr_config.get_config_tree(pr_config.export_xml(conf)))
+        pr_config._incremental_pushes = 0
+        self.assertEqual(pr_config.get_incremental_config(
+            pr_config.get_config_tree(pr_config.export_xml(conf))), '')
+
+        groups.set_comment('/* changed */')
+        xml_conf = pr_config.get_incremental_config(
+            pr_config.get_config_tree(pr_config.export_xml(conf)))
+        self.assertTrue('<junos:comment>/* changed */' in xml_conf)
+        self.assertFalse('protocols' in xml_conf)
+        self.assertFalse('apply-groups' in xml_conf)
+
+        # the full config is pushed again after max incremental pushes
+        pr_config._incremental_pushes = \
+            PushConfigState.get_max_incremental_pushes()
+        self.assertIsNone(pr_config.get_incremental_config(
+            pr_config.get_config_tree(pr_config.export_xml(conf))))
+        pr_config._last_config = None
+
+        bgp_router_fq = bgp_router.get_fq_name()
+        pr_fq = pr.get_fq_name()
+        self.delete_routers(bgp_router, pr)
+        self.wait_for_routers_delete(bgp_router_fq, pr_fq)
+    # end test_dm_incremental_config
+
+    # unchanged config is not pushed again
+    def test_dm_config_fingerprint(self):
+        bgp_router, pr = self.create_router('router1' + self.id(), '1.1.1.1',
+                                                          product=self.product)
+        self.check_if_xml_is_generated()
+        pr_config = FakeDeviceConnect.params.get("pr_config")
+        groups = FakeDeviceConnect.params.get("config")
+        conf = pr_config.build_conf(groups, 'replace')
+        # device_send of the plugin is faked by the test case, call the
+        # juniper one
+        device_send = super(type(pr_config), pr_config).device_send
+        stats = pr_config.get_commit_stats()
+        commits_sent = stats['total_commits_sent_since_up']
+        commits_skipped = stats['total_commits_skipped_since_up']
+
+        self.assertTrue(device_send(conf) > 0)
+        committed_config_xml = pr_config._committed_config_xml
+        self.assertIsNotNone(committed_config_xml)
+        self.assertEqual(device_send(conf), 0)
+        self.assertEqual(stats['total_commits_sent_since_up'],
+                         commits_sent + 1)
+        self.assertEqual(stats['total_commits_skipped_since_up'],
+                         commits_skipped + 1)
+
+        groups.set_comment('/* changed */')
+        self.assertTrue(device_send(conf) > 0)
+        self.assertNotEqual(pr_config._committed_config_xml,
+                            committed_config_xml)
+
+        # the device config may change while disconnected, the same config
+        # is pushed again on a new session
+        pr_config.device_disconnect()
+        self.assertIsNone(pr_config._committed_config_xml)
+        self.assertTrue(device_send(conf) > 0)
+        self.assertEqual(stats['total_commits_sent_since_up'],
+                         commits_sent + 3)
+        # a full push is not parsed, its xml is when the next push is
+        # incremental
+        self.assertIsNone(pr_config._last_config)
+        self.assertIsNotNone(pr_config._last_config_xml)
+        groups.set_comment('/* changed again */')
+        self.assertTrue(device_send(conf) > 0)
+        self.assertEqual(pr_config._incremental_pushes, 1)
+        self.assertIsNotNone(pr_config._last_config)
+
+        bgp_router_fq = bgp_router.get_fq_name()
+        pr_fq = pr.get_fq_name()
+        self.delete_routers(bgp_router, pr)
+        self.wait_for_routers_delete(bgp_router_fq, pr_fq)
+    # end test_dm_config_fingerprint
+
+    def test_dm_push_limiter(self):
+        max_pushes = PushLimiter._max_parallel_pushes
+        PushLimiter.set_max_parallel_pushes(1)
+        pushed = []
+        def push(name, priority):
+            with PushLimiter.slot(priority):
+                pushed.append(name)
+                gevent.sleep(0.01)
+        try:
+            PushLimiter.acquire()
+            gls = [gevent.spawn(push, 'repush1', PushLimiter.PRIORITY_REPUSH),
+                   gevent.spawn(push, 'change1', PushLimiter.PRIORITY_CHANGE),
+                   gevent.spawn(push, 'repush2', PushLimiter.PRIORITY_REPUSH),
+                   gevent.spawn(push, 'change2', PushLimiter.PRIORITY_CHANGE)]
+            gevent.sleep(0)
+            self.assertEqual(PushLimiter.get_waiting(), 4)
+            self.assertEqual(pushed, [])
+            PushLimiter.release()
+            gevent.joinall(gls)
+            # config changes first, one at a time
+            self.assertEqual(pushed,
+                             ['change1', 'change2', 'repush1', 'repush2'])
+            self.assertEqual(PushLimiter.get_active(), 0)
+        finally:
+            PushLimiter.set_max_parallel_pushes(max_pushes)
+    # end test_dm_push_limiter
+
+    def test_dm_session_keepalive(self):
+        bgp_router, pr = self.create_router('router1' + self.id(), '1.1.1.1',
+                                                          product=self.product)
+        self.check_if_xml_is_generated()
+        pr_config = FakeDeviceConnect.params.get("pr_config")
+        pr_config.device_connect()
+        self.assertTrue(pr_config.is_connected())
+        nc_manager = pr_config._nc_manager
+
+        # idle session is probed and kept
+        pr_config.last_used = 0
+        DeviceSessionPool.probe_idle_sessions()
+        self.assertTrue(pr_config.last_used > 0)
+        self.assertTrue(pr_config.is_connected())
+
+        # session in use is not probed
+        def rpc_fail(ele):
+            raise Exception("session closed")
+        nc_manager.rpc = rpc_fail
+        pr_config.last_used = 0
+        try:
+            with pr_config.use_session():
+                pr_config.last_used = 0
+                self.assertTrue(pr_config.device_probe())
+            self.assertTrue(pr_config.is_connected())
+
+            # broken session is closed
+            pr_config.last_used = 0
+            DeviceSessionPool.probe_idle_sessions()
+        finally:
+            del nc_manager.rpc
+        self.assertFalse(pr_config.is_connected())
+        self.assertFalse(id(pr_config) in DeviceSessionPool._devices)
+
+        bgp_router_fq = bgp_router.get_fq_name()
+        pr_fq = pr.get_fq_name()
+        self.delete_routers(bgp_router, pr)
+        self.wait_for_routers_delete(bgp_router_fq, pr_fq)
+    # end test_dm_session_keepalive
+
+    def test_dm_session_keepalive_parallel(self):
+        class SlowDevice(object):
+            session_in_use = False
+            last_used = 0
+            management_ip = None
+
+            def __init__(self, fail=False):
+                self.fail = fail
+
+            def device_probe(self):
+                gevent.sleep(0.2)
+                if self.fail:
+                    raise Exception("probe failed")
+                return True
+
+        devices = [SlowDevice(), SlowDevice(), SlowDevice(fail=True)]
+        keepalive_interval = DeviceSessionPool._keepalive_interval
+        DeviceSessionPool.set_keepalive_interval(0)
+        try:
+            for device in devices:
+                DeviceSessionPool._devices[id(device)] = device
+            start = time.time()
+            DeviceSessionPool.probe_idle_sessions()
+            # one slow device does not delay the others
+            self.assertTrue(time.time() - start < 0.4)
+            # a probe failing unexpectedly keeps the device registered
+            self.assertTrue(id(devices[2]) in DeviceSessionPool._devices)
+        finally:
+            for device in devices:
+                DeviceSessionPool.unregister(device)
+            DeviceSessionPool.set_keepalive_interval(keepalive_interval)
+    # end test_dm_session_keepalive_parallel
+
+    def test_dm_partition(self):
+        ring = ConsistentHashRing(['dm1', 'dm2', 'dm3'])
+        keys = ['pr%d' % i for i in range(300)]
+        owners = dict((key, ring.get_member(key)) for key in keys)
+        self.assertEqual(set(owners.values()), set(['dm1', 'dm2', 'dm3']))
+        # a member leaving only moves its own keys
+        ring.set_members(['dm1', 'dm2'])
+        for key in keys:
+            if owners[key] != 'dm3':
+                self.assertEqual(ring.get_member(key), owners[key])
+
+        bgp_router, pr = self.create_router('router1' + self.id(), '1.1.1.1',
+                                                          product=self.product)
+        self.check_if_xml_is_generated()
+        pr_config = FakeDeviceConnect.params.get("pr_config")
+        pr_dm = PhysicalRouterDM.get(pr.uuid)
+        self.assertTrue(pr_dm.owned)
+        try:
+            # another device manager takes the router over
+            DMPartition._member_id = 'dm1'
+            DMPartition.set_members(['dm2'])
+            gevent.sleep(1)
+            self.assertFalse(pr_dm.owned)
+            self.assertFalse(pr_dm.is_conf_sent())
+            self.assertFalse(pr_config.is_connected())
+            FakeDeviceConnect.reset()
+            pr_dm.set_config_state()
+            gevent.sleep(1)
+            self.assertIsNone(FakeDeviceConnect.get_xml_config())
+
+            # and hands it back, the push waits for the router lock
+            locks = []
+            lock = gevent.lock.Semaphore()
+            lock.acquire()
+            class FakeZookeeperClient(object):
+                def lock(self, path, identifier=None):
+                    locks.append((path, identifier))
+                    return lock
+            DMPartition._zk_client = FakeZookeeperClient()
+            DMPartition._locks_path = '/locks'
+            DMPartition.set_members(['dm1'])
+            gevent.sleep(1)
+            self.assertTrue(pr_dm.owned)
+            self.assertEqual(locks, [('/locks/' + pr.uuid, 'dm1')])
+            self.assertIsNone(FakeDeviceConnect.get_xml_config())
+            lock.release()
+            self.check_if_xml_is_generated()
+        finally:
+            DMPartition.reset()
+            gevent.sleep(1)
+        self.assertTrue(pr_dm.owned)
+
+        bgp_router_fq = bgp_router.get_fq_name()
+        pr_fq = pr.get_fq_name()
+        self.delete_routers(bgp_router, pr)
+        self.wait_for_routers_delete(bgp_router_fq, pr_fq)
+    # end test_dm_partition
+
+    def test_dm_config_diff(self):
+        old = etree.fromstring(
+            '<groups><name>__contrail__</name><routing-instances>'
+            '<instance><name>a</name><instance-type>vrf</instance-type>'
+            '<interface><name>ge-0/0/0.1</name></interface></instance>'
+            '<instance><name>b</name></instance></routing-instances>'
+            '<policy-options><community><name>x</name><members>1</members>'
+            '<members>2</members></community></policy-options></groups>')
+        new = etree.fromstring(
+            '<groups><name>__contrail__</name><routing-instances>'
+            '<instance><name>a</name><instance-type>vrf</instance-type>'
+            '<interface><name>ge-0/0/0.2</name></interface></instance>'
+            '<instance><name>c</name></instance></routing-instances>'
+            '<policy-options><community><name>x</name><members>1</members>'
+            '<members>3</members></community></policy-options></groups>')
+        self.assertIsNone(ConfigDiff.diff(old, old))
+        self.assertEqual(etree.tostring(ConfigDiff.diff(old, new)),
+            '<groups><name>__contrail__</name><routing-instances>'
+            '<instance><name>a</name>'
+            '<interface><name>ge-0/0/0.2</name></interface>'
+            '<interface operation="delete"><name>ge-0/0/0.1</name></interface>'
+            '</instance><instance><name>c</name></instance>'
+            '<instance operation="delete"><name>b</name></instance>'
+            '</routing-instances><policy-options><community><name>x</name>'
+            '<members>3</members><members operation="delete">2</members>'
+            '</community></policy-options></groups>')
+    # end test_dm_config_diff
+
+    def test_dm_config_diff_term_order(self):
+        old = etree.fromstring(
+            '<filter><name>f</name><term><name>a</name></term>'
+            '<term><name>default-term</name></term></filter>')
+        # terms appended or removed keep the order of the others
+        new = etree.fromstring(
+            '<filter><name>f</name><term><name>default-term</name></term>'
+            '<term><name>b</name></term></filter>')
+        self.assertEqual(etree.tostring(ConfigDiff.diff(old, new)),
+            '<filter><name>f</name><term><name>b</name></term>'
+            '<term operation="delete"><name>a</name></term></filter>')
+        # a term added before an existing one replaces the filter
+        new = etree.fromstring(
+            '<filter><name>f</name><term><name>a</name></term>'
+            '<term><name>b</name></term>'
+            '<term><name>default-term</name></term></filter>')
+        self.assertEqual(etree.tostring(ConfigDiff.diff(old, new)),
+            '<filter operation="replace"><name>f</name>'
+            '<term><name>a</name></term><term><name>b</name></term>'
+            '<term><name>default-term</name></term></filter>')
+        # and so do reordered terms
+        new = etree.fromstring(
+            '<filter><name>f</name><term><name>default-term</name></term>'
+            '<term><name>a</name></term></filter>')
+        self.assertEqual(ConfigDiff.diff(old, new).get('operation'),
+                         'replace')
+    # end test_dm_config_diff_term_order
+
+    def test_dm_junos_xml(self):
+        groups = Groups(comment='/* a comment> */', name='__contrail__')
+        ris = RoutingInstances()
+        ris.add_instance(Instance(name='a', comment='/* vrf */'))
+        groups.set_routing_instances(ris)
+        conf = config(configuration=Configuration(groups=groups))
+        xml_conf = JuniperConf.to_junos_xml(JuniperConf.export_xml(conf))
+        self.assertTrue('<junos:comment>/* a comment&gt; */</junos:comment>'
+                        in xml_conf)
+        self.assertTrue('<junos:comment>/* vrf */</junos:comment>' in xml_conf)
+        self.assertFalse('<comment>' in xml_conf)
+    # end test_dm_junos_xml
+
     # check for greenlets, bug: #1714004
     def test_dm_greenlets(self):
         bgp_router, pr = self.create_router('router1' + self.id(), '1.1.1.1',
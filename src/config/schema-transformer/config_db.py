@@ -13,6 +13,7 @@ reload(sys)
 sys.setdefaultencoding('UTF8')
 
 import copy
+import json
 import uuid
 
 import itertools
@@ -146,6 +147,27 @@ class DBBaseST(DBBase):
         # Implement in the derived class
         pass
 
+    def get_evaluate_inputs(self):
+        # Implement in the derived class to return a snapshot (compared by
+        # equality) of everything evaluate() depends on, so that evaluation
+        # can be skipped when none of it changed. None means the object is
+        # always evaluated.
+        return None
+
+    def evaluate_if_changed(self):
+        inputs = self.get_evaluate_inputs()
+        if (inputs is not None and
+                inputs == getattr(self, '_evaluate_inputs', None)):
+            return False
+        self._evaluate_inputs = None
+        self.evaluate()
+        if inputs is not None:
+            # evaluate() updates the derived state, take the fingerprint
+            # of what it left behind
+            self._evaluate_inputs = self.get_evaluate_inputs()
+        return True
+    # end evaluate_if_changed
+
     @classmethod
     def reinit(cls):
         for obj in cls.list_vnc_obj():
@@ -1562,12 +1584,16 @@ class RouteTargetST(DBBaseST):
             except Exception as e:
                 cls._logger.error("Error in reinit for %s %s: %s" % (
                     cls.obj_type, obj.get_fq_name_str(), str(e)))
+        stale_rtgt_dict = {}
         for ri, val in cls._object_db._rt_cf.get_range():
             rt = val['rtgt_num']
             asn = GlobalSystemConfigST.get_autonomous_system()
             rt_key = "target:%s:%s" % (asn, rt)
             if rt_key not in cls:
-                cls._object_db.free_route_target(ri)
+                stale_rtgt_dict[ri] = rt
+        if stale_rtgt_dict:
+            cls._object_db.free_route_targets(stale_rtgt_dict.keys(),
+                                              stale_rtgt_dict)
     # end reinit
 
     def __init__(self, rt_key, obj=None):
@@ -1932,6 +1958,24 @@ class SecurityGroupST(DBBaseST):
         self.process_referred_sgs()
     # end delete_obj
 
+    def get_evaluate_inputs(self):
+        if self.ingress_acl is None or self.egress_acl is None:
+            # retry the ACL creation on every evaluation until it succeeds
+            return None
+        # evaluate() turns the rules into ACLs using the id of this group
+        # and the ids of the groups the rules refer to
+        referred_sg_ids = []
+        for sg_name in self.referred_sgs:
+            sg = SecurityGroupST.get(sg_name)
+            referred_sg_ids.append(
+                (sg_name, sg.obj.get_security_group_id() if sg else None))
+        return (json.dumps(self.security_group_entries,
+                           default=common.obj_to_json, sort_keys=True),
+                self.obj.get_security_group_id(),
+                frozenset(referred_sg_ids),
+                self.ingress_acl.uuid, self.egress_acl.uuid)
+    # end get_evaluate_inputs
+
     def evaluate(self):
         self.update_policy_entries()
 
@@ -2614,11 +2658,30 @@ class ServiceChain(DBBaseST):
     _dict = {}
     obj_type = 'service_chain'
 
+    # Service chains are stored in the service_chain_uuid_table as
+    # '<prefix><chain fields>\n<si_info>', with the chain fields encoded as a
+    # positional json list (see _DB_FIELDS) and si_info kept undecoded until
+    # it is first used. Rows written by older releases are jsonpickle
+    # encoded objects and are rewritten in this format on startup.
+    _DB_VERSION = 1
+    _DB_PREFIX = 'sc%d:' % _DB_VERSION
+    _DB_FIELDS = ('left_vn', 'right_vn', 'direction', 'sp_list', 'dp_list',
+                  'protocol', 'service_list', 'created', 'partially_created',
+                  'error_msg')
+
     @classmethod
     def init(cls):
         # When schema transformer restarts, read all service chains from cassandra
         for (name, columns) in cls._object_db.list_service_chain_uuid():
-            chain = jsonpickle.decode(columns['value'])
+            value = columns['value']
+            chain = cls.from_db_value(name, value)
+            if chain is None:
+                cls._logger.error("Unable to decode service chain %s" % name)
+                continue
+            if not value.startswith(cls._DB_PREFIX):
+                # migrate rows written with jsonpickle
+                cls._object_db.add_service_chain_uuid(name,
+                                                      chain.to_db_value())
 
             # Some service chains may not be valid any more. We may need to
             # delete such service chain objects or we have to destroy them.
@@ -2628,15 +2691,113 @@ class ServiceChain(DBBaseST):
             # all objects are read from database, we will delete/destroy them
             chain.present_stale = True
             chain.created_stale = chain.created
-            if not hasattr(chain, 'partially_created'):
-                chain.partially_created = False
-            if not hasattr(chain, 'si_info'):
-                chain.si_info = None
             cls._dict[name] = chain
         cls.sc_ipam_obj = None
         cls._get_service_chain_ipam()
     # end init
 
+    @classmethod
+    def from_db_value(cls, name, value):
+        if not value.startswith(cls._DB_PREFIX):
+            return cls._from_jsonpickle(value)
+        fields, _, si_info = value[len(cls._DB_PREFIX):].partition('\n')
+        try:
+            field_dict = dict(zip(cls._DB_FIELDS, json.loads(fields)))
+        except ValueError:
+            return None
+        chain = cls(name, field_dict['left_vn'], field_dict['right_vn'],
+                    field_dict['direction'],
+                    [PortType(start_port=sp[0], end_port=sp[1])
+                     for sp in field_dict['sp_list']],
+                    [PortType(start_port=dp[0], end_port=dp[1])
+                     for dp in field_dict['dp_list']],
+                    field_dict['protocol'], field_dict['service_list'])
+        chain.created = field_dict['created']
+        chain.partially_created = field_dict['partially_created']
+        chain.error_msg = field_dict['error_msg']
+        chain._si_info_db = si_info or None
+        return chain
+    # end from_db_value
+
+    @classmethod
+    def _from_jsonpickle(cls, value):
+        try:
+            chain = jsonpickle.decode(value)
+        except Exception:
+            return None
+        # si_info is a property: jsonpickle restores it through the setter
+        # into _si_info, unless the setattr failed and it fell back to
+        # __dict__
+        si_info = chain.__dict__.pop('si_info', None)
+        if si_info is None:
+            si_info = chain.__dict__.get('_si_info')
+        if not hasattr(chain, 'partially_created'):
+            chain.partially_created = False
+        chain.si_info = si_info
+        return chain
+    # end _from_jsonpickle
+
+    def to_db_value(self):
+        fields = []
+        for field in self._DB_FIELDS:
+            value = getattr(self, field, None)
+            if field in ('sp_list', 'dp_list'):
+                value = [[port.start_port, port.end_port]
+                         for port in value or []]
+            fields.append(value)
+        si_info = self._si_info_db
+        if si_info is None and self._si_info is not None:
+            si_info = json.dumps(self._encode_si_info(self._si_info),
+                                 separators=(',', ':'))
+        return '%s%s\n%s' % (self._DB_PREFIX,
+                              json.dumps(fields, separators=(',', ':')),
+                              si_info or '')
+    # end to_db_value
+
+    @staticmethod
+    def _encode_si_info(si_info):
+        # Interfaces are stored by name instead of pickling the
+        # VirtualMachineInterfaceST objects
+        encoded = {}
+        for service, info in si_info.items():
+            vm_list = []
+            for vm_info in info.get('vm_list') or []:
+                vm_list.append(dict(
+                    (key, dict(val, vmi=getattr(val['vmi'], 'name',
+                                                 val['vmi']))
+                          if isinstance(val, dict) and 'vmi' in val else val)
+                    for key, val in vm_info.items()))
+            encoded[service] = dict(info, vm_list=vm_list)
+        return encoded
+    # end _encode_si_info
+
+    @staticmethod
+    def _decode_si_info(si_info):
+        decoded = json.loads(si_info)
+        for info in decoded.values():
+            for vm_info in info.get('vm_list') or []:
+                for val in vm_info.values():
+                    if isinstance(val, dict) and 'vmi' in val:
+                        val['vmi'] = (VirtualMachineInterfaceST.get(
+                            val['vmi']) or val['vmi'])
+        return decoded
+    # end _decode_si_info
+
+    @property
+    def si_info(self):
+        if getattr(self, '_si_info_db', None) is not None:
+            try:
+                self._si_info = self._decode_si_info(self._si_info_db)
+            except ValueError:
+                self._si_info = None
+            self._si_info_db = None
+        return getattr(self, '_si_info', None)
+
+    @si_info.setter
+    def si_info(self, value):
+        self._si_info_db = None
+        self._si_info = value
+
     @classmethod
     def _get_service_chain_ipam(cls):
         if cls.sc_ipam_obj:
@@ -2714,7 +2875,7 @@ class ServiceChain(DBBaseST):
         sc = ServiceChain(name, left_vn, right_vn, direction, sp_list,
                           dp_list, protocol, service_list)
         ServiceChain._dict[name] = sc
-        cls._object_db.add_service_chain_uuid(name, jsonpickle.encode(sc))
+        cls._object_db.add_service_chain_uuid(name, sc.to_db_value())
         return sc
     # end find_or_create
 
@@ -2985,7 +3146,7 @@ class ServiceChain(DBBaseST):
         self.created = True
         self.partially_created = False
         self.error_msg = None
-        self._object_db.add_service_chain_uuid(self.name, jsonpickle.encode(self))
+        self._object_db.add_service_chain_uuid(self.name, self.to_db_value())
     # end _create
 
     def add_pbf_rule(self, vmi, ri, v4_address, v6_address, vlan):
@@ -3041,7 +3202,7 @@ class ServiceChain(DBBaseST):
         self.created = False
         self.partially_created = False
         self._object_db.add_service_chain_uuid(self.name,
-                                               jsonpickle.encode(self))
+                                               self.to_db_value())
 
         vn1_obj = VirtualNetworkST.get(self.left_vn)
         vn2_obj = VirtualNetworkST.get(self.right_vn)
@@ -3489,6 +3650,21 @@ class BgpAsAServiceST(DBBaseST):
         return changed
     # end update
 
+    def get_evaluate_inputs(self):
+        if self.bgpaas_shared:
+            pending = set([self.obj.name]) - set(self.bgpaas_clients.keys())
+        else:
+            pending = (self.virtual_machine_interfaces -
+                       set(self.bgpaas_clients.keys()))
+        if pending:
+            # bgp router creation depends on the VMI, VN and RI state,
+            # retry it on every evaluation until it succeeds
+            return None
+        return (self.bgpaas_shared,
+                frozenset(self.virtual_machine_interfaces),
+                frozenset(self.bgpaas_clients.items()))
+    # end get_evaluate_inputs
+
     def evaluate(self):
         # If the BGP Service is shared, just create
         # one BGP Router.
@@ -4107,6 +4283,29 @@ class LogicalRouterST(DBBaseST):
         self.route_target = rt_key
     # end __init__
 
+    def get_evaluate_inputs(self):
+        vmi_vns = []
+        for vmi in self.virtual_machine_interfaces:
+            vmi_obj = VirtualMachineInterfaceST.get(vmi)
+            vmi_vns.append((vmi, vmi_obj.virtual_network
+                                 if vmi_obj is not None else None))
+        bgpvpns = []
+        for bgpvpn_name in self.bgpvpns:
+            bgpvpn = BgpvpnST.get(bgpvpn_name)
+            if bgpvpn is None:
+                bgpvpns.append((bgpvpn_name, None))
+            else:
+                bgpvpns.append((bgpvpn_name, frozenset(bgpvpn.rt_list),
+                                frozenset(bgpvpn.import_rt_list),
+                                frozenset(bgpvpn.export_rt_list)))
+        config_rt_list = self.configured_route_target_list\
+            or RouteTargetList()
+        return (frozenset(vmi_vns), frozenset(bgpvpns),
+                frozenset(config_rt_list.get_route_target()),
+                frozenset(self.virtual_networks), frozenset(self.rt_list),
+                self.vxlan_routing, self.route_target)
+    # end get_evaluate_inputs
+
     def evaluate(self):
         self.update_virtual_networks()
         self.set_route_target_list()
@@ -14,6 +14,12 @@ from cfgm_common.zkclient import IndexAllocator
 from cfgm_common.vnc_object_db import VncObjectDBClient
 from sandesh_common.vns.constants import SCHEMA_KEYSPACE_NAME
 import uuid
+try:
+    # python2.7
+    from collections import OrderedDict
+except:
+    # python2.6
+    from ordereddict import OrderedDict
 
 class SchemaTransformerDB(VncObjectDBClient):
 
@@ -87,6 +93,9 @@ class SchemaTransformerDB(VncObjectDBClient):
         self._rt_allocator = IndexAllocator(
             zkclient, self._zk_path_pfx+self._BGP_RTGT_ALLOC_PATH,
             self._BGP_RTGT_MAX_ID, common.BGP_RTGT_MIN_ID)
+        # ri_fq_name -> route target number allocated or validated by this
+        # process, so that repeated lookups avoid cassandra and zookeeper
+        self._rt_cache = {}
 
         def _init_bgpaas_ports_index_allocator():
             bgpaas_port_start = self._args.bgpaas_port_start
@@ -185,6 +194,8 @@ class SchemaTransformerDB(VncObjectDBClient):
     # end free_service_chain_vlan
 
     def get_route_target(self, ri_fq_name):
+        if ri_fq_name in self._rt_cache:
+            return self._rt_cache[ri_fq_name]
         try:
             return int(self.get_one_col(self._RT_CF, ri_fq_name, 'rtgt_num'))
         except (VncError, NoIdError):
@@ -193,38 +204,95 @@ class SchemaTransformerDB(VncObjectDBClient):
             #                 Probably need to be cleaned
             return 0
 
+    def get_route_targets(self, ri_fq_names):
+        # Returns a dict of ri_fq_name -> route target number for the RIs
+        # which already have one, reading all uncached rows in one multiget
+        rtgt_dict = {}
+        missing = []
+        for ri_fq_name in ri_fq_names:
+            if ri_fq_name in self._rt_cache:
+                rtgt_dict[ri_fq_name] = self._rt_cache[ri_fq_name]
+            else:
+                missing.append(ri_fq_name)
+        if missing:
+            rows = self.multiget(self._RT_CF, missing, columns=['rtgt_num'])
+            for ri_fq_name, cols in rows.items():
+                if 'rtgt_num' in cols:
+                    rtgt_dict[ri_fq_name] = int(cols['rtgt_num'])
+        return rtgt_dict
+    # end get_route_targets
+
     def alloc_route_target(self, ri_fq_name, zk_only=False):
-        alloc_new = False
+        return self.alloc_route_targets([ri_fq_name], zk_only)[ri_fq_name]
+    # end alloc_route_target
 
+    def alloc_route_targets(self, ri_fq_names, zk_only=False):
+        # Bulk version of alloc_route_target. Existing mappings are fetched
+        # with a single multiget and only the RIs without a valid route
+        # target get a new number. All new rows are written to cassandra in
+        # one batch, after the numbers have been claimed in zookeeper, so a
+        # crash cannot leave a row pointing at an unallocated number.
+        ri_fq_names = list(OrderedDict.fromkeys(ri_fq_names))
         if zk_only:
-            alloc_new = True
+            existing = {}
         else:
-            rtgt_num = self.get_route_target(ri_fq_name)
+            existing = self.get_route_targets(ri_fq_names)
+
+        rtgt_dict = {}
+        alloc_list = []
+        for ri_fq_name in ri_fq_names:
+            rtgt_num = existing.get(ri_fq_name, 0)
             if rtgt_num < common.BGP_RTGT_MIN_ID:
-                alloc_new = True
+                alloc_list.append(ri_fq_name)
+            elif ri_fq_name in self._rt_cache:
+                rtgt_dict[ri_fq_name] = rtgt_num
+            elif self._rt_allocator.read(rtgt_num) != ri_fq_name:
+                alloc_list.append(ri_fq_name)
             else:
-                rtgt_ri_fq_name_str = self._rt_allocator.read(rtgt_num)
-                if (rtgt_ri_fq_name_str != ri_fq_name):
-                    alloc_new = True
+                rtgt_dict[ri_fq_name] = rtgt_num
 
-        if (alloc_new):
-            rtgt_num = self._rt_allocator.alloc(ri_fq_name)
-            self._rt_cf.insert(ri_fq_name, {'rtgt_num': str(rtgt_num)})
+        if alloc_list:
+            bch = self._rt_cf.batch()
+            for ri_fq_name in alloc_list:
+                rtgt_num = self._rt_allocator.alloc(ri_fq_name)
+                bch.insert(ri_fq_name, {'rtgt_num': str(rtgt_num)})
+                rtgt_dict[ri_fq_name] = rtgt_num
+            bch.send()
 
-        return rtgt_num
-    # end alloc_route_target
+        self._rt_cache.update(rtgt_dict)
+        return rtgt_dict
+    # end alloc_route_targets
 
     def free_route_target_by_number(self, rtgt):
+        name = self._rt_allocator.read(rtgt)
+        if name is not None and self._rt_cache.get(name) == rtgt:
+            del self._rt_cache[name]
         self._rt_allocator.delete(rtgt)
 
     def free_route_target(self, ri_fq_name):
+        self.free_route_targets([ri_fq_name])
+    # end free_route_target
+
+    def free_route_targets(self, ri_fq_names, rtgt_dict=None):
+        # Bulk version of free_route_target. Callers which already know the
+        # numbers (e.g. from a get_range on the table) can pass them in
+        # rtgt_dict to avoid reading the rows again.
+        ri_fq_names = list(OrderedDict.fromkeys(ri_fq_names))
+        if rtgt_dict is None:
+            rtgt_dict = self.get_route_targets(ri_fq_names)
+        bch = self._rt_cf.batch()
+        for ri_fq_name in ri_fq_names:
+            bch.remove(ri_fq_name)
+            self._rt_cache.pop(ri_fq_name, None)
         try:
-            rtgt = self.get_route_target(ri_fq_name)
-            self._rt_cf.remove(ri_fq_name)
+            bch.send()
         except NotFoundException:
             pass
-        self._rt_allocator.delete(rtgt)
-    # end free_route_target
+        for ri_fq_name in ri_fq_names:
+            rtgt = rtgt_dict.get(ri_fq_name)
+            if rtgt is not None:
+                self._rt_allocator.delete(int(rtgt))
+    # end free_route_targets
 
     def get_service_chain_ip(self, sc_name):
         return self.get(self._SC_IP_CF, sc_name)
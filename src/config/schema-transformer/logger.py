@@ -37,6 +37,11 @@ class SchemaTransformerLogger(ConfigServiceLogger):
             self.sandesh_sc_handle_request
         sandesh.StObjectReq.handle_request = \
             self.sandesh_st_object_handle_request
+        sandesh.StConvergenceStatsReq.handle_request = \
+            self.sandesh_convergence_stats_handle_request
+
+    def set_amqp_handle(self, amqp_handle):
+        self._amqp_handle = amqp_handle
 
     def sandesh_ri_build(self, vn_name, ri_name):
         vn = VirtualNetworkST.get(vn_name)
@@ -126,3 +131,27 @@ class SchemaTransformerLogger(ConfigServiceLogger):
                     st_resp.objects.append(obj.handle_st_object_req())
         st_resp.response(req.context())
     # end sandesh_st_object_handle_request
+
+    def sandesh_convergence_stats_handle_request(self, req):
+        stats_resp = sandesh.StConvergenceStatsResp(stats=[])
+        amqp_handle = getattr(self, '_amqp_handle', None)
+        if amqp_handle is None:
+            stats_resp.response(req.context())
+            return
+        convergence_stats = amqp_handle.convergence_stats
+        for obj_type, histogram in convergence_stats.histograms.items():
+            if req.object_type and req.object_type != obj_type:
+                continue
+            stats = sandesh.StConvergenceStats(object_type=obj_type)
+            stats.notifications = histogram.notifications
+            stats.api_writes = histogram.api_writes
+            stats.avg_latency_ms = (histogram.total_latency_ms /
+                                    max(histogram.notifications, 1))
+            stats.max_latency_ms = histogram.max_latency_ms
+            stats.latency_buckets_ms = list(histogram.BUCKETS_MS)
+            stats.latency_bucket_counts = list(histogram.bucket_counts)
+            stats_resp.stats.append(stats)
+        stats_resp.pending_notifications = \
+            convergence_stats.pending_notifications
+        stats_resp.response(req.context())
+    # end sandesh_convergence_stats_handle_request
@@ -7,10 +7,102 @@
 Sechmatransformer  amqp handler
 """
 
+import bisect
+import time
+
+import gevent.local
+
 from cfgm_common.vnc_amqp import VncAmqpHandle
 from config_db import DBBaseST, VirtualNetworkST
 
 
+class NotificationStats(object):
+    """Convergence accounting of a single notification."""
+
+    def __init__(self, obj_type):
+        self.obj_type = obj_type
+        self.start_time = time.time()
+        self.end_time = None
+        self.api_writes = 0
+# end class NotificationStats
+
+
+class ConvergenceHistogram(object):
+    """Latency histogram and API write count of one object type."""
+
+    # upper bounds (in ms) of the latency buckets, the last bucket counts
+    # everything above the last bound
+    BUCKETS_MS = [1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 60000]
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.notifications = 0
+        self.api_writes = 0
+        self.total_latency_ms = 0
+        self.max_latency_ms = 0
+
+    def record(self, latency_ms, api_writes):
+        self.bucket_counts[bisect.bisect_left(self.BUCKETS_MS,
+                                              latency_ms)] += 1
+        self.notifications += 1
+        self.api_writes += api_writes
+        self.total_latency_ms += latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+# end class ConvergenceHistogram
+
+
+class ConvergenceStats(object):
+    """Per object type convergence latency, from the receipt of a
+    notification to the end of the evaluation (and API writes) it caused.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.pending_notifications = 0
+
+    def start(self, obj_type):
+        self.pending_notifications += 1
+        return NotificationStats(obj_type)
+
+    def release(self, stats):
+        self.pending_notifications -= 1
+        stats.end_time = time.time()
+        latency_ms = int((stats.end_time - stats.start_time) * 1000)
+        histogram = self.histograms.setdefault(stats.obj_type,
+                                               ConvergenceHistogram())
+        histogram.record(latency_ms, stats.api_writes)
+# end class ConvergenceStats
+
+
+class _ApiWriteCounter(object):
+    """Wraps a VncApi and charges every write to the notification being
+    processed by the current greenlet.
+    """
+
+    _WRITE_SUFFIXES = ('_create', '_update', '_delete')
+    _WRITE_METHODS = ('ref_update', 'ref_relax_for_delete')
+
+    def __init__(self, vnc_lib, notification_local):
+        self._vnc_lib = vnc_lib
+        self._notification_local = notification_local
+
+    def __getattr__(self, name):
+        attr = getattr(self._vnc_lib, name)
+        if not callable(attr) or not (name.endswith(self._WRITE_SUFFIXES) or
+                                      name in self._WRITE_METHODS):
+            return attr
+
+        def _counted(*args, **kwargs):
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                stats = getattr(self._notification_local, 'stats', None)
+                if stats is not None:
+                    stats.api_writes += 1
+        return _counted
+# end class _ApiWriteCounter
+
+
 class STAmqpHandle(VncAmqpHandle):
 
     def __init__(self, logger, reaction_map, args):
@@ -28,11 +120,40 @@ class STAmqpHandle(VncAmqpHandle):
         super(STAmqpHandle, self).__init__(logger._sandesh, logger, DBBaseST,
                                            reaction_map, q_name_prefix,
                                            rabbitmq_cfg, args.trace_file)
+        self.convergence_stats = ConvergenceStats()
+        self._notification_local = gevent.local.local()
+
+    def count_api_writes(self, vnc_lib):
+        return _ApiWriteCounter(vnc_lib, self._notification_local)
+
+    def _vnc_subscribe_callback(self, oper_info):
+        stats = self.convergence_stats.start(
+            oper_info.get('type', '').replace('-', '_'))
+        self._notification_local.stats = stats
+        try:
+            super(STAmqpHandle, self)._vnc_subscribe_callback(oper_info)
+        finally:
+            self._notification_local.stats = None
+            self.convergence_stats.release(stats)
 
     def evaluate_dependency(self):
         if not self.dependency_tracker:
             return
-        super(STAmqpHandle, self).evaluate_dependency()
+        self.init_msgbus_fq_name()
+        self.init_msgbus_dtr()
+        for res_type, res_id_list in self.dependency_tracker.resources.items():
+            if not res_id_list:
+                continue
+            self.add_msgbus_dtr(res_type, res_id_list)
+            cls = self.db_cls.get_obj_type_map().get(res_type)
+            if cls is None:
+                continue
+            for res_id in res_id_list:
+                res_obj = cls.get(res_id)
+                if res_obj is not None:
+                    # objects whose inputs did not change since their last
+                    # evaluation are skipped
+                    res_obj.evaluate_if_changed()
         for vn_id in self.dependency_tracker.resources.get(
                 'virtual_network', []):
             vn = VirtualNetworkST.get(vn_id)
@@ -0,0 +1,101 @@
+#
+# Copyright (c) 2017 Juniper Networks, Inc. All rights reserved.
+#
+
+import mock
+import unittest
+
+try:
+    import config_db
+except ImportError:
+    from schema_transformer import config_db
+from vnc_api.vnc_api import (
+    AccessControlList, AddressType, PolicyEntriesType, PolicyRuleType,
+    RouteTargetList, SecurityGroup)
+
+
+class TestEvaluateInputs(unittest.TestCase):
+    def _create_logical_router(self):
+        lr = config_db.LogicalRouterST.__new__(config_db.LogicalRouterST)
+        lr.name = 'default-domain:p1:lr1'
+        lr.virtual_machine_interfaces = set()
+        lr.virtual_networks = set()
+        lr.route_tables = set()
+        lr.rt_list = set()
+        lr.configured_route_target_list = None
+        lr.bgpvpns = set()
+        lr.bgpvpn_rt_list = set()
+        lr.bgpvpn_import_rt_list = set()
+        lr.bgpvpn_export_rt_list = set()
+        lr.vxlan_routing = False
+        lr.route_target = 'target:64512:8000001'
+        return lr
+
+    def test_logical_router_skips_unchanged(self):
+        lr = self._create_logical_router()
+        with mock.patch.object(config_db.LogicalRouterST, 'evaluate',
+                               wraps=lr.evaluate) as evaluate:
+            self.assertTrue(lr.evaluate_if_changed())
+            self.assertFalse(lr.evaluate_if_changed())
+            self.assertEqual(evaluate.call_count, 1)
+
+            # a new configured route target is an input change
+            lr.configured_route_target_list = RouteTargetList(
+                route_target=['target:1:1'])
+            with mock.patch.object(config_db.LogicalRouterST,
+                                   'delete_route_targets'):
+                self.assertTrue(lr.evaluate_if_changed())
+            self.assertEqual(lr.rt_list, set(['target:1:1']))
+            self.assertFalse(lr.evaluate_if_changed())
+            self.assertEqual(evaluate.call_count, 2)
+
+    def _create_security_group(self, name, sg_id):
+        sg = config_db.SecurityGroupST.__new__(config_db.SecurityGroupST)
+        sg.name = name
+        sg.obj = SecurityGroup(name.split(':')[-1])
+        sg.obj.set_security_group_id(sg_id)
+        sg.referred_sgs = set()
+        sg.security_group_entries = None
+        sg.ingress_acl = AccessControlList('ingress-access-control-list')
+        sg.ingress_acl.uuid = 'ingress-' + name
+        sg.egress_acl = AccessControlList('egress-access-control-list')
+        sg.egress_acl.uuid = 'egress-' + name
+        return sg
+
+    def test_security_group_skips_unchanged(self):
+        sg1 = self._create_security_group('default-domain:p1:sg1', 8000001)
+        sg2 = self._create_security_group('default-domain:p1:sg2', 8000002)
+        sg1.security_group_entries = PolicyEntriesType([PolicyRuleType(
+            direction='>', protocol='any',
+            src_addresses=[AddressType(security_group=sg2.name)],
+            dst_addresses=[AddressType(security_group='local')])])
+        sg1.referred_sgs = set([sg2.name])
+        with mock.patch.object(config_db.SecurityGroupST, 'evaluate') \
+                as evaluate, \
+                mock.patch.dict(config_db.SecurityGroupST._dict,
+                                {sg2.name: sg2}):
+            self.assertTrue(sg1.evaluate_if_changed())
+            self.assertFalse(sg1.evaluate_if_changed())
+
+            # the id of a referred group is an input
+            sg2.obj.set_security_group_id(8000003)
+            self.assertTrue(sg1.evaluate_if_changed())
+            self.assertFalse(sg1.evaluate_if_changed())
+
+            # so are the rules
+            sg1.security_group_entries.get_policy_rule()[0].protocol = 'tcp'
+            self.assertTrue(sg1.evaluate_if_changed())
+
+            # a missing ACL is always retried
+            sg1.egress_acl = None
+            self.assertTrue(sg1.evaluate_if_changed())
+            self.assertTrue(sg1.evaluate_if_changed())
+            self.assertEqual(evaluate.call_count, 5)
+
+    def test_no_inputs_always_evaluates(self):
+        obj = config_db.DBBaseST()
+        with mock.patch.object(config_db.DBBaseST, 'evaluate') as evaluate:
+            self.assertTrue(obj.evaluate_if_changed())
+            self.assertTrue(obj.evaluate_if_changed())
+            self.assertEqual(evaluate.call_count, 2)
+# end class TestEvaluateInputs
@@ -114,4 +114,43 @@ class TestRouteTarget(STTestCase, VerifyRouteTarget):
             self.assertEqual([], errors)
     # test_db_manage_zk_route_target_missing
 
+    def test_bulk_route_target_alloc_free(self):
+        # create  vn
+        vn_name = 'vn_' + self.id()
+        vn_obj = self.create_virtual_network(vn_name, '10.0.0.0/24')
+        ri_name = self.get_ri_name(vn_obj)
+        self.wait_to_get_object(config_db.RoutingInstanceST, ri_name)
+        object_db = config_db.DBBaseST._object_db
+        rtgt_num = object_db.get_route_target(ri_name)
+
+        names = ['%s:bulk-ri-%d' % (self.id(), i) for i in range(5)]
+        rtgt_dict = object_db.alloc_route_targets(names + [ri_name])
+        # existing mapping is kept, new ones are unique and persisted
+        self.assertEqual(rtgt_dict[ri_name], rtgt_num)
+        self.assertEqual(len(set(rtgt_dict.values())), len(names) + 1)
+        object_db._rt_cache.clear()
+        self.assertEqual(object_db.get_route_targets(names),
+                         dict((n, rtgt_dict[n]) for n in names))
+        # allocating again is idempotent
+        self.assertEqual(object_db.alloc_route_targets(names),
+                         dict((n, rtgt_dict[n]) for n in names))
+
+        object_db.free_route_targets(names)
+        self.assertEqual(object_db.get_route_targets(names), {})
+        for name in names:
+            self.assertIsNone(object_db._rt_allocator.read(rtgt_dict[name]))
+        self.assertEqual(object_db.get_route_target(ri_name), rtgt_num)
+
+        # freeing by number, as logical routers do, drops the cached entry
+        lr_name = '%s:bulk-lr' % self.id()
+        lr_rtgt_num = object_db.alloc_route_target(lr_name, True)
+        self.assertEqual(object_db._rt_cache[lr_name], lr_rtgt_num)
+        object_db.free_route_target_by_number(lr_rtgt_num)
+        self.assertNotIn(lr_name, object_db._rt_cache)
+        self.assertIsNone(object_db._rt_allocator.read(lr_rtgt_num))
+
+        self._vnc_lib.virtual_network_delete(id=vn_obj.uuid)
+        self.check_ri_is_deleted(fq_name=vn_obj.fq_name+[vn_obj.name])
+    # end test_bulk_route_target_alloc_free
+
 # end class TestRouteTarget
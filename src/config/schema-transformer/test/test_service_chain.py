@@ -0,0 +1,87 @@
+#
+# Copyright (c) 2017 Juniper Networks, Inc. All rights reserved.
+#
+
+import json
+import jsonpickle
+import unittest
+
+try:
+    import config_db
+except ImportError:
+    from schema_transformer import config_db
+from vnc_api.vnc_api import PortType
+
+
+class TestServiceChainDBValue(unittest.TestCase):
+    def _create_chain(self):
+        sc = config_db.ServiceChain(
+            'sc-1', 'default-domain:p1:left', 'default-domain:p1:right', '<>',
+            [PortType(0, 65535)], [PortType(80, 80)], 'tcp',
+            ['default-domain:p1:si1', 'default-domain:p1:si2'])
+        sc.created = True
+        sc.si_info = {'default-domain:p1:si1': {
+            'mode': 'in-network', 'virtualization_type': 'virtual-machine',
+            'vm_list': [{'vm_uuid': 'vm-1',
+                         'left': {'vmi': 'default-domain:p1:vmi-l',
+                                  'v4-address': '10.0.0.3',
+                                  'v6-address': None}}]}}
+        return sc
+
+    def _assert_same_chain(self, sc, decoded):
+        self.assertEqual(sc, decoded)
+        self.assertEqual(decoded.left_vn, sc.left_vn)
+        self.assertEqual(decoded.right_vn, sc.right_vn)
+        self.assertEqual(decoded.created, sc.created)
+        self.assertEqual(decoded.partially_created, sc.partially_created)
+        self.assertEqual(decoded.si_info, sc.si_info)
+
+    def test_db_value_round_trip(self):
+        sc = self._create_chain()
+        value = sc.to_db_value()
+        self.assertTrue(value.startswith(config_db.ServiceChain._DB_PREFIX))
+        decoded = config_db.ServiceChain.from_db_value('sc-1', value)
+        # si_info is only decoded on access
+        self.assertIsNotNone(decoded._si_info_db)
+        self.assertEqual(decoded.to_db_value(), value)
+        self._assert_same_chain(sc, decoded)
+        self.assertIsNone(decoded._si_info_db)
+
+    def _legacy_value(self, sc):
+        # rows written by older releases pickled si_info as an attribute
+        value = json.loads(jsonpickle.encode(sc))
+        value['si_info'] = value.pop('_si_info')
+        del value['_si_info_db']
+        return json.dumps(value)
+
+    def test_db_value_from_jsonpickle(self):
+        sc = self._create_chain()
+        decoded = config_db.ServiceChain.from_db_value(
+            'sc-1', self._legacy_value(sc))
+        self._assert_same_chain(sc, decoded)
+        self.assertEqual(decoded.to_db_value(), sc.to_db_value())
+
+    def test_db_value_from_jsonpickle_encoded_chain(self):
+        sc = self._create_chain()
+        legacy = self._create_chain()
+        # older releases had si_info as a plain attribute
+        si_info = legacy.si_info
+        del legacy.__dict__['_si_info']
+        del legacy.__dict__['_si_info_db']
+        legacy.__dict__['si_info'] = si_info
+        decoded = config_db.ServiceChain.from_db_value(
+            'sc-1', jsonpickle.encode(legacy))
+        self._assert_same_chain(sc, decoded)
+        value = decoded.to_db_value()
+        self.assertEqual(value, sc.to_db_value())
+        self.assertEqual(
+            config_db.ServiceChain.from_db_value('sc-1', value).si_info,
+            sc.si_info)
+
+    def test_db_value_without_si_info(self):
+        sc = self._create_chain()
+        sc.si_info = None
+        decoded = config_db.ServiceChain.from_db_value('sc-1',
+                                                        sc.to_db_value())
+        self.assertIsNone(decoded.si_info)
+# end class TestServiceChainDBValue
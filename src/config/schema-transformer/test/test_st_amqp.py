@@ -0,0 +1,84 @@
+#
+# Copyright (c) 2017 Juniper Networks, Inc. All rights reserved.
+#
+
+import mock
+import unittest
+
+try:
+    import st_amqp
+except ImportError:
+    from schema_transformer import st_amqp
+
+
+class FakeST(object):
+    evaluated = []
+
+    def __init__(self, obj_type, name):
+        self.obj_type = obj_type
+        self.name = name
+
+    def evaluate(self):
+        FakeST.evaluated.append((self.obj_type, self.name))
+
+    def evaluate_if_changed(self):
+        self.evaluate()
+        return True
+
+    def uve_send(self):
+        pass
+
+
+class TestSTAmqpHandle(unittest.TestCase):
+    def setUp(self):
+        FakeST.evaluated = []
+        self.amqp = st_amqp.STAmqpHandle(mock.MagicMock(), {},
+                                         mock.MagicMock())
+        self.objs = {}
+        fake_cls = mock.MagicMock()
+        fake_cls.get = lambda key: self.objs.get(key)
+        self.amqp.db_cls = mock.MagicMock()
+        self.amqp.db_cls.get_obj_type_map.return_value = {
+            'virtual_network': fake_cls, 'routing_instance': fake_cls}
+
+    def _add(self, obj_type, name):
+        self.objs[name] = FakeST(obj_type, name)
+
+    def test_convergence_stats(self):
+        self._add('virtual_network', 'default-domain:p1:vn1')
+        self._add('routing_instance', 'default-domain:p1:vn1:vn1')
+        vnc_lib = mock.MagicMock()
+        counted_vnc_lib = self.amqp.count_api_writes(vnc_lib)
+
+        def _evaluate():
+            counted_vnc_lib.routing_instance_update(None)
+            counted_vnc_lib.ref_update('routing-instance', None,
+                                       'route-target', None, None, 'ADD')
+            counted_vnc_lib.routing_instance_read(fq_name=['x'])
+        self.objs['default-domain:p1:vn1:vn1'].evaluate = _evaluate
+
+        def _subscribe_actions():
+            self.amqp.obj_type = 'virtual_network'
+            self.amqp.obj_class = None
+            self.amqp.dependency_tracker = mock.MagicMock()
+            self.amqp.dependency_tracker.resources = {
+                'virtual_network': ['default-domain:p1:vn1'],
+                'routing_instance': ['default-domain:p1:vn1:vn1']}
+            self.amqp.create_msgbus_trace(None, 'UPDATE', None)
+            self.amqp.obj = self.objs['default-domain:p1:vn1']
+            self.amqp.evaluate_dependency()
+            self.assertEqual(
+                self.amqp.convergence_stats.pending_notifications, 1)
+        self.amqp._db_resync_done.set()
+        with mock.patch.object(self.amqp, 'vnc_subscribe_actions',
+                               _subscribe_actions):
+            self.amqp._vnc_subscribe_callback({'type': 'virtual-network'})
+
+        stats = self.amqp.convergence_stats
+        self.assertEqual(stats.pending_notifications, 0)
+        histogram = stats.histograms['virtual_network']
+        self.assertEqual(histogram.notifications, 1)
+        # reads are not counted
+        self.assertEqual(histogram.api_writes, 2)
+        self.assertEqual(sum(histogram.bucket_counts), 1)
+# end class TestSTAmqpHandle
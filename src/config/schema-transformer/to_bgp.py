@@ -172,13 +172,15 @@ class SchemaTransformer(object):
         self._vnc_amqp = STAmqpHandle(self.logger, self.REACTION_MAP,
                                       self._args)
         self._vnc_amqp.establish()
+        self.logger.set_amqp_handle(self._vnc_amqp)
         SchemaTransformer._schema_transformer = self
         try:
             # Initialize cassandra
             self._object_db = SchemaTransformerDB(self, _zookeeper_client)
             DBBaseST.init(self, self.logger, self._object_db)
             DBBaseST._sandesh = self.logger._sandesh
-            DBBaseST._vnc_lib = _vnc_lib
+            # count the API writes done for each notification
+            DBBaseST._vnc_lib = self._vnc_amqp.count_api_writes(_vnc_lib)
             ServiceChain.init()
             self.reinit()
             self._vnc_amqp._db_resync_done.set()
@@ -312,6 +314,18 @@ class SchemaTransformer(object):
             except Exception as e:
                 self.logger.error("Error in reinit virtual network %s: %s" % (
                     vn.get_fq_name_str(), str(e)))
+        # Allocate (or validate) the route targets of all the RIs in bulk
+        # so that locating them below does not go to the DB one by one
+        rt_ri_names = [ri_name for ri_name, ri_obj in
+                       ri_dict.items() + service_ri_dict.items()
+                       if ri_obj.get_fq_name() not in (
+                           common.IP_FABRIC_RI_FQ_NAME,
+                           common.LINK_LOCAL_RI_FQ_NAME)]
+        try:
+            self._object_db.alloc_route_targets(rt_ri_names)
+        except Exception as e:
+            self.logger.error(
+                "Error in bulk route target allocation: %s" % str(e))
         for ri_name, ri_obj in ri_dict.items():
             try:
                 RoutingInstanceST.locate(ri_name, ri_obj)
@@ -349,7 +363,7 @@ class SchemaTransformer(object):
         # e.g. vmi, depend on it.
         for vn_obj in VirtualNetworkST.values():
             try:
-                vn_obj.evaluate()
+                vn_obj.evaluate_if_changed()
             except Exception as e:
                 self.logger.error("Error in reinit evaluate virtual network %s: %s" % (
                     vn_obj.name, str(e)))
@@ -358,7 +372,7 @@ class SchemaTransformer(object):
                 continue
             for obj in cls.values():
                 try:
-                    obj.evaluate()
+                    obj.evaluate_if_changed()
                 except Exception as e:
                     self.logger.error("Error in reinit evaluate %s %s: %s" % (
                         cls.obj_type, obj.name, str(e)))
@@ -5,6 +5,10 @@
 """
 This file contains implementation of data model for SVC monitor
 """
+import heapq
+import itertools
+import random
+
 from pysandesh.gen_py.sandesh.ttypes import SandeshLevel
 from cfgm_common.vnc_db import DBBase
 from cfgm_common import svc_info
@@ -13,10 +17,59 @@ from cfgm_common import svc_info
 class DBBaseSM(DBBase):
     obj_type = __name__
 
+    # Object types checked for orphans by the periodic timer and the keys of
+    # the objects of those types which were created or whose refs changed
+    # since the last check.
+    _orphan_check_types = ('instance_ip', 'virtual_machine',
+                           'virtual_machine_interface', 'virtual_network',
+                           'project')
+    _orphan_candidates = {}
+
     def evaluate(self):
         # Implement in the derived class
         pass
 
+    @classmethod
+    def mark_orphan_candidate(cls, obj_type, key):
+        if obj_type in cls._orphan_check_types:
+            DBBaseSM._orphan_candidates.setdefault(obj_type, set()).add(key)
+
+    @classmethod
+    def pop_orphan_candidates(cls, obj_type=None):
+        return DBBaseSM._orphan_candidates.pop(obj_type or cls.obj_type,
+                                               set())
+
+    @classmethod
+    def locate(cls, key, *args):
+        new_obj = key not in cls._dict
+        obj = super(DBBaseSM, cls).locate(key, *args)
+        if new_obj and obj is not None:
+            cls.mark_orphan_candidate(cls.obj_type, key)
+        return obj
+
+    def delete_ref(self, ref_type, ref):
+        super(DBBaseSM, self).delete_ref(ref_type, ref)
+        self.mark_orphan_candidate(self.obj_type, self.get_key())
+
+    def update_single_ref(self, ref_type, obj):
+        ret = super(DBBaseSM, self).update_single_ref(ref_type, obj)
+        if ret:
+            self.mark_orphan_candidate(self.obj_type, self.get_key())
+        return ret
+
+    def update_multiple_refs(self, ref_type, obj):
+        ret = super(DBBaseSM, self).update_multiple_refs(ref_type, obj)
+        if ret:
+            self.mark_orphan_candidate(self.obj_type, self.get_key())
+        return ret
+
+    def update_multiple_refs_with_attr(self, ref_type, obj):
+        ret = super(DBBaseSM, self).update_multiple_refs_with_attr(ref_type,
+                                                                  obj)
+        if ret:
+            self.mark_orphan_candidate(self.obj_type, self.get_key())
+        return ret
+
 class LoadbalancerSM(DBBaseSM):
     _dict = {}
     obj_type = 'loadbalancer'
@@ -397,6 +450,8 @@ class VirtualMachineSM(DBBaseSM):
         self.virtual_router = None
         self.virtual_machine_interfaces = set()
         self.virtualization_type = None
+        # vrouter whose scheduling load counts this VM
+        self._load_vrouter = None
         self.update(obj_dict)
     # end __init__
 
@@ -411,6 +466,7 @@ class VirtualMachineSM(DBBaseSM):
 
         if self.service_instance:
             self.service_id = self.service_instance
+        self.update_vrouter_load()
 
         self.display_name = obj.get('display_name', None)
         if self.display_name is None:
@@ -434,24 +490,141 @@ class VirtualMachineSM(DBBaseSM):
         obj.update_single_ref('service_instance', {})
         obj.update_single_ref('virtual_router', {})
         obj.update_multiple_refs('virtual_machine_interface', {})
+        obj.update_vrouter_load()
         del cls._dict[uuid]
     # end delete
 
+    def update_vrouter_load(self):
+        # Only service VMs count in the load of their vrouter
+        vr_uuid = self.virtual_router if self.service_id else None
+        if vr_uuid == self._load_vrouter:
+            return
+        vr = VirtualRouterSM.get(self._load_vrouter)
+        if vr:
+            vr.set_service_vm(self.uuid, False)
+        vr = VirtualRouterSM.get(vr_uuid)
+        if vr:
+            vr.set_service_vm(self.uuid, True)
+            self._load_vrouter = vr_uuid
+        else:
+            # counted when the vrouter is cached
+            self._load_vrouter = None
+    # end update_vrouter_load
+
     def evaluate(self):
         if self.service_id and not self.service_instance:
             self._manager.delete_service_instance(self)
 # end VirtualMachineSM
 
 
+class VirtualRouterLoadIndex(object):
+    """Running vrouters ordered by the number of service VMs they host.
+
+    Entries are invalidated in place and skipped when popped, the heap is
+    rebuilt once stale entries outnumber the live ones. The running vrouters
+    are also kept in a list, for random picks.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._running = []
+        self._positions = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, uuid):
+        return uuid in self._entries
+
+    def load(self, uuid):
+        entry = self._entries.get(uuid)
+        if entry is None:
+            return None
+        return entry[0]
+
+    def update(self, vr):
+        self.remove(vr.uuid)
+        if not vr.agent_state:
+            return
+        entry = [len(vr.service_virtual_machines), next(self._counter),
+                 vr.uuid]
+        self._entries[vr.uuid] = entry
+        heapq.heappush(self._heap, entry)
+        self._positions[vr.uuid] = len(self._running)
+        self._running.append(vr.uuid)
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [e for e in self._heap if e[-1] is not None]
+            heapq.heapify(self._heap)
+
+    def remove(self, uuid):
+        entry = self._entries.pop(uuid, None)
+        if entry is None:
+            return
+        entry[-1] = None
+        # move the last running vrouter in the place of the removed one
+        position = self._positions.pop(uuid)
+        last = self._running.pop()
+        if last != uuid:
+            self._running[position] = last
+            self._positions[last] = position
+
+    def running(self, exclude=()):
+        """Return the running vrouters not in exclude, in no order."""
+        return [uuid for uuid in self._running if uuid not in exclude]
+
+    def sample(self, count=1, exclude=()):
+        """Return up to count distinct random running vrouters not in
+        exclude.
+        """
+        available = len(self._running) - len(
+            [uuid for uuid in exclude if uuid in self._entries])
+        count = min(count, available)
+        if count <= 0:
+            return []
+        if 2 * count > available:
+            # most of the available vrouters are wanted, walk them
+            return random.sample(self.running(exclude), count)
+        # Draw until count acceptable vrouters are found, at least half of
+        # the draws are acceptable.
+        chosen = []
+        while len(chosen) < count:
+            uuid = random.choice(self._running)
+            if uuid not in exclude and uuid not in chosen:
+                chosen.append(uuid)
+        return chosen
+
+    def least_loaded(self, count=1, exclude=()):
+        # Pop entries until count acceptable vrouters are found, then push
+        # back the live ones. Only the excluded vrouters are visited on top
+        # of the chosen ones.
+        chosen = []
+        popped = []
+        while self._heap and len(chosen) < count:
+            entry = heapq.heappop(self._heap)
+            if entry[-1] is None:
+                continue
+            popped.append(entry)
+            if entry[-1] not in exclude:
+                chosen.append(entry[-1])
+        for entry in popped:
+            heapq.heappush(self._heap, entry)
+        return chosen
+# end VirtualRouterLoadIndex
+
+
 class VirtualRouterSM(DBBaseSM):
     _dict = {}
     obj_type = 'virtual_router'
+    load_index = VirtualRouterLoadIndex()
 
     def __init__(self, uuid, obj_dict=None):
         self.uuid = uuid
-        self.agent_state = False
-        self.agent_down_count = 0
         self.virtual_machines = set()
+        self.service_virtual_machines = set()
+        self._agent_state = False
+        self.agent_down_count = 0
         self.update(obj_dict)
     # end __init__
 
@@ -461,6 +634,14 @@ class VirtualRouterSM(DBBaseSM):
         self.name = obj['fq_name'][-1]
         self.fq_name = obj['fq_name']
         self.update_multiple_refs('virtual_machine', obj)
+        # service VMs cached before this vrouter are counted here, the
+        # others add themselves with set_service_vm
+        for vm_id in self.virtual_machines - self.service_virtual_machines:
+            vm = VirtualMachineSM.get(vm_id)
+            if vm and vm.service_id and vm.virtual_router == self.uuid:
+                self.service_virtual_machines.add(vm_id)
+                vm._load_vrouter = self.uuid
+        self.load_index.update(self)
     # end update
 
     @classmethod
@@ -469,9 +650,35 @@ class VirtualRouterSM(DBBaseSM):
             return
         obj = cls._dict[uuid]
         obj.update_multiple_refs('virtual_machine', {})
+        cls.load_index.remove(uuid)
         del cls._dict[uuid]
     # end delete
 
+    @classmethod
+    def reset(cls):
+        super(VirtualRouterSM, cls).reset()
+        cls.load_index = VirtualRouterLoadIndex()
+
+    def set_service_vm(self, vm_uuid, hosted):
+        if hosted == (vm_uuid in self.service_virtual_machines):
+            return
+        if hosted:
+            self.service_virtual_machines.add(vm_uuid)
+        else:
+            self.service_virtual_machines.discard(vm_uuid)
+        self.load_index.update(self)
+
+    @property
+    def agent_state(self):
+        return self._agent_state
+
+    @agent_state.setter
+    def agent_state(self, up):
+        if up == self._agent_state:
+            return
+        self._agent_state = up
+        self.load_index.update(self)
+
     def set_agent_state(self, up):
         if up:
             self.agent_down_count = 0
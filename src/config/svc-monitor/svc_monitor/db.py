@@ -6,6 +6,7 @@
 """
 Service monitor DB to store VM, SI information
 """
+import contextlib
 import inspect
 
 from cfgm_common import jsonutils as json
@@ -19,9 +20,18 @@ class ServiceMonitorDB(VncObjectDBClient):
     _POOL_CF = 'pool_table'
     _LB_CF = 'loadbalancer_table'
     _HM_CF = 'healthmonitor_table'
+    # column families written by the loadbalancer agent and its drivers
+    LB_COLUMN_FAMILIES = (_POOL_CF, _LB_CF, _HM_CF)
 
     def __init__(self, args, logger):
         self._db_logger = logger
+        # nesting depth of the open batches by column family, None for the
+        # batches of all the column families
+        self._batch_depth = {}
+        # writes of the current batch by column family, as (table, writes
+        # in order, written keys)
+        self._batch_writes = {}
+        self.batch_write_failures = 0
 
         keyspaces = {
             self._KEYSPACE: {
@@ -51,8 +61,107 @@ class ServiceMonitorDB(VncObjectDBClient):
         self._lb_cf = self._cf_dict[self._LB_CF]
         self._hm_cf = self._cf_dict[self._HM_CF]
 
+    @contextlib.contextmanager
+    def batch(self, column_families=None):
+        """Send the inserts and removes done within the block in one batch
+        per column family when the outermost block exits. Only the writes
+        to column_families are batched, if given.
+
+        Within a batch inserts and removes return True once queued, their
+        failures are logged when sent. A read of a key with pending writes
+        sends the batch of its column family first, so that reads see them.
+        """
+        self.begin_batch(column_families)
+        try:
+            yield
+        finally:
+            self.end_batch(column_families)
+
+    def begin_batch(self, column_families=None):
+        for cf_name in column_families or [None]:
+            self._batch_depth[cf_name] = self._batch_depth.get(cf_name, 0) + 1
+
+    def end_batch(self, column_families=None):
+        """Returns the number of writes which failed when the outermost
+        batch of a column family is sent, 0 otherwise.
+        """
+        for cf_name in column_families or [None]:
+            depth = self._batch_depth.pop(cf_name, 0) - 1
+            if depth > 0:
+                self._batch_depth[cf_name] = depth
+        failures = 0
+        for table, _, _ in list(self._batch_writes.values()):
+            if not self._is_batched(table):
+                failures += self._send_batch(table)
+        return failures
+
+    def _is_batched(self, table):
+        return (None in self._batch_depth or
+                table.column_family in self._batch_depth)
+
+    def _send_batch(self, table=None):
+        """Send the pending writes, of all column families or of table's.
+
+        Returns the number of writes which failed. A failed batch is resent
+        one write at a time, and each write which fails again is logged
+        with its key and counted in batch_write_failures.
+        """
+        if table is None:
+            tables = [t for t, _, _ in self._batch_writes.values()]
+        else:
+            tables = [table]
+        failures = 0
+        for cf in tables:
+            if cf.column_family not in self._batch_writes:
+                continue
+            _, writes, _ = self._batch_writes.pop(cf.column_family)
+            try:
+                mutator = cf.batch()
+                for op, key, columns in writes:
+                    if op == 'insert':
+                        mutator.insert(key, columns)
+                    else:
+                        mutator.remove(key, columns=columns)
+                mutator.send()
+                continue
+            except Exception:
+                self._db_logger.error("DB: %s batch of %d writes failed" %
+                                      (cf.column_family, len(writes)))
+            # inserts and removes are idempotent, resend them in order
+            for op, key, columns in writes:
+                try:
+                    if op == 'insert':
+                        cf.insert(key, columns)
+                    else:
+                        cf.remove(key, columns=columns)
+                except Exception:
+                    failures += 1
+                    self._db_logger.error("DB: %s %s %s failed" %
+                                          (cf.column_family, key, op))
+        self.batch_write_failures += failures
+        return failures
+
+    def _batch_write(self, table, op, key, columns):
+        if not self._is_batched(table):
+            return False
+        pending = self._batch_writes.get(table.column_family)
+        if pending is None:
+            pending = (table, [], set())
+            self._batch_writes[table.column_family] = pending
+        pending[1].append((op, key, columns))
+        pending[2].add(key)
+        return True
+
+    def _has_pending_writes(self, table, key=None):
+        pending = self._batch_writes.get(table.column_family)
+        if pending is None:
+            return False
+        return key is None or key in pending[2]
+
     # db CRUD
     def _db_get(self, table, key, column):
+        if self._has_pending_writes(table, key):
+            self._send_batch(table)
         try:
             entry = self.get_one_col(table.column_family, key, column)
         except Exception:
@@ -67,7 +176,8 @@ class ServiceMonitorDB(VncObjectDBClient):
 
     def _db_insert(self, table, key, entry):
         try:
-            table.insert(key, entry)
+            if not self._batch_write(table, 'insert', key, entry):
+                table.insert(key, entry)
         except Exception:
             self._db_logger.log("DB: %s %s insert failed" %
                              (inspect.stack()[1][3], key))
@@ -77,10 +187,8 @@ class ServiceMonitorDB(VncObjectDBClient):
 
     def _db_remove(self, table, key, columns=None):
         try:
-            if columns:
-                table.remove(key, columns=columns)
-            else:
-                table.remove(key)
+            if not self._batch_write(table, 'remove', key, columns or None):
+                table.remove(key, columns=columns or None)
         except Exception:
             self._db_logger.log("DB: %s %s remove failed" %
                              (inspect.stack()[1][3], key))
@@ -89,6 +197,8 @@ class ServiceMonitorDB(VncObjectDBClient):
         return True
 
     def _db_list(self, table):
+        if self._has_pending_writes(table):
+            self._send_batch(table)
         try:
             entries = list(table.get_range())
         except Exception:
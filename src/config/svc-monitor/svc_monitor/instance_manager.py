@@ -713,6 +713,28 @@ class InstanceManager(object):
             vrouter_name = vr.name
         return vrouter_name
 
+    def _associate_vrouters(self, si, vms):
+        # schedule all the VMs of the SI in one call so that anti-affinity
+        # is kept between the VMs being scheduled
+        vrouter_names = {}
+        unscheduled = [vm for vm in vms if not vm.virtual_router]
+        placement = {}
+        if unscheduled:
+            placement = self.vrouter_scheduler.schedule_batch(si, unscheduled)
+        for vm in vms:
+            if vm.virtual_router:
+                vr = VirtualRouterSM.get(vm.virtual_router)
+            else:
+                vr = VirtualRouterSM.get(placement.get(vm.uuid))
+                if not vr:
+                    continue
+                self.logger.notice("vrouter %s updated with vm %s" %
+                                       (':'.join(vr.fq_name), vm.name))
+                vm.update()
+            if vr:
+                vrouter_names[vm.uuid] = vr.name
+        return vrouter_names
+
     def _update_local_preference(self, si, del_vm):
         if si.ha_mode != 'active-standby':
             return
@@ -811,12 +833,16 @@ class NetworkNamespaceManager(VRouterHostedManager):
         # create and launch vm
         si.state = 'launching'
         instances = []
+        vms = []
         for index in range(0, si.max_instances):
             vm = self._check_create_netns_vm(index, si, st, vm_list[index])
             if not vm:
                 continue
+            vms.append((index, vm))
 
-            vr_name = self._associate_vrouter(si, vm)
+        vr_names = self._associate_vrouters(si, [vm for _, vm in vms])
+        for index, vm in vms:
+            vr_name = vr_names.get(vm.uuid)
             if not vr_name:
                 self.logger.error("No vrouter available for VM %s" %
                                       vm.name)
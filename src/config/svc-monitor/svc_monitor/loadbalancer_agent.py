@@ -1,3 +1,8 @@
+import contextlib
+import time
+
+import gevent
+
 from vnc_api.vnc_api import *
 
 from cfgm_common import importutils
@@ -37,6 +42,19 @@ class LoadbalancerAgent(Agent):
             "svc_monitor.services.loadbalancer.drivers.native.driver.OpencontrailLoadbalancerDriver"
         )
         self._default_provider = "opencontrail"
+        # config UVEs are sent at most once per interval and loadbalancer,
+        # changes within the interval are coalesced in one send of the
+        # latest state
+        self._lb_config_uve_interval = float(
+            getattr(self._args, 'lb_config_uve_interval', 0) or 0)
+        self._lb_config_uve_pending = set()
+        self._lb_config_uve_last_sent = {}
+        self.lb_config_uves_sent = 0
+        self.lb_config_uves_suppressed = 0
+        # updates from notifications are batched for this interval
+        self._lb_update_batch_interval = float(
+            getattr(self._args, 'lb_update_batch_interval', 0) or 0)
+        self._update_window = None
     # end __init__
 
     def handle_service_type(self):
@@ -121,7 +139,61 @@ class LoadbalancerAgent(Agent):
                                               self._object_db, self._args)
     # end load_drivers
 
+    @contextlib.contextmanager
+    def batch_updates(self):
+        """Defer the driver updates and db writes done within the block,
+        so that they are applied once per loadbalancer and sent in batches.
+        """
+        batch = self._begin_batch()
+        try:
+            yield
+        finally:
+            self._end_batch(batch)
+    # end batch_updates
+
+    def _begin_batch(self, column_families=None):
+        drivers = []
+        for driver in self._loadbalancer_driver.values():
+            if driver not in drivers:
+                drivers.append(driver)
+        self._object_db.begin_batch(column_families)
+        for driver in drivers:
+            driver.begin_batch()
+        return drivers, column_families
+
+    def _end_batch(self, batch):
+        drivers, column_families = batch
+        try:
+            for driver in drivers:
+                driver.end_batch()
+        finally:
+            self._object_db.end_batch(column_families)
+
+    def _open_update_window(self):
+        """Batch the updates of the notifications received within the
+        next lb_update_batch_interval seconds, as batch_updates does. Only
+        the loadbalancer db writes are deferred, the other writes done in
+        the meantime are not delayed.
+        """
+        if self._lb_update_batch_interval <= 0 or self._update_window:
+            return
+        self._update_window = gevent.spawn_later(
+            self._lb_update_batch_interval, self._close_update_window,
+            self._begin_batch(self._object_db.LB_COLUMN_FAMILIES))
+
+    def _close_update_window(self, batch):
+        self._update_window = None
+        try:
+            self._end_batch(batch)
+        except Exception as e:
+            self._svc_mon.logger.error(
+                'Failed to apply loadbalancer updates: %s' % e)
+
     def audit_lb_pools(self):
+        with self._object_db.batch():
+            self._audit_lb_pools()
+
+    def _audit_lb_pools(self):
         for hm_id, config_data, driver_data in self._object_db.health_monitor_list():
             if HealthMonitorSM.get(hm_id):
                 continue
@@ -231,6 +303,7 @@ class LoadbalancerAgent(Agent):
 
     # Loadbalancer
     def loadbalancer_pool_add(self, pool):
+        self._open_update_window()
         p = self.loadbalancer_pool_get_reqdict(pool)
         driver = self._get_driver_for_pool(p['id'], p['provider'])
         try:
@@ -246,6 +319,7 @@ class LoadbalancerAgent(Agent):
     # end loadbalancer_pool_add
 
     def loadbalancer_member_add(self, member):
+        self._open_update_window()
         m = self.loadbalancer_member_get_reqdict(member)
         driver = self._get_driver_for_pool(m['pool_id'])
         try:
@@ -259,6 +333,7 @@ class LoadbalancerAgent(Agent):
     # end loadbalancer_member_add
 
     def virtual_ip_add(self, vip):
+        self._open_update_window()
         v = self.virtual_ip_get_reqdict(vip)
         driver = self._get_driver_for_pool(v['pool_id'])
         try:
@@ -273,6 +348,7 @@ class LoadbalancerAgent(Agent):
     # end  virtual_ip_add
 
     def delete_virtual_ip(self, obj):
+        self._open_update_window()
         v = obj.last_sent
         driver = self._get_driver_for_pool(v['pool_id'])
         try:
@@ -282,6 +358,7 @@ class LoadbalancerAgent(Agent):
     # end delete_virtual_ip
 
     def loadbalancer_add(self, loadbalancer):
+        self._open_update_window()
         lb = self.loadbalancer_get_reqdict(loadbalancer)
         driver = self._get_driver_for_loadbalancer(lb['id'], lb['provider'])
         self.send_lb_config_uve(lb['id'], False)
@@ -300,6 +377,7 @@ class LoadbalancerAgent(Agent):
     def suspend_loadbalancer(self, loadbalancer):
         if loadbalancer.provider != 'native':
             return
+        self._open_update_window()
         lb = self.loadbalancer_get_reqdict(loadbalancer)
         driver = self._get_driver_for_loadbalancer(lb['id'], lb['provider'])
         try:
@@ -310,6 +388,7 @@ class LoadbalancerAgent(Agent):
         self._delete_driver_for_loadbalancer(lb['id'])
 
     def delete_loadbalancer(self, loadbalancer):
+        self._open_update_window()
         lb = self.loadbalancer_get_reqdict(loadbalancer)
         driver = self._get_driver_for_loadbalancer(lb['id'], lb['provider'])
         self.send_lb_config_uve(lb['id'], True)
@@ -321,6 +400,7 @@ class LoadbalancerAgent(Agent):
         self._delete_driver_for_loadbalancer(lb['id'])
 
     def listener_add(self, listener):
+        self._open_update_window()
         ll = self.listener_get_reqdict(listener)
         driver = self._get_driver_for_loadbalancer(ll['loadbalancer_id'])
         try:
@@ -333,6 +413,7 @@ class LoadbalancerAgent(Agent):
         return ll
 
     def delete_listener(self, listener):
+        self._open_update_window()
         ll = self.listener_get_reqdict(listener)
         driver = self._get_driver_for_loadbalancer(ll['loadbalancer_id'])
         try:
@@ -341,6 +422,7 @@ class LoadbalancerAgent(Agent):
             pass
 
     def delete_loadbalancer_member(self, obj):
+        self._open_update_window()
         m = obj.last_sent
         driver = self._get_driver_for_pool(m['pool_id'])
         try:
@@ -350,6 +432,7 @@ class LoadbalancerAgent(Agent):
     # end delete_loadbalancer_member
 
     def delete_loadbalancer_pool(self, obj):
+        self._open_update_window()
         p = obj.last_sent
         driver = self._get_driver_for_pool(p['id'], p['provider'])
         try:
@@ -362,6 +445,7 @@ class LoadbalancerAgent(Agent):
     # end delete_loadbalancer_pool
 
     def loadbalancer_health_monitor_add(self, obj):
+        self._open_update_window()
         hm = self.hm_get_reqdict(obj)
         current_pools = hm['pools'] or []
         old_pools = []
@@ -393,6 +477,7 @@ class LoadbalancerAgent(Agent):
     # end loadbalancer_health_monitor_add
 
     def suspend_loadbalancer_health_monitor(self, obj):
+        self._open_update_window()
         hm = self._object_db.health_monitor_config_get(obj.uuid)
         if hm is None or hm['provider'] != 'native':
             return
@@ -409,6 +494,7 @@ class LoadbalancerAgent(Agent):
     # end suspend_loadbalancer_health_monitor
 
     def delete_loadbalancer_health_monitor(self, obj):
+        self._open_update_window()
         if obj.last_sent is None:
             return
         hm = obj.last_sent
@@ -639,6 +725,8 @@ class LoadbalancerAgent(Agent):
         lb = LoadbalancerSM.get(lb_id)
         if not lb:
             return
+        self.lb_config_uves_sent += 1
+        sandesh = self._svc_mon.logger._sandesh
         if deleted == True:
             uve_lb = UveLoadbalancerConfig(name=lb.uuid, deleted=True)
             uve_lb.listener = {}
@@ -650,7 +738,6 @@ class LoadbalancerAgent(Agent):
         uve_lb.name = lb.uuid
         uve_lb.listener = {}
         uve_lb.pool = {}
-        sandesh = self._svc_mon.logger._sandesh
         pool_found = False
         for ll_id in lb.loadbalancer_listeners:
             ll = LoadbalancerListenerSM.get(ll_id)
@@ -687,7 +774,35 @@ class LoadbalancerAgent(Agent):
         return
 
     def send_lb_config_uve(self, lb_id, deleted):
+        interval = self._lb_config_uve_interval
+        if deleted:
+            # sent right away, the loadbalancer is about to go away
+            if lb_id in self._lb_config_uve_pending:
+                self._lb_config_uve_pending.discard(lb_id)
+                self.lb_config_uves_suppressed += 1
+            self._lb_config_uve_last_sent.pop(lb_id, None)
+        elif interval > 0:
+            if lb_id in self._lb_config_uve_pending:
+                self.lb_config_uves_suppressed += 1
+                return
+            wait = (self._lb_config_uve_last_sent.get(lb_id, 0) + interval -
+                    time.time())
+            if wait > 0:
+                self._lb_config_uve_pending.add(lb_id)
+                gevent.spawn_later(wait, self._flush_lb_config_uve, lb_id)
+                return
+            self._lb_config_uve_last_sent[lb_id] = time.time()
         try:
             self._send_lb_config_uve(lb_id, deleted)
         except Exception:
             pass
+
+    def _flush_lb_config_uve(self, lb_id):
+        if lb_id not in self._lb_config_uve_pending:
+            return
+        self._lb_config_uve_pending.discard(lb_id)
+        self._lb_config_uve_last_sent[lb_id] = time.time()
+        try:
+            self._send_lb_config_uve(lb_id, False)
+        except Exception:
+            pass
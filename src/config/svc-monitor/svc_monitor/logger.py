@@ -43,6 +43,16 @@ class ServiceMonitorLogger(ConfigServiceLogger):
     def redefine_sandesh_handles(self):
         sandesh.ServiceInstanceList.handle_request =\
                 self.sandesh_si_handle_request
+        sandesh.VRouterSchedulerStatsReq.handle_request =\
+                self.sandesh_vrouter_scheduler_stats_handle_request
+        sandesh.LoadbalancerStatsReq.handle_request =\
+                self.sandesh_loadbalancer_stats_handle_request
+
+    def set_vrouter_scheduler(self, vrouter_scheduler):
+        self._vrouter_scheduler = vrouter_scheduler
+
+    def set_loadbalancer_agent(self, loadbalancer_agent):
+        self._loadbalancer_agent = loadbalancer_agent
 
     def api_conn_status_update(self, status, msg=None):
         ConnectionState.update(
@@ -109,6 +119,24 @@ class ServiceMonitorLogger(ConfigServiceLogger):
 
         si_resp.response(req.context())
 
+    def sandesh_vrouter_scheduler_stats_handle_request(self, req):
+        stats_resp = sandesh.VRouterSchedulerStatsResp()
+        vrouter_scheduler = getattr(self, '_vrouter_scheduler', None)
+        if vrouter_scheduler is not None:
+            stats_resp.agent_state_transitions = \
+                vrouter_scheduler.agent_state_transitions
+        stats_resp.response(req.context())
+
+    def sandesh_loadbalancer_stats_handle_request(self, req):
+        stats_resp = sandesh.LoadbalancerStatsResp()
+        loadbalancer_agent = getattr(self, '_loadbalancer_agent', None)
+        if loadbalancer_agent is not None:
+            stats_resp.config_uves_sent = \
+                loadbalancer_agent.lb_config_uves_sent
+            stats_resp.config_uves_suppressed = \
+                loadbalancer_agent.lb_config_uves_suppressed
+        stats_resp.response(req.context())
+
     def uve_svc_instance(self, si_fq_name_str, status=None,
                          vms=[], st_name=None):
         svc_uve = UveSvcInstanceConfig(name=si_fq_name_str,
@@ -400,11 +400,22 @@ class PortTupleAgent(Agent):
             self.set_port_service_health_check(si, port, vmi)
             self.set_port_static_routes(port, vmi)
 
-    def update_port_tuples(self):
+    def update_port_tuples(self, iip_ids=None, vmi_ids=None):
+        # iip_ids and vmi_ids restrict the cleanup to the candidates found
+        # while loading the db, everything is audited when not given
         for si in ServiceInstanceSM.values():
             for pt_id in si.port_tuples:
                 self.update_port_tuple(pt_id=pt_id)
-        for iip in InstanceIpSM.values():
+        if iip_ids is None:
+            iips = InstanceIpSM.values()
+        else:
+            iips = filter(None, [InstanceIpSM.get(i) for i in iip_ids])
+        for iip in iips:
             self.delete_shared_iip(iip)
-        for vmi in VirtualMachineInterfaceSM.values():
+        if vmi_ids is None:
+            vmis = VirtualMachineInterfaceSM.values()
+        else:
+            vmis = filter(None, [VirtualMachineInterfaceSM.get(i)
+                                 for i in vmi_ids])
+        for vmi in vmis:
             self.delete_old_vmi_links(vmi)
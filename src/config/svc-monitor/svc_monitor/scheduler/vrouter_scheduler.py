@@ -22,6 +22,7 @@ import ast
 from distutils.version import StrictVersion as V
 import random
 import six
+import time
 
 from cfgm_common import analytics_client
 from cfgm_common import svc_info
@@ -33,9 +34,61 @@ from svc_monitor.config_db import *
 from sandesh_common.vns.constants import \
      ANALYTICS_API_SERVER_DISCOVERY_SERVICE_NAME as analytics_svc_name
 
+class VRouterHealthCache(object):
+    """Last vrouter UVEs read from analytics and the agent state derived
+    from them.
+
+    Responses are fetched again with If-None-Match when analytics tags them
+    with an ETag. Otherwise they are reused until they are ttl seconds old.
+    """
+
+    def __init__(self, ttl=0):
+        self._ttl = ttl
+        self._uves = {}
+        self._etags = {}
+        self._fetch_times = {}
+        # agent state derived from the UVEs, per vrouter name
+        self.agent_up = {}
+
+    def is_fresh(self, query):
+        fetch_time = self._fetch_times.get(query)
+        if fetch_time is None or self._etags.get(query):
+            return False
+        return time.time() - fetch_time < self._ttl
+
+    def get_etag(self, query):
+        return self._etags.get(query)
+
+    def get_uves(self, query):
+        return self._uves.get(query, {})
+
+    def update(self, query, etag, uves):
+        """Store a response, uves is None if it was not modified.
+
+        Returns the names of the vrouters whose UVE changed and forgets the
+        agent state derived for them.
+        """
+        self._fetch_times[query] = time.time()
+        self._etags[query] = etag
+        if uves is None:
+            return set()
+        old_uves = self._uves.get(query, {})
+        changed = set(name for name, uve in uves.iteritems()
+                      if old_uves.get(name) != uve)
+        changed.update(name for name in old_uves if name not in uves)
+        self._uves[query] = uves
+        for name in changed:
+            self.agent_up.pop(name, None)
+        return changed
+# end class VRouterHealthCache
+
+
 @six.add_metaclass(abc.ABCMeta)
 class VRouterScheduler(object):
 
+    _VROUTER_MODE_QUERY = "*?cfilt=VrouterAgent:mode"
+    _AGENT_STATUS_QUERY = "*?cfilt=NodeStatus:process_status"
+
     def __init__(self, vnc_lib, nova_client, disc, logger, args):
         self._vnc_lib = vnc_lib
         self._args = args
@@ -43,6 +96,10 @@ class VRouterScheduler(object):
         self._disc = disc
         self._logger = logger
         self._analytics_client_list = self._get_analytics_clients()
+        self._health_cache = VRouterHealthCache(
+            int(getattr(args, 'vrouter_health_ttl', 0) or 0))
+        # number of vrouter agent state changes (up to down or down to up)
+        self.agent_state_transitions = 0
 
     def _get_analytics_clients(self):
         analytics_client_list = []
@@ -99,114 +156,188 @@ class VRouterScheduler(object):
         return az_vr_list
 
     def query_uve(self, analytics, filter_string):
+        return self.query_uve_if_modified(analytics, filter_string)[1]
+
+    def query_uve_if_modified(self, analytics, filter_string, etag=None):
         path = "/analytics/uves/vrouter/"
-        response_dict = {}
         if self._args.aaa_mode == 'no-auth':
             user_token = None
         else:
             user_token = self._vnc_lib.get_auth_token()
-        response = analytics.request(path, filter_string,
-                   user_token=user_token)
+        etag, response = analytics.conditional_request(path, filter_string,
+                   etag=etag, user_token=user_token)
+        if response is None:
+            return etag, None
+        response_dict = {}
         for values in response['value']:
             response_dict[values['name']] = values['value']
-        return response_dict
+        return etag, response_dict
 
-    def vrouters_running(self):
-        # get az host list
-        az_vrs = self._get_az_vrouter_list()
-
-        # read all vrouter information
+    def _refresh_health_cache(self):
+        # returns the names of the vrouters whose UVEs changed or None if
+        # no analytics server answered
         client_cnt = len(self._analytics_client_list)
         analytics_client_list = random.sample(
                   self._analytics_client_list, client_cnt)
-        analytics_response = False
         for analytics in analytics_client_list or []:
             try:
-                vrouters_mode = self.query_uve(
-                       analytics, "*?cfilt=VrouterAgent:mode")
-                agents_status = self.query_uve(
-                       analytics, "*?cfilt=NodeStatus:process_status")
-                analytics_response = True
-                break
+                changed = set()
+                for query in (self._VROUTER_MODE_QUERY,
+                              self._AGENT_STATUS_QUERY):
+                    if self._health_cache.is_fresh(query):
+                        continue
+                    etag, uves = self.query_uve_if_modified(analytics, query,
+                        self._health_cache.get_etag(query))
+                    changed |= self._health_cache.update(query, etag, uves)
+                return changed
             except Exception as e:
                 error_msg = "Failed to get vrouter and agent info from " + \
                             "analytics endpoint %s" %analytics.endpoint
                 self._logger.error(error_msg)
                 self._logger.error(str(e))
+        return None
+
+    def _get_agent_state(self, vr_name):
+        vrouters_mode = self._health_cache.get_uves(self._VROUTER_MODE_QUERY)
+        agents_status = self._health_cache.get_uves(self._AGENT_STATUS_QUERY)
+        if vr_name not in vrouters_mode or vr_name not in agents_status:
+            return False
+
+        try:
+            vr_mode = vrouters_mode[vr_name]['VrouterAgent']
+            if (vr_mode['mode'] != constants.VrouterAgentTypeMap[
+                    constants.VrouterAgentType.VROUTER_AGENT_EMBEDDED]):
+                return False
+        except Exception as e:
+            return False
 
-        if not analytics_response:
+        try:
+            for vr_status in agents_status[vr_name]['NodeStatus']['process_status'] or []:
+                if (vr_status['module_id'] != constants.MODULE_VROUTER_AGENT_NAME):
+                    continue
+                if (int(vr_status['instance_id']) == 0 and
+                        vr_status['state'] == 'Functional'):
+                    return True
+        except Exception as e:
+            pass
+        return False
+
+    def vrouters_running(self):
+        # get az host list
+        az_vrs = self._get_az_vrouter_list()
+
+        # refresh the vrouter information, only the vrouters whose UVEs
+        # changed get their agent state derived again
+        if self._refresh_health_cache() is None:
             error_msg = "no response from analytics servers"
             self._logger.error(error_msg)
             return
 
         for vr in VirtualRouterSM.values():
             if az_vrs and vr.name not in az_vrs:
-                vr.set_agent_state(False)
-                continue
+                agent_up = False
+            else:
+                agent_up = self._health_cache.agent_up.get(vr.name)
+                if agent_up is None:
+                    agent_up = self._get_agent_state(vr.name)
+                    self._health_cache.agent_up[vr.name] = agent_up
 
-            if vr.name not in vrouters_mode or vr.name not in agents_status:
-                vr.set_agent_state(False)
+            # an agent is only marked down after a few consecutive down
+            # reports, keep counting until it is
+            if agent_up and vr.agent_state and not vr.agent_down_count:
                 continue
-
-            try:
-                vr_mode = vrouters_mode[vr.name]['VrouterAgent']
-                if (vr_mode['mode'] != constants.VrouterAgentTypeMap[
-                        constants.VrouterAgentType.VROUTER_AGENT_EMBEDDED]):
-                    vr.set_agent_state(False)
-                    continue
-            except Exception as e:
-                vr.set_agent_state(False)
+            if not agent_up and not vr.agent_state:
                 continue
+            agent_state = vr.agent_state
+            vr.set_agent_state(agent_up)
+            if vr.agent_state != agent_state:
+                self.agent_state_transitions += 1
+                self._logger.notice("vrouter %s agent is %s" %
+                    (vr.name, 'up' if vr.agent_state else 'down'))
 
-            try:
-                state_up = False
-                for vr_status in agents_status[vr.name]['NodeStatus']['process_status'] or []:
-                    if (vr_status['module_id'] != constants.MODULE_VROUTER_AGENT_NAME):
-                        continue
-                    if (int(vr_status['instance_id']) == 0 and
-                            vr_status['state'] == 'Functional'):
-                        vr.set_agent_state(True)
-                        state_up = True
-                        break
-                if not state_up:
-                    vr.set_agent_state(False)
-            except Exception as e:
-                vr.set_agent_state(False)
+    def _get_anti_affinity_vrouters(self, si, vm_ids):
+        vr_set = set()
+        for vm_id in si.virtual_machines:
+            if vm_id in vm_ids:
                 continue
+            anti_affinity_vm = VirtualMachineSM.get(vm_id)
+            if anti_affinity_vm and anti_affinity_vm.virtual_router:
+                vr_set.add(anti_affinity_vm.virtual_router)
+        return vr_set
 
     def _get_candidates(self, si, vm):
         if vm.virtual_router:
             return [vm.virtual_router]
 
-        vr_list = VirtualRouterSM._dict.keys()
-        for vm_id in si.virtual_machines:
-            if vm_id == vm.uuid:
-                continue
-            anti_affinity_vm = VirtualMachineSM.get(vm_id)
-            if anti_affinity_vm:
-                try:
-                    vr_list.remove(anti_affinity_vm.virtual_router)
-                except ValueError:
-                    pass
-
-        for vr in VirtualRouterSM.values():
-            if not vr.agent_state:
-                try:
-                    vr_list.remove(vr.uuid)
-                except ValueError:
-                    pass
+        vr_list = VirtualRouterSM.load_index.running(
+            self._get_anti_affinity_vrouters(si, [vm.uuid]))
         if len(vr_list) == 0 :
             self._logger.error("No vrouters are available for scheduling")
         return vr_list
 
+    def _choose_vrouters(self, count, exclude):
+        """Return up to count distinct random running vrouters not in
+        exclude.
+        """
+        return VirtualRouterSM.load_index.sample(count, exclude)
+
+    def schedule_batch(self, si, vms):
+        """Schedule all the given virtual machines of a service instance.
+
+        Each virtual machine is placed on a different vrouter, none of which
+        already hosts another virtual machine of the service instance.
+        Returns a dict of the chosen vrouter per virtual machine uuid,
+        virtual machines which could not be scheduled are left out.
+        """
+        vm_ids = set(vm.uuid for vm in vms)
+        exclude = self._get_anti_affinity_vrouters(si, vm_ids)
+        placement = {}
+        unscheduled = []
+        for vm in vms:
+            if vm.virtual_router:
+                placement[vm.uuid] = vm.virtual_router
+                exclude.add(vm.virtual_router)
+            else:
+                unscheduled.append(vm)
+        if not unscheduled:
+            return placement
+
+        chosen_vrouters = self._choose_vrouters(len(unscheduled), exclude)
+        if len(chosen_vrouters) < len(unscheduled):
+            self._logger.error("Only %d vrouters are available for "
+                               "scheduling %d VMs of %s" %
+                               (len(chosen_vrouters), len(unscheduled),
+                                ':'.join(si.fq_name)))
+        for vm, chosen_vrouter in zip(unscheduled, chosen_vrouters):
+            self._vnc_lib.ref_update('virtual-router', chosen_vrouter,
+                'virtual-machine', vm.uuid, None, 'ADD')
+            placement[vm.uuid] = chosen_vrouter
+        return placement
+
 class RandomScheduler(VRouterScheduler):
     """Randomly allocate a vrouter agent for virtual machine of a service
     instance."""
     def schedule(self, si, vm):
-        candidates = self._get_candidates(si, vm)
-        if not candidates:
-            return None
-        chosen_vrouter = random.choice(candidates)
-        self._vnc_lib.ref_update('virtual-router', chosen_vrouter,
-            'virtual-machine', vm.uuid, None, 'ADD')
-        return chosen_vrouter
+        return self.schedule_batch(si, [vm]).get(vm.uuid)
+
+class LeastLoadedScheduler(VRouterScheduler):
+    """Allocate the running vrouter agent hosting the fewest virtual
+    machines."""
+    def _choose_vrouters(self, count, exclude):
+        return VirtualRouterSM.load_index.least_loaded(count, exclude)
+
+    def schedule(self, si, vm):
+        return self.schedule_batch(si, [vm]).get(vm.uuid)
+
+class SpreadScheduler(LeastLoadedScheduler):
+    """Randomly allocate one of the least loaded running vrouter agents, so
+    that virtual machines scheduled before the vrouter loads are refreshed
+    do not all land on the same vrouter."""
+
+    # number of least loaded vrouters considered per virtual machine
+    SPREAD_FACTOR = 4
+
+    def _choose_vrouters(self, count, exclude):
+        candidates = VirtualRouterSM.load_index.least_loaded(
+            count * self.SPREAD_FACTOR, exclude)
+        return random.sample(candidates, min(count, len(candidates)))
@@ -11,6 +11,17 @@ class ContrailLoadBalancerAbstractDriver(object):
     """
     __metaclass__ = abc.ABCMeta
 
+    def begin_batch(self):
+        """Called before a batch of changes (e.g. the initial sync).
+
+        Drivers may defer work until end_batch, so that changes to the same
+        loadbalancer are applied once.
+        """
+        pass
+
+    def end_batch(self):
+        pass
+
     @abc.abstractmethod
     def create_loadbalancer(self, loadbalancer):
         pass
@@ -29,6 +29,10 @@ class OpencontrailLoadbalancerDriver(
         self._svc_manager = manager
         self._lb_template = None
         self.db = db
+        # loadbalancers whose service instance update is deferred to the
+        # end of the current batch, in order of first update
+        self._batch_depth = 0
+        self._pending_lb_updates = []
 
     def get_lb_template(self):
         st = ServiceTemplateSM.get(self._lb_template)
@@ -209,7 +213,35 @@ class OpencontrailLoadbalancerDriver(
             self._svc_manager.logger.error(str(ex))
         self.db.pool_remove(pool_id, ['service_instance'])
 
+    def begin_batch(self):
+        self._batch_depth += 1
+
+    def end_batch(self):
+        if not self._batch_depth:
+            return
+        self._batch_depth -= 1
+        if self._batch_depth:
+            return
+        pending = self._pending_lb_updates
+        self._pending_lb_updates = []
+        with self.db.batch():
+            for lb_id in pending:
+                try:
+                    self._do_update_loadbalancer_instance_v2(lb_id)
+                except Exception as e:
+                    self._svc_manager.logger.error(
+                        'Failed to update loadbalancer %s: %s' % (lb_id, e))
+
     def _update_loadbalancer_instance_v2(self, lb_id):
+        if self._batch_depth:
+            # the listeners and pools of a loadbalancer each update it,
+            # apply the update once with the final state
+            if lb_id not in self._pending_lb_updates:
+                self._pending_lb_updates.append(lb_id)
+            return
+        self._do_update_loadbalancer_instance_v2(lb_id)
+
+    def _do_update_loadbalancer_instance_v2(self, lb_id):
         lb = LoadbalancerSM.get(lb_id)
         if lb is None:
             msg = ('Unable to retrieve loadbalancer %s' % lb_id)
@@ -247,6 +279,8 @@ class OpencontrailLoadbalancerDriver(
                                         {'service_instance': si_obj.uuid})
 
     def _clear_loadbalancer_instance_v2(self, lb_id):
+        if lb_id in self._pending_lb_updates:
+            self._pending_lb_updates.remove(lb_id)
         driver_data = self.db.loadbalancer_driver_info_get(lb_id)
         if driver_data is None:
             return
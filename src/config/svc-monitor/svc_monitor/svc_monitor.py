@@ -10,6 +10,7 @@ import sys
 reload(sys)
 sys.setdefaultencoding('UTF8')
 import gevent
+import gevent.pool
 from gevent import monkey
 monkey.patch_all(thread=not 'unittest' in sys.modules)
 
@@ -21,6 +22,7 @@ import argparse
 import signal
 import random
 import hashlib
+import time
 
 import os
 
@@ -65,6 +67,8 @@ class SvcMonitor(object):
 
     def __init__(self, sm_logger=None, args=None):
         self._args = args
+        # the initial sync marks every object as an orphan candidate
+        self.last_orphan_audit = time.time()
         # initialize logger
         if sm_logger is not None:
             self.logger = sm_logger
@@ -102,6 +106,7 @@ class SvcMonitor(object):
             self._args.si_netns_scheduler_driver,
             self._vnc_lib, self._nova_client,
             None, self.logger, self._args)
+        self.logger.set_vrouter_scheduler(self.vrouter_scheduler)
 
         # load virtual machine instance manager
         self.vm_manager = importutils.import_object(
@@ -136,6 +141,7 @@ class SvcMonitor(object):
             self, self._vnc_lib,
             self._object_db, self._args)
         self._agent_manager.register_agent(self.loadbalancer_agent)
+        self.logger.set_loadbalancer_agent(self.loadbalancer_agent)
 
         # load a snat agent
         self.snat_agent = SNATAgent(self, self._vnc_lib,
@@ -268,46 +274,103 @@ class SvcMonitor(object):
         for si in ServiceInstanceSM.values():
             self.create_service_instance(si)
 
+    # Object types whose update() derives state from already loaded objects
+    # of another type, they are only loaded once those types are.
+    _SYNC_AFTER = {
+        'virtual_machine_interface': ['virtual_machine'],
+    }
+
+    def _sync_index_obj(self, obj, sync_index):
+        # Remember the objects the post-load passes have to look at so that
+        # they do not have to walk every collection again
+        if obj.obj_type == 'virtual_machine_interface':
+            if (obj.virtual_machine and obj.if_type and
+                    len(obj.name.split('__')) >= 4):
+                sync_index['si_link_vmis'].add(obj.uuid)
+            if obj.service_health_checks and obj.service_vm:
+                sync_index['old_link_vmis'].add(obj.uuid)
+        elif obj.obj_type == 'instance_ip':
+            if obj.service_instance_ip and obj.instance_ip_secondary:
+                sync_index['shared_iips'].add(obj.uuid)
+            if obj.service_instance or obj.service_health_check_ip:
+                sync_index['old_link_vmis'].update(
+                    obj.virtual_machine_interfaces)
+        elif obj.obj_type == 'interface_route_table':
+            if obj.service_instances:
+                sync_index['old_link_vmis'].update(
+                    obj.virtual_machine_interfaces)
+
+    def _sync_obj_type(self, cls, sync_index):
+        for objs in cls.list_obj_pages(page_size=self._args.sync_page_size):
+            for obj_dict in objs:
+                obj = cls.locate(obj_dict['uuid'], obj_dict)
+                if obj is not None:
+                    self._sync_index_obj(obj, sync_index)
+            # let the other object types make progress between pages
+            gevent.sleep(0)
+
+    def _sync_db(self):
+        sync_index = {
+            'si_link_vmis': set(),
+            'shared_iips': set(),
+            'old_link_vmis': set(),
+        }
+        obj_type_map = DBBaseSM.get_obj_type_map()
+        first = [cls for obj_type, cls in obj_type_map.items()
+                 if obj_type not in self._SYNC_AFTER]
+        after = [cls for obj_type, cls in obj_type_map.items()
+                 if obj_type in self._SYNC_AFTER]
+        for classes in (first, after):
+            pool = gevent.pool.Pool(self._args.sync_concurrency)
+            for cls in classes:
+                pool.spawn(self._sync_obj_type, cls, sync_index)
+            pool.join(raise_error=True)
+        return sync_index
+
     def sync_sm(self):
-        # Read and Sync all DBase
-        for cls in DBBaseSM.get_obj_type_map().values():
-            for obj in cls.list_obj():
-                cls.locate(obj['uuid'], obj)
+        # Read and Sync all DBase, independent types are read concurrently
+        start_time = time.time()
+        sync_index = self._sync_db()
+        self.logger.info("Loaded the config db in %.2f seconds" %
+                         (time.time() - start_time))
 
         # Link SI and VM
-        for vm in VirtualMachineSM.values():
-            if vm.service_instance:
+        for vmi_id in sync_index['si_link_vmis']:
+            vmi = VirtualMachineInterfaceSM.get(vmi_id)
+            if not vmi:
                 continue
-            for vmi_id in vm.virtual_machine_interfaces:
-                vmi = VirtualMachineInterfaceSM.get(vmi_id)
-                if not vmi:
-                    continue
-                self.port_delete_or_si_link(vm, vmi)
+            vm = VirtualMachineSM.get(vmi.virtual_machine)
+            if not vm or vm.service_instance:
+                continue
+            self.port_delete_or_si_link(vm, vmi)
 
         # invoke port tuple handling
         try:
-            self.port_tuple_agent.update_port_tuples()
+            self.port_tuple_agent.update_port_tuples(
+                iip_ids=sync_index['shared_iips'],
+                vmi_ids=sync_index['old_link_vmis'])
         except Exception:
             cgitb_error_log(self)
 
         # Load the loadbalancer driver
         self.loadbalancer_agent.load_drivers()
 
-        # Invoke the health monitors
-        for hm in HealthMonitorSM.values():
-            hm.sync()
+        with self.loadbalancer_agent.batch_updates():
+            # Invoke the health monitors
+            for hm in HealthMonitorSM.values():
+                hm.sync()
 
-        # Invoke the loadbalancers
-        for lb in LoadbalancerSM.values():
-            lb.sync()
+            # Invoke the loadbalancers
+            for lb in LoadbalancerSM.values():
+                lb.sync()
 
-        # Invoke the loadbalancer listeners
-        for lb_listener in LoadbalancerListenerSM.values():
-            lb_listener.sync()
+            # Invoke the loadbalancer listeners
+            for lb_listener in LoadbalancerListenerSM.values():
+                lb_listener.sync()
 
-        # Invoke the loadbalancer pools
-        for lb_pool in LoadbalancerPoolSM.values():
-            lb_pool.sync()
+            # Invoke the loadbalancer pools
+            for lb_pool in LoadbalancerPoolSM.values():
+                lb_pool.sync()
 
         # Audit the lb pools
         self.loadbalancer_agent.audit_lb_pools()
@@ -545,10 +608,26 @@ def skip_check_service(si):
     return False
 
 
+def _orphan_candidates(cls, full_audit):
+    candidates = cls.pop_orphan_candidates()
+    if full_audit:
+        return list(cls.values())
+    return filter(None, [cls.get(key) for key in candidates])
+
+
 def timer_callback(monitor):
+    # Orphans are only looked for among the objects created or whose refs
+    # changed since the last run. Everything is checked once per
+    # orphan_audit_interval in case an event was missed.
+    now = time.time()
+    full_audit = (now - monitor.last_orphan_audit >=
+                  monitor._args.orphan_audit_interval)
+    if full_audit:
+        monitor.last_orphan_audit = now
+
     # delete orphan shared iips
     iip_delete_list = []
-    for iip in InstanceIpSM.values():
+    for iip in _orphan_candidates(InstanceIpSM, full_audit):
         if not iip.instance_ip_secondary or not iip.service_instance_ip:
             continue
         if iip.service_instance:
@@ -561,7 +640,7 @@ def timer_callback(monitor):
 
     # delete vms without si
     vm_delete_list = []
-    for vm in VirtualMachineSM.values():
+    for vm in _orphan_candidates(VirtualMachineSM, full_audit):
         si = ServiceInstanceSM.get(vm.service_instance)
         if not si and vm.virtualization_type:
             vm_delete_list.append(vm)
@@ -570,7 +649,7 @@ def timer_callback(monitor):
 
     # delete vmis with si but no vms
     vmi_delete_list = []
-    for vmi in VirtualMachineInterfaceSM.values():
+    for vmi in _orphan_candidates(VirtualMachineInterfaceSM, full_audit):
         for si_uuid in vmi.service_instances:
             si = ServiceInstanceSM.get(si_uuid)
             if si and not vmi.virtual_machine:
@@ -592,7 +671,12 @@ def timer_callback(monitor):
             monitor._relaunch_service_instance(si)
 
     # check vns to be deleted
-    for project in ProjectSM.values():
+    projects = set(_orphan_candidates(ProjectSM, full_audit))
+    for vn in _orphan_candidates(VirtualNetworkSM, full_audit):
+        project = ProjectSM.get(vn.parent_key)
+        if project:
+            projects.add(project)
+    for project in projects:
         if project.service_instances:
             continue
 
@@ -690,6 +774,11 @@ def parse_args(args_str):
         'logging_conf': '',
         'logger_class': None,
         'check_service_interval': '60',
+        'orphan_audit_interval': '600',
+        'sync_concurrency': '8',
+        'sync_page_size': '1000',
+        'lb_config_uve_interval': '1',
+        'lb_update_batch_interval': '0.1',
         'nova_endpoint_type': 'internalURL',
         'rabbit_use_ssl': False,
         'kombu_ssl_version': '',
@@ -718,6 +807,7 @@ def parse_args(args_str):
         'si_netns_scheduler_driver':
         'svc_monitor.scheduler.vrouter_scheduler.RandomScheduler',
         'analytics_server_list': '127.0.0.1:8081',
+        'vrouter_health_ttl': '120',
         'availability_zone': None,
         'netns_availability_zone': None,
         'aaa_mode': cfgm_common.AAA_MODE_DEFAULT_VALUE,
@@ -822,6 +912,25 @@ def parse_args(args_str):
                         help="Cassandra password")
     parser.add_argument("--check_service_interval",
                         help="Check service interval")
+    parser.add_argument("--orphan_audit_interval", type=int,
+                        help="Interval in seconds between checks of all the "
+                             "objects for orphans")
+    parser.add_argument("--sync_concurrency", type=int,
+                        help="Number of object types read concurrently "
+                             "during the initial sync")
+    parser.add_argument("--sync_page_size", type=int,
+                        help="Number of objects read per db request "
+                             "during the initial sync")
+    parser.add_argument("--lb_config_uve_interval", type=float,
+                        help="Minimum interval in seconds between two "
+                             "config UVEs of a loadbalancer")
+    parser.add_argument("--lb_update_batch_interval", type=float,
+                        help="Seconds during which the loadbalancer updates "
+                             "of notifications are batched, 0 disables it")
+    parser.add_argument("--vrouter_health_ttl", type=int,
+                        help="Seconds the vrouter status read from analytics "
+                             "is reused, when analytics does not tag its "
+                             "responses with an ETag")
     SandeshConfig.add_parser_arguments(parser)
 
     args = parser.parse_args(remaining_argv)
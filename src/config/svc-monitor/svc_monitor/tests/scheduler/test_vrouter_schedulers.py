@@ -17,7 +17,10 @@
 #
 # @author: Edouard Thuleau, Cloudwatt.
 
+import BaseHTTPServer
+import json
 import mock
+import threading
 import unittest
 import six
 import cfgm_common.analytics_client as analytics
@@ -26,7 +29,8 @@ from sandesh_common.vns import constants
 import svc_monitor.scheduler.vrouter_scheduler as scheduler
 from vnc_api.vnc_api import VirtualRouter, VirtualMachine
 
-from svc_monitor.config_db import ServiceInstanceSM, VirtualRouterSM
+from svc_monitor.config_db import (ServiceInstanceSM, VirtualMachineSM,
+                                   VirtualRouterSM)
 import svc_monitor.tests.test_common_utils as test_utils
 
 AGENTS_STATUS = \
@@ -44,6 +48,35 @@ VROUTERS_MODE = \
 }
 
 
+class FakeAnalyticsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves the canned vrouter UVEs of the server, tagged with an ETag
+    if the server has one."""
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if 'VrouterAgent' in self.path:
+            uves = self.server.vrouters_mode
+        else:
+            uves = self.server.agents_status
+        etag = self.server.etag
+        if etag and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps({'value': [{'name': name, 'value': value}
+                                     for name, value in uves.items()]})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
 class TestRandomScheduler(unittest.TestCase):
 
     def setUp(self):
@@ -63,6 +96,7 @@ class TestRandomScheduler(unittest.TestCase):
     def tearDown(self):
         self.analytics_patch.stop()
         VirtualRouterSM.reset()
+        VirtualMachineSM.reset()
         ServiceInstanceSM.reset()
         super(TestRandomScheduler, self).tearDown()
 
@@ -125,6 +159,86 @@ class TestRandomScheduler(unittest.TestCase):
         self.assertTrue(VirtualRouterSM.get('vrouter1').agent_state)
         self.assertTrue(VirtualRouterSM.get('vrouter2').agent_state)
 
+    def _start_fake_analytics(self):
+        server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                           FakeAnalyticsHandler)
+        server.requests = []
+        server.etag = None
+        server.vrouters_mode = {
+            u'vrouter1': {u'VrouterAgent': {u'mode': u'VROUTER'}},
+            u'vrouter2': {u'VrouterAgent': {u'mode': u'VROUTER'}}}
+        server.agents_status = {
+            u'vrouter1': {u'NodeStatus': {u'process_status': [
+                {u'module_id': u'contrail-vrouter-agent',
+                 u'instance_id': u'0', u'state': u'Functional'}]}},
+            u'vrouter2': {u'NodeStatus': {u'process_status': [
+                {u'module_id': u'contrail-vrouter-agent',
+                 u'instance_id': u'0', u'state': u'Functional'}]}}}
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def _create_health_scheduler(self, server, ttl=0):
+        args = mock.MagicMock(netns_availability_zone=False,
+                              aaa_mode='no-auth', vrouter_health_ttl=ttl,
+                              analytics_server_list='127.0.0.1:%d' %
+                              server.server_address[1])
+        return scheduler.RandomScheduler(self.vnc_mock, mock.MagicMock(),
+            mock.MagicMock(), mock.MagicMock(), args)
+
+    def test_vrouter_health_cache(self):
+        server = self._start_fake_analytics()
+        server.etag = '"1"'
+        health_scheduler = self._create_health_scheduler(server)
+        vr1 = test_utils.create_test_virtual_router('vrouter1')
+        vr2 = test_utils.create_test_virtual_router('vrouter2')
+        vr1.agent_state = False
+        vr2.agent_state = False
+
+        health_scheduler.vrouters_running()
+        self.assertTrue(vr1.agent_state)
+        self.assertTrue(vr2.agent_state)
+        self.assertEqual(health_scheduler.agent_state_transitions, 2)
+        self.assertEqual(len(server.requests), 2)
+
+        # not modified, the state derived from the cached UVEs is reused
+        with mock.patch.object(health_scheduler, '_get_agent_state') as \
+                get_agent_state:
+            health_scheduler.vrouters_running()
+            self.assertFalse(get_agent_state.called)
+        self.assertEqual(len(server.requests), 4)
+
+        # only the vrouter whose status changed is looked at again, it is
+        # marked down after 3 down reports
+        server.etag = '"2"'
+        server.agents_status[u'vrouter2'][u'NodeStatus'][
+            u'process_status'][0][u'state'] = u'Non-Functional'
+        get_agent_state = health_scheduler._get_agent_state
+        with mock.patch.object(health_scheduler, '_get_agent_state',
+                               side_effect=get_agent_state) as \
+                get_agent_state_mock:
+            for i in range(3):
+                health_scheduler.vrouters_running()
+            get_agent_state_mock.assert_called_once_with(u'vrouter2')
+        self.assertTrue(vr1.agent_state)
+        self.assertFalse(vr2.agent_state)
+        self.assertEqual(health_scheduler.agent_state_transitions, 3)
+
+    def test_vrouter_health_cache_ttl(self):
+        server = self._start_fake_analytics()
+        health_scheduler = self._create_health_scheduler(server, ttl=3600)
+        vr1 = test_utils.create_test_virtual_router('vrouter1')
+        vr1.agent_state = False
+
+        health_scheduler.vrouters_running()
+        health_scheduler.vrouters_running()
+        self.assertTrue(vr1.agent_state)
+        # no ETag, the responses are reused until they are ttl old
+        self.assertEqual(len(server.requests), 2)
+
     def test_random_scheduling(self):
         random_patch = mock.patch('random.choice')
         random_mock = random_patch.start()
@@ -136,15 +250,104 @@ class TestRandomScheduler(unittest.TestCase):
         si = test_utils.create_test_si(name='test-instance', count=2,
             intf_list=['vn1', 'vn2'])
         vm = test_utils.create_test_virtual_machine('vm')
+        test_utils.create_test_virtual_router('vrouter1')
+        test_utils.create_test_virtual_router('vrouter2')
 
-        with mock.patch.object(scheduler.RandomScheduler, '_get_candidates',
-                return_value=['vrouter1', 'vrouter2']):
-            chosen_vrouter = self.scheduler.schedule(si, vm)
-            self.assertEqual(random_mock.call_count, 1)
-            self.assertEqual(chosen_vrouter, 'vrouter1')
+        chosen_vrouter = self.scheduler.schedule(si, vm)
+        self.assertEqual(random_mock.call_count, 1)
+        self.assertEqual(chosen_vrouter, 'vrouter1')
 
         random_patch.stop()
 
+    def _place_vm(self, vm, vr, service=True):
+        obj = {'fq_name': vm.fq_name,
+               'virtual_router_back_refs': [{'uuid': vr.uuid,
+                                             'to': vr.fq_name}]}
+        if service:
+            obj['service_instance_refs'] = [{'uuid': 'fake-si',
+                                             'to': ['fake-si']}]
+        vm.update(obj)
+        return vm
+
+    def test_load_index(self):
+        vr1 = test_utils.create_test_virtual_router('vr1')
+        vr2 = test_utils.create_test_virtual_router('vr2')
+        vr3 = test_utils.create_test_virtual_router('vr3')
+        load_index = VirtualRouterSM.load_index
+        self.assertEqual(len(load_index), 3)
+
+        vm1 = self._place_vm(test_utils.create_test_virtual_machine('vm1'),
+                             vr1)
+        self._place_vm(test_utils.create_test_virtual_machine('vm2'), vr1)
+        self._place_vm(test_utils.create_test_virtual_machine('vm3'), vr2)
+        # only service VMs count
+        self._place_vm(test_utils.create_test_virtual_machine('vm4'), vr3,
+                       service=False)
+        self._place_vm(test_utils.create_test_virtual_machine('vm5'), vr3,
+                       service=False)
+        self.assertEqual(load_index.load(vr1.uuid), 2)
+        self.assertEqual(load_index.load(vr3.uuid), 0)
+        self.assertEqual(load_index.least_loaded(3), ['vr3', 'vr2', 'vr1'])
+        self.assertEqual(load_index.least_loaded(1, exclude=set(['vr3'])),
+                         ['vr2'])
+
+        # down and deleted vrouters are not candidates
+        vr3.agent_state = False
+        self.assertEqual(load_index.least_loaded(3), ['vr2', 'vr1'])
+        VirtualRouterSM.delete(vr2.uuid)
+        self.assertEqual(load_index.least_loaded(3), ['vr1'])
+        self.assertEqual(load_index.running(), ['vr1'])
+        VirtualMachineSM.delete(vm1.uuid)
+        self.assertEqual(load_index.load(vr1.uuid), 1)
+        vr3.agent_state = True
+        self.assertEqual(load_index.least_loaded(3), ['vr3', 'vr1'])
+        self.assertEqual(sorted(load_index.running(exclude=set(['vr1']))),
+                         ['vr3'])
+        self.assertEqual(sorted(load_index.sample(3)), ['vr1', 'vr3'])
+        self.assertEqual(load_index.sample(3, exclude=set(['vr1'])), ['vr3'])
+        self.assertEqual(load_index.sample(1, exclude=set(['vr1', 'vr3'])),
+                         [])
+
+        # service VMs cached before their vrouter are counted
+        self._place_vm(test_utils.create_test_virtual_machine('vm6'), vr2)
+        vr2 = test_utils.create_test_virtual_router('vr2')
+        vr2.update({'fq_name': vr2.fq_name,
+                    'virtual_machine_refs': [{'uuid': 'vm6',
+                                              'to': ['vm6']}]})
+        self.assertEqual(load_index.load(vr2.uuid), 1)
+
+    def test_least_loaded_batch_scheduling(self):
+        least_loaded = scheduler.LeastLoadedScheduler(self.vnc_mock,
+            mock.MagicMock(), mock.MagicMock(), mock.MagicMock(),
+            mock.MagicMock(netns_availability_zone=False))
+        si = test_utils.create_test_si(name='test-instance', count=3,
+            intf_list=['vn1', 'vn2'])
+        vr1 = test_utils.create_test_virtual_router('vr1')
+        vr2 = test_utils.create_test_virtual_router('vr2')
+        vr3 = test_utils.create_test_virtual_router('vr3')
+        vr4 = test_utils.create_test_virtual_router('vr4')
+        self._place_vm(test_utils.create_test_virtual_machine('other-vm'),
+                       vr2)
+        vm1 = test_utils.create_test_virtual_machine('vm1')
+        vm2 = test_utils.create_test_virtual_machine('vm2')
+        vm3 = test_utils.create_test_virtual_machine('vm3')
+        for vm in (vm1, vm2, vm3):
+            si.virtual_machines.add(vm.uuid)
+        vm1.virtual_router = vr1.uuid
+
+        placement = least_loaded.schedule_batch(si, [vm2, vm3])
+        self.assertEqual(placement, {vm2.uuid: vr3.uuid, vm3.uuid: vr4.uuid})
+        self.vnc_mock.ref_update.assert_any_call('virtual-router', vr3.uuid,
+            'virtual-machine', vm2.uuid, None, 'ADD')
+        self.vnc_mock.ref_update.assert_any_call('virtual-router', vr4.uuid,
+            'virtual-machine', vm3.uuid, None, 'ADD')
+
+        # not enough vrouters left for the whole batch
+        vr3.agent_state = False
+        vr4.agent_state = False
+        placement = least_loaded.schedule_batch(si, [vm2, vm3])
+        self.assertEqual(placement, {vm2.uuid: vr2.uuid})
+
     def test_disabled_azs(self):
         class FakeAvailabilityZone(object):
             def __repr__(self):
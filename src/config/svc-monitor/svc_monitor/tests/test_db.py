@@ -0,0 +1,82 @@
+import mock
+import unittest
+
+from cfgm_common.vnc_object_db import VncObjectDBClient
+from svc_monitor.db import ServiceMonitorDB
+
+
+class ServiceMonitorDBTest(unittest.TestCase):
+    def setUp(self):
+        def init_db(db, server_list, cluster_id, keyspaces, *args, **kwargs):
+            db._cf_dict = {}
+            for cf_name in keyspaces[ServiceMonitorDB._KEYSPACE]:
+                db._cf_dict[cf_name] = mock.MagicMock(column_family=cf_name)
+
+        args = mock.Mock(cassandra_user=None, cassandra_password=None)
+        with mock.patch.object(VncObjectDBClient, '__init__', init_db):
+            self.db = ServiceMonitorDB(args, mock.Mock())
+        self.db.get_one_col = mock.Mock(return_value=None)
+        self.lb_cf = self.db._lb_cf
+        self.pool_cf = self.db._pool_cf
+
+    def test_batch_sent_on_exit(self):
+        with self.db.batch():
+            with self.db.batch():
+                self.assertTrue(self.db.loadbalancer_config_insert(
+                    'lb1', {'id': 'lb1'}))
+                self.db.loadbalancer_remove('lb2')
+            self.assertFalse(self.lb_cf.batch.called)
+        self.assertFalse(self.lb_cf.insert.called)
+        self.assertFalse(self.lb_cf.remove.called)
+        mutator = self.lb_cf.batch.return_value
+        self.assertEqual(mutator.insert.call_count, 1)
+        mutator.remove.assert_called_once_with('lb2', columns=None)
+        mutator.send.assert_called_once_with()
+    # end test_batch_sent_on_exit
+
+    def test_read_sends_pending_writes_of_key(self):
+        with self.db.batch():
+            self.db.loadbalancer_config_insert('lb1', {'id': 'lb1'})
+            self.db.pool_driver_info_insert('pool1', {})
+            # reads of other keys don't send the batch
+            self.db.loadbalancer_driver_info_get('lb2')
+            self.assertFalse(self.lb_cf.batch.called)
+            # a read of a pending key sends its column family only
+            self.db.loadbalancer_driver_info_get('lb1')
+            self.assertEqual(self.lb_cf.batch.call_count, 1)
+            self.assertFalse(self.pool_cf.batch.called)
+        self.assertEqual(self.lb_cf.batch.call_count, 1)
+        self.assertEqual(self.pool_cf.batch.call_count, 1)
+    # end test_read_sends_pending_writes_of_key
+
+    def test_failed_batch_resent_per_write(self):
+        self.lb_cf.batch.return_value.send.side_effect = Exception()
+        self.lb_cf.remove.side_effect = Exception()
+        self.db.begin_batch()
+        self.db.loadbalancer_config_insert('lb1', {'id': 'lb1'})
+        self.db.loadbalancer_remove('lb2')
+        self.assertEqual(self.db.end_batch(), 1)
+        self.assertEqual(self.lb_cf.insert.call_count, 1)
+        self.lb_cf.remove.assert_called_once_with('lb2', columns=None)
+        self.assertEqual(self.db.batch_write_failures, 1)
+        self.assertEqual(self.db._db_logger.error.call_count, 2)
+    # end test_failed_batch_resent_per_write
+
+    def test_batch_of_column_families(self):
+        si_cf = self.db._svc_si_cf
+        self.db.begin_batch(ServiceMonitorDB.LB_COLUMN_FAMILIES)
+        self.db.loadbalancer_config_insert('lb1', {'id': 'lb1'})
+        # writes to the other column families are not deferred
+        self.db.service_instance_insert('si1', {'state': 'active'})
+        self.assertEqual(si_cf.insert.call_count, 1)
+        self.assertFalse(self.lb_cf.insert.called)
+        with self.db.batch():
+            self.db.service_instance_insert('si2', {'state': 'active'})
+        self.assertEqual(si_cf.batch.call_count, 1)
+        # the loadbalancer writes wait for the end of their own batch
+        self.assertFalse(self.lb_cf.batch.called)
+        self.assertEqual(self.db.end_batch(
+            ServiceMonitorDB.LB_COLUMN_FAMILIES), 0)
+        self.assertEqual(self.lb_cf.batch.call_count, 1)
+    # end test_batch_of_column_families
+#end ServiceMonitorDBTest(unittest.TestCase):
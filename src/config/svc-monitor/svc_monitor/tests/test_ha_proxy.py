@@ -1,3 +1,4 @@
+import gevent
 import mock
 from mock import patch
 import unittest
@@ -372,6 +373,48 @@ OpencontrailLoadbalancerDriver")
     # Create a new vip and link it to the pool
     # Expected result is the service instance is updated with new interface list
     #
+    def test_batched_loadbalancer_updates(self):
+        self.object_db.batch = mock.MagicMock()
+        self.object_db.loadbalancer_driver_info_get.return_value = None
+        driver = self.lb_agent._loadbalancer_driver['opencontrail']
+        with mock.patch.object(driver,
+                '_do_update_loadbalancer_instance_v2') as update_lb:
+            with self.lb_agent.batch_updates():
+                driver.create_loadbalancer({'id': 'lb1'})
+                driver.create_listener({'loadbalancer_id': 'lb1'})
+                driver.create_loadbalancer({'id': 'lb2'})
+                driver.update_listener(None, {'loadbalancer_id': 'lb1'})
+                driver.create_loadbalancer({'id': 'lb3'})
+                driver.delete_loadbalancer({'id': 'lb3'})
+                self.assertFalse(update_lb.called)
+            self.assertEqual([c[0][0] for c in update_lb.call_args_list],
+                             ['lb1', 'lb2'])
+            # outside of a batch the update is applied immediately
+            driver.create_loadbalancer({'id': 'lb1'})
+            self.assertEqual(update_lb.call_count, 3)
+    # end test_batched_loadbalancer_updates
+
+    def test_notification_update_window(self):
+        self.object_db.batch = mock.MagicMock()
+        self.object_db.loadbalancer_driver_info_get.return_value = None
+        self.lb_agent._lb_update_batch_interval = 0.1
+        driver = self.lb_agent._loadbalancer_driver['opencontrail']
+        with mock.patch.object(driver,
+                '_do_update_loadbalancer_instance_v2') as update_lb:
+            # updates of the notifications received within the interval
+            # are applied once at its end
+            self.lb_agent._open_update_window()
+            driver.create_loadbalancer({'id': 'lb1'})
+            self.lb_agent._open_update_window()
+            driver.create_listener({'loadbalancer_id': 'lb1'})
+            self.assertFalse(update_lb.called)
+            self.assertEqual(self.object_db.begin_batch.call_count, 1)
+            gevent.sleep(0.2)
+            update_lb.assert_called_once_with('lb1')
+            self.assertEqual(self.object_db.end_batch.call_count, 1)
+            self.assertIsNone(self.lb_agent._update_window)
+    # end test_notification_update_window
+
     def test_update_vip(self):
         project = self.create_project("fake-project", "project")
         vip = self.create_vip('vip', project, 'fake-vip-vn', 'vmi', '1.1.1.1')
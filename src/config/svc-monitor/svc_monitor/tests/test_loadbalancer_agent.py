@@ -1,3 +1,4 @@
+import gevent
 import mock
 from mock import patch
 import unittest
@@ -12,6 +13,7 @@ class LoadbalancerAgentTest(unittest.TestCase):
     def setUp(self):
         self.vnc_lib = mock.Mock()
         self.cassandra = mock.Mock()
+        self.cassandra.batch = mock.MagicMock()
         self.logger = mock.Mock()
         self.svc = mock.Mock()
         self._db = {}
@@ -587,4 +589,26 @@ class LoadbalancerAgentTest(unittest.TestCase):
         self.assertEqual(len(self.lb_agent._loadbalancer_driver['test-lb-provider']._pools), 0)
         self.assertEqual(len(self._db), 0)
     # end test_audit_pool
+
+    def test_lb_config_uve_coalescing(self):
+        self.lb_agent._lb_config_uve_interval = 0.1
+        with patch.object(self.lb_agent, '_send_lb_config_uve') as send_uve:
+            # the first change is sent right away, the following ones
+            # within the interval are sent once at its end
+            for i in range(5):
+                self.lb_agent.send_lb_config_uve('test-lb', False)
+            self.assertEqual(send_uve.call_count, 1)
+            self.assertEqual(self.lb_agent.lb_config_uves_suppressed, 3)
+            gevent.sleep(0.2)
+            self.assertEqual(send_uve.call_count, 2)
+
+            # deletes are not delayed and replace a pending update
+            self.lb_agent.send_lb_config_uve('test-lb', False)
+            self.lb_agent.send_lb_config_uve('test-lb', True)
+            self.assertEqual(send_uve.call_count, 3)
+            send_uve.assert_called_with('test-lb', True)
+            gevent.sleep(0.2)
+            self.assertEqual(send_uve.call_count, 3)
+            self.assertEqual(self.lb_agent.lb_config_uves_suppressed, 4)
+    # end test_lb_config_uve_coalescing
 #end LoadbalancerAgentTest(unittest.TestCase):
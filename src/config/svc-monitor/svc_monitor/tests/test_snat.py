@@ -27,6 +27,9 @@ class SnatInstanceManager(unittest.TestCase):
 
         self.mocked_scheduler = mock.MagicMock()
         self.mocked_scheduler.schedule = mock.Mock(return_value=('fake-virtual-router'))
+        self.mocked_scheduler.schedule_batch = mock.Mock(
+            side_effect=lambda si, vms: dict(
+                (vm.uuid, 'fake-virtual-router') for vm in vms))
 
         self.nova_mock = mock.MagicMock()
         self.mocked_db = mock.MagicMock()
@@ -653,6 +653,30 @@ class SvcMonitorTest(unittest.TestCase):
         ServiceMonitorLogger.info.assert_any_call(test_utils.AnyStringWith('template created with uuid'))
         self.assertTrue(self._svc_monitor.rabbit._db_resync_done)
 
+    def test_svc_monitor_sync_paged(self):
+        domains = ['domain-%d' % i for i in range(5)]
+        reads = []
+        def db_list(obj_type):
+            if obj_type == 'domain':
+                return (True, [([uuid], uuid) for uuid in domains], None)
+            return (False, None, None)
+
+        def db_read(obj_type, uuids, **kwargs):
+            if obj_type == 'domain':
+                reads.append(uuids)
+                return (True, [{'uuid': uuid, 'fq_name': [uuid]}
+                               for uuid in uuids])
+            return (False, None)
+
+        config_db.DomainSM.reset()
+        config_db.DBBaseSM._object_db.object_list = db_list
+        config_db.DBBaseSM._object_db.object_read = db_read
+        self.args.sync_page_size = 2
+        sync_index = self._svc_monitor._sync_db()
+        self.assertEqual(reads, [domains[0:2], domains[2:4], domains[4:]])
+        self.assertEqual(sorted(config_db.DomainSM.keys()), domains)
+        self.assertEqual(sync_index['si_link_vmis'], set())
+
     def test_svc_monitor_cgitb(self):
         self._svc_monitor.rabbit._vnc_subscribe_callback(si_add_info)
         self.assertTrue(ServiceMonitorLogger.log.called)
@@ -1012,6 +1036,32 @@ class SvcMonitorTest(unittest.TestCase):
         svc_monitor.timer_callback(self._svc_monitor)
         ServiceMonitorLogger.info.assert_any_call(test_utils.AnyStringWith('Deleting VM'))
 
+    def test_svc_monitor_timer_orphan_candidates(self):
+        st_obj = self.add_st('fake-template', 'fake-template')
+        si_obj = self.add_si('fake-instance', 'fake-instance', st_obj)
+        vm_obj = self.add_vm("fake-vm", 'fake-vm', si_obj, 'virtual-machine')
+        vm = config_db.VirtualMachineSM.get('fake-vm')
+        self._svc_monitor.delete_service_instance = mock.MagicMock()
+        svc_monitor.timer_callback(self._svc_monitor)
+        self.assertFalse(self._svc_monitor.delete_service_instance.called)
+
+        # the vm is not looked at again until its refs change
+        vm.service_instance = 'non-existent-instance'
+        svc_monitor.timer_callback(self._svc_monitor)
+        self.assertFalse(self._svc_monitor.delete_service_instance.called)
+        vm.delete_ref('service_instance', 'fake-instance')
+        vm.service_instance = 'non-existent-instance'
+        svc_monitor.timer_callback(self._svc_monitor)
+        self._svc_monitor.delete_service_instance.assert_called_with(vm)
+
+        # unless a full audit is due
+        self._svc_monitor.delete_service_instance.reset_mock()
+        svc_monitor.timer_callback(self._svc_monitor)
+        self.assertFalse(self._svc_monitor.delete_service_instance.called)
+        self._svc_monitor.last_orphan_audit = 0
+        svc_monitor.timer_callback(self._svc_monitor)
+        self._svc_monitor.delete_service_instance.assert_called_with(vm)
+
     def test_svc_monitor_timer_check_si_vm(self):
         st_obj = self.add_st('fake-template', 'fake-template')
         si_obj = self.add_si('fake-instance', 'fake-instance', st_obj)
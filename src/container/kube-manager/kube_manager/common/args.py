@@ -89,7 +89,10 @@ def parse_args(args_str=None):
         'nested_mode': '0',
         'global_tags': '1',
         'aps_name': '',
-        'kube_timer_interval': '60'
+        'kube_timer_interval': '60',
+        'kube_full_sync_interval': '3600',
+        'kube_list_page_size': '500',
+        'kube_event_workers': '1',
     }
     defaults.update(SandeshConfig.get_default_options(['DEFAULTS']))
 
@@ -11,11 +11,27 @@ import json
 from cfgm_common.vnc_db import DBBase
 from kube_manager.sandesh.kube_introspect import ttypes as introspect
 from ast import literal_eval
-from utils import get_vn_fq_name_from_dict_string
+from utils import get_vn_fq_name_from_dict_string, KeyWatchers
 
 class KubeDBBase(DBBase):
     obj_type = __name__
 
+    # Watchers of the uuids of deleted kubernetes objects.
+    _deleted_watchers = KeyWatchers()
+
+    @classmethod
+    def watch_deleted(cls):
+        """Get a set collecting the uuids of objects of this kind deleted
+        from now on."""
+        return cls._deleted_watchers.watch(cls)
+
+    @classmethod
+    def delete(cls, uuid):
+        if uuid not in cls._dict:
+            return
+        super(KubeDBBase, cls).delete(uuid)
+        cls._deleted_watchers.notify(cls, uuid)
+
     @classmethod
     def evaluate(self):
         pass
@@ -7,6 +7,12 @@ Kube Manager Utility methods and datastructures.
 """
 
 from ast import literal_eval
+from contextlib import contextmanager
+import time
+import weakref
+
+from gevent.event import Event
+from gevent.lock import Semaphore
 
 def get_dict_from_dict_string(dict_string, dict_string_kind):
     """Given a dictionary string of a kind, return its dictionary object.
@@ -23,6 +29,158 @@ def get_dict_from_dict_string(dict_string, dict_string_kind):
 
     return result_dict
 
+class EventQueueStats(object):
+    """Depth of an event queue and lag of its events, from their receipt
+    from the api server to the start of their processing.
+    """
+    def __init__(self, name, queue):
+        self.name = name
+        self.queue = queue
+        self.events = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+
+    def record(self, event):
+        """Account an event taken from the queue."""
+        receive_time = event.get('receive_time')
+        if receive_time is None:
+            # Not from a watch.
+            return
+        lag = time.time() - receive_time
+        self.events += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+
+    def get_depth(self):
+        return self.queue.qsize()
+
+    def get_avg_lag(self):
+        if not self.events:
+            return 0.0
+        return self.total_lag / self.events
+
+class StageLatency(object):
+    """Number of runs and latency of one stage of an operation."""
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, duration):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def get_avg(self):
+        if not self.count:
+            return 0.0
+        return self.total / self.count
+
+class StageLatencyStats(object):
+    """Latency of the stages of an operation, in the order the stages
+    were first run.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.stages = []
+        self._stage_map = {}
+
+    def record(self, stage, duration):
+        stage_latency = self._stage_map.get(stage)
+        if stage_latency is None:
+            stage_latency = StageLatency(stage)
+            self._stage_map[stage] = stage_latency
+            self.stages.append(stage_latency)
+        stage_latency.record(duration)
+
+    @contextmanager
+    def stage(self, stage):
+        """Time the enclosed block as a run of the given stage. A block
+        which raises is not recorded.
+        """
+        start = time.time()
+        yield
+        self.record(stage, time.time() - start)
+
+class KeyWatchers(object):
+    """Sets collecting the keys of the cached objects of a class as they
+    change, one set per watcher.
+
+    A watcher empties its set as it handles the keys. Sets are held weakly,
+    so a watcher which goes away stops collecting keys.
+    """
+    def __init__(self):
+        self._watchers = {}
+
+    def watch(self, cls):
+        keys = set()
+        self._watchers.setdefault(cls, []).append(weakref.ref(keys))
+        return keys
+
+    def notify(self, cls, key):
+        refs = self._watchers.get(cls)
+        if not refs:
+            return
+        for ref in list(refs):
+            keys = ref()
+            if keys is None:
+                refs.remove(ref)
+            else:
+                keys.add(key)
+
+@contextmanager
+def take_keys(*key_sets):
+    """Empty the given key sets, yielding the union of their keys.
+
+    The caller discards the keys from the yielded set as it handles them.
+    If the block raises, the keys left are put back into the key sets they
+    were taken from, to be handled on the next run.
+    """
+    taken = []
+    keys = set()
+    for key_set in key_sets:
+        taken.append((key_set, set(key_set)))
+        keys.update(key_set)
+        key_set.clear()
+    try:
+        yield keys
+    except:
+        for key_set, key_set_keys in taken:
+            key_set.update(key_set_keys & keys)
+        raise
+
+class SharedExclusiveLock(object):
+    """Lock held either by any number of shared holders, or by a single
+    exclusive holder.
+
+    An exclusive holder waits for the shared holders to be done, and the
+    shared holders coming after it wait for it.
+    """
+    def __init__(self):
+        self._shared = 0
+        self._lock = Semaphore()
+        self._no_shared = Event()
+        self._no_shared.set()
+
+    @contextmanager
+    def shared(self):
+        with self._lock:
+            self._shared += 1
+            self._no_shared.clear()
+        try:
+            yield
+        finally:
+            self._shared -= 1
+            if not self._shared:
+                self._no_shared.set()
+
+    @contextmanager
+    def exclusive(self):
+        with self._lock:
+            self._no_shared.wait()
+            yield
+
 class CustomNetwork(object):
     """Defines the keywords and format of a custom network specification.
     """
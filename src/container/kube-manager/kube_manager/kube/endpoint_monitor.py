@@ -10,6 +10,10 @@ class EndPointMonitor(KubeMonitor):
     def __init__(self, args=None, logger=None, q=None):
         super(EndPointMonitor, self).__init__(args, logger, q,
             resource_name='endpoints')
+        # Event still queued for each endpoints, and number of events merged
+        # into an event still queued.
+        self._queued_events = {}
+        self.events_coalesced = 0
         self.init_monitor()
         self.logger.info("EndPointyMonitor init done.");
 
@@ -30,12 +34,30 @@ class EndPointMonitor(KubeMonitor):
         if endpoint_name == "openshift-master-controllers":
             return
 
-        print("%s - Got %s %s %s:%s:%s"
-              %(self.name, event_type, kind, namespace, endpoint_name, uid))
         self.logger.debug("%s - Got %s %s %s:%s:%s"
               %(self.name, event_type, kind, namespace, endpoint_name, uid))
+
+        # Endpoints events carry the whole set of addresses of a service.
+        # When an event of the same endpoints has not been processed yet,
+        # it is updated to the latest set instead of queueing another one.
+        key = (namespace, endpoint_name)
+        if event_type in ('ADDED', 'MODIFIED'):
+            queued = self._queued_events.get(key)
+            if queued is not None:
+                queued['object'] = endpoint_data
+                self.events_coalesced += 1
+                return
+            # Called by the consumer of the event when it dequeues it.
+            event['dequeued'] = lambda: self._event_dequeued(key, event)
+            self._queued_events[key] = event
+        else:
+            self._queued_events.pop(key, None)
         self.q.put(event)
 
+    def _event_dequeued(self, key, event):
+        if self._queued_events.get(key) is event:
+            del self._queued_events[key]
+
     def event_callback(self):
         while True:
             self.process()
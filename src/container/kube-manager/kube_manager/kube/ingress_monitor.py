@@ -36,8 +36,6 @@ class IngressMonitor(KubeMonitor):
         else:
             uuid = event['object']['metadata'].get('uid')
 
-        print("%s - Got %s %s %s:%s:%s"
-              %(self.name, event_type, kind, namespace, name, uuid))
         self.logger.debug("%s - Got %s %s %s:%s:%s"
               %(self.name, event_type, kind, namespace, name, uuid))
         self.q.put(event)
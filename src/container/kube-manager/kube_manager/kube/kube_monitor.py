@@ -11,8 +11,35 @@ import requests
 from cfgm_common.utils import cgitb_hook
 
 
+class WatchStreamDecoder(object):
+    """Splits the data read from a watch stream into its lines, one line per
+    event. An event may span several reads, a read may hold several events.
+    """
+
+    def __init__(self):
+        self._pending = []
+
+    def feed(self, data):
+        """Return the lines completed by data."""
+        if '\n' not in data:
+            self._pending.append(data)
+            return []
+        lines = data.split('\n')
+        if self._pending:
+            self._pending.append(lines[0])
+            lines[0] = ''.join(self._pending)
+        last = lines.pop()
+        self._pending = [last] if last else []
+        return [line for line in lines if line]
+
+
 class KubeMonitor(object):
 
+    # Max bytes read from a watch stream at once.
+    WATCH_READ_SIZE = 64 * 1024
+    # Period (secs) over which the event rate is measured.
+    EVENT_RATE_INTERVAL = 10
+
     def __init__(self, args=None, logger=None, q=None, db=None,
                  resource_name='KubeMonitor', beta=False):
         self.name = type(self).__name__
@@ -24,10 +51,28 @@ class KubeMonitor(object):
         self.headers = {'Connection': 'Keep-Alive'}
         self.verify = False
         self.timeout = 60
+        # Max number of entries read per request by the initial sync,
+        # 0 reads all of them at once.
+        self.list_page_size = int(self.args.kube_list_page_size)
+        # Duration (secs) of the last initial sync.
+        self.init_sync_duration = None
+        # Last resourceVersion seen, the watch resumes from it.
+        self.resource_version = None
+        # Number of times the watch was reopened, and of the relists done
+        # because the resourceVersion was too old to resume from.
+        self.watch_reconnects = 0
+        self.watch_relists = 0
+        # Number of watch events received, and their rate (events/sec) over
+        # the last EVENT_RATE_INTERVAL.
+        self.events_received = 0
+        self.event_rate = 0.0
+        self._event_rate_start = time.time()
+        self._event_rate_count = 0
 
         # Per-monitor stream handle to api server.
         self.kube_api_resp = None
         self.kube_api_stream_handle = None
+        self.kube_api_stream_decoder = None
 
         # Resource name corresponding to this monitor.
         self.resource_name = resource_name
@@ -81,65 +126,90 @@ class KubeMonitor(object):
         base_url = self.beta_url if self.resource_beta else self.v1_url
         return "%s/%s" % (base_url, self.resource_name)
 
-    @staticmethod
-    def get_entry_url(base_url, entry):
-        """URL to an entry of this component.
-        This method returns a URL to a specific entry of this component.
-        """
-        return base_url + entry['metadata']['selfLink']
-
     def init_monitor(self):
         """Initialize/sync a monitor component.
         This method will initialize a monitor component.
         As a part of this init, this method will read existing entries in api
-        server and populate the local db.
+        server and populate the local db. Entries are listed a page at a time
+        and each page is processed before the next one is read.
         """
         # Get the URL to this component.
         url = self._get_component_url()
-
-        try:
-            resp = requests.get(url, headers=self.headers, verify=self.verify)
-            if resp.status_code != 200:
-                resp.close()
-                return
-        except requests.exceptions.RequestException as e:
-            self.logger.error("%s - %s" % (self.name, e))
-            return
-
-        initial_entries = resp.json()['items']
-        resp.close()
-        if initial_entries:
-            for entry in initial_entries:
-                entry_url = self.get_entry_url(self.url, entry)
-                try:
-                    resp = requests.get(entry_url, headers=self.headers,
-                                        verify=self.verify)
-                    if resp.status_code != 200:
-                        resp.close()
-                        continue
-                except requests.exceptions.RequestException as e:
-                    self.logger.error("%s - %s" % (self.name, e))
+        params = {}
+        if self.list_page_size > 0:
+            params['limit'] = self.list_page_size
+
+        start_time = time.time()
+        num_entries = 0
+        while True:
+            try:
+                resp = requests.get(url, params=dict(params),
+                                    headers=self.headers,
+                                    verify=self.verify)
+                if resp.status_code == 410 and 'continue' in params:
+                    # The list expired before we were done, start over.
+                    resp.close()
+                    self.logger.error("%s - List expired, relisting" %
+                                      self.name)
+                    del params['continue']
                     continue
-                try:
-                    # Construct the event and initiate processing.
-                    event = {'object':resp.json(), 'type':'ADDED'}
-                    self.process_event(event)
-                except ValueError:
-                    self.logger.error("Invalid data read from kube api server:"
-                                      " %s" % (entry))
-                except Exception as e:
-                    string_buf = StringIO()
-                    cgitb_hook(file=string_buf, format="text")
-                    err_msg = string_buf.getvalue()
-                    self.logger.error("%s - %s" %(self.name, err_msg))
+                if resp.status_code != 200:
+                    resp.close()
+                    return
+            except requests.exceptions.RequestException as e:
+                self.logger.error("%s - %s" % (self.name, e))
+                return
 
+            try:
+                entries = resp.json()
+            except ValueError:
+                self.logger.error("Invalid data read from kube api server:"
+                                  " %s" % (url))
+                return
+            finally:
                 resp.close()
 
+            # Entries of a list do not carry their kind.
+            kind = entries.get('kind', '')
+            if kind.endswith('List'):
+                kind = kind[:-len('List')]
+            for entry in entries.get('items') or []:
+                entry.setdefault('kind', kind)
+                self._process_initial_entry(entry)
+                num_entries += 1
+
+            list_metadata = entries.get('metadata') or {}
+            continue_token = list_metadata.get('continue')
+            if not continue_token:
+                self.resource_version = list_metadata.get('resourceVersion')
+                break
+            params['continue'] = continue_token
+
+        self.init_sync_duration = time.time() - start_time
+        self.logger.info("%s - Synced %d entries in %.3f secs" %
+                         (self.name, num_entries, self.init_sync_duration))
+
+    def _process_initial_entry(self, entry):
+        try:
+            # Construct the event and initiate processing.
+            event = {'object':entry, 'type':'ADDED'}
+            self.process_event(event)
+        except Exception as e:
+            string_buf = StringIO()
+            cgitb_hook(file=string_buf, format="text")
+            err_msg = string_buf.getvalue()
+            self.logger.error("%s - %s" %(self.name, err_msg))
+
     def register_monitor(self):
         """Register this component for notifications from api server.
+        The watch starts from the last resourceVersion seen, if any, so that
+        no event is lost between the initial sync or a previous watch and
+        this one.
         """
         if self.kube_api_resp:
             self.kube_api_resp.close()
+        self.kube_api_resp = None
+        self.kube_api_stream_handle = None
         if not self._is_kube_api_server_alive():
             msg = "kube_api_service is not available"
             self.logger.error("%s - %s" %(self.name, msg))
@@ -147,21 +217,46 @@ class KubeMonitor(object):
             return
 
         url = self._get_component_url()
+        params = {'watch': 'true'}
+        if self.resource_version:
+            params['resourceVersion'] = self.resource_version
         try:
-            resp = requests.get(url, params={'watch': 'true'},
+            resp = requests.get(url, params=params,
                                 stream=True, headers=self.headers,
                                 verify=self.verify)
+            if resp.status_code == 410:
+                resp.close()
+                self.relist()
+                return
             if resp.status_code != 200:
                 resp.close()
                 return
             # Get handle to events for this monitor.
             self.kube_api_resp = resp
-            self.kube_api_stream_handle = resp.iter_lines(chunk_size=256,
-                                                          delimiter='\n')
+            self.kube_api_stream_handle = resp.iter_content(
+                chunk_size=self.WATCH_READ_SIZE)
+            self.kube_api_stream_decoder = WatchStreamDecoder()
             self.logger.info("%s - Watches %s" %(self.name, url))
         except requests.exceptions.RequestException as e:
             self.logger.error("%s - %s" % (self.name, e))
 
+    def reconnect(self):
+        """Reopen the watch after the stream was closed or broken."""
+        self.watch_reconnects += 1
+        self.register_monitor()
+
+    def relist(self):
+        """Resync all the entries and watch from there.
+        Used when the api server no longer has the history since the last
+        resourceVersion seen.
+        """
+        self.watch_relists += 1
+        self.logger.error("%s - resourceVersion %s too old, relisting" %
+                          (self.name, self.resource_version))
+        self.resource_version = None
+        self.init_monitor()
+        self.register_monitor()
+
     def get_resource(self, resource_type, resource_name,
                      namespace=None, beta=False):
         json_data = {}
@@ -218,34 +313,79 @@ class KubeMonitor(object):
         if not self.kube_api_stream_handle:
             self.logger.error("%s - Event handler not found. "
                               "Cannot process its events." % self.name)
+            time.sleep(1)
+            self.reconnect()
             return
 
         resp = self.kube_api_resp
         fp = resp.raw._fp.fp
         if fp is None:
-            self.register_monitor()
+            self.reconnect()
             return
 
         try:
-            line = next(self.kube_api_stream_handle)
-            if not line:
-                return
+            # Whatever the stream has, up to WATCH_READ_SIZE.
+            data = next(self.kube_api_stream_handle)
         except StopIteration:
+            # The api server closed the watch.
+            self.reconnect()
             return
         except requests.exceptions.ChunkedEncodingError as e:
             self.logger.error("%s - %s" % (self.name, e))
+            self.reconnect()
             return
 
-        try:
-            self.process_event(json.loads(line))
-        except ValueError:
-            self.logger.error(
-                "Invalid JSON data from response stream:%s" % line)
-        except Exception as e:
-            string_buf = StringIO()
-            cgitb_hook(file=string_buf, format="text")
-            err_msg = string_buf.getvalue()
-            self.logger.error("%s - %s" % (self.name, err_msg))
+        # All the events read are processed before yielding.
+        receive_time = time.time()
+        for line in self.kube_api_stream_decoder.feed(data):
+            try:
+                event = json.loads(line)
+            except ValueError:
+                self.logger.error(
+                    "Invalid JSON data from response stream:%s" % line)
+                continue
+
+            if event.get('type') == 'ERROR':
+                status = event.get('object') or {}
+                if status.get('code') == 410:
+                    self.relist()
+                else:
+                    self.logger.error("%s - Watch error: %s" %
+                                      (self.name, status.get('message')))
+                    self.reconnect()
+                return
+
+            resource_version = event['object'].get(
+                'metadata', {}).get('resourceVersion')
+            if resource_version:
+                self.resource_version = resource_version
+            self._count_event(receive_time)
+            # Lets the consumer of the queue measure its lag.
+            event['receive_time'] = receive_time
+
+            try:
+                self.process_event(event)
+            except Exception as e:
+                string_buf = StringIO()
+                cgitb_hook(file=string_buf, format="text")
+                err_msg = string_buf.getvalue()
+                self.logger.error("%s - %s" % (self.name, err_msg))
+
+    def get_event_rate(self):
+        elapsed = time.time() - self._event_rate_start
+        if elapsed >= self.EVENT_RATE_INTERVAL:
+            # No event since the end of the last measure.
+            return self._event_rate_count / elapsed
+        return self.event_rate
+
+    def _count_event(self, now):
+        self.events_received += 1
+        self._event_rate_count += 1
+        elapsed = now - self._event_rate_start
+        if elapsed >= self.EVENT_RATE_INTERVAL:
+            self.event_rate = self._event_rate_count / elapsed
+            self._event_rate_start = now
+            self._event_rate_count = 0
 
     def process_event(self, event):
         """Process an event."""
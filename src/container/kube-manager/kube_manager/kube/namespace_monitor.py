@@ -14,16 +14,6 @@ class NamespaceMonitor(KubeMonitor):
         self.init_monitor()
         self.logger.info("NamespaceMonitor init done.");
 
-    def get_entry_url(self, base_url, entry):
-        """Get URL to an entry.
-        NOTE: This method overrides a generic implementation provided by
-        KubeMonitor base class. This is to workaround a bug in Kuberneters
-        config stored in its api server where the 'selfLink' is not correctly
-        populated for namespace entries. Once that bug is fixed, this method
-        should be removed.
-        """
-        return self.v1_url + "/namespaces/" +  entry['metadata']['name']
-
     def process_event(self, event):
         namespace_data = event['object']
         event_type = event['type']
@@ -42,8 +32,6 @@ class NamespaceMonitor(KubeMonitor):
         else:
             namespace_uuid = event['object']['metadata'].get('uid')
 
-        print("%s - Got %s %s %s:%s"
-              %(self.name, event_type, kind, name, namespace_uuid))
         self.logger.debug("%s - Got %s %s %s:%s"
               %(self.name, event_type, kind, name, namespace_uuid))
         self.q.put(event)
@@ -33,8 +33,6 @@ class NetworkPolicyMonitor(KubeMonitor):
         else:
             np_uuid = event['object']['metadata'].get('uid')
 
-        print("%s - Got %s %s %s:%s:%s"
-              %(self.name, event_type, kind, namespace, name, np_uuid))
         self.logger.debug("%s - Got %s %s %s:%s:%s"
               %(self.name, event_type, kind, namespace, name, np_uuid))
         self.q.put(event)
@@ -42,8 +42,6 @@ class PodMonitor(KubeMonitor):
         else:
             pod_uuid = pod_data['metadata'].get('uid')
 
-        print("%s - Got %s %s %s:%s:%s"
-              %(self.name, event_type, kind, namespace, pod_name, pod_uuid))
         self.logger.debug("%s - Got %s %s %s:%s:%s"
               %(self.name, event_type, kind, namespace, pod_name, pod_uuid))
         self.q.put(event)
@@ -36,8 +36,6 @@ class ServiceMonitor(KubeMonitor):
         else:
             service_uuid = service_data['metadata'].get('uid')
 
-        print("%s - Got %s %s %s:%s:%s"
-              %(self.name, event_type, kind, namespace, service_name, service_uuid))
         self.logger.debug("%s - Got %s %s %s:%s:%s"
               %(self.name, event_type, kind, namespace, service_name, service_uuid))
         self.q.put(event)
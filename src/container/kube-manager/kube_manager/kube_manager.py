@@ -174,6 +174,59 @@ class KubeNetworkManager(object):
             connections=introspect.KubeApiConnections(**statuses))
         response.response(request.context())
 
+    @classmethod
+    def sandesh_handle_kube_watch_status_request(cls, request):
+        monitors = []
+        kube_manager = cls.get_instance()
+        if kube_manager is not None:
+            for key, value in sorted(kube_manager.monitors.items()):
+                sync_duration = value.init_sync_duration
+                monitors.append(introspect.KubeMonitorWatchStatus(
+                    monitor=key + '_monitor',
+                    resource_version=value.resource_version or '',
+                    reconnects=value.watch_reconnects,
+                    relists=value.watch_relists,
+                    init_sync_duration_msecs=int(
+                        (sync_duration or 0) * 1000),
+                    events=value.events_received,
+                    events_per_sec=value.get_event_rate()))
+
+        response = introspect.KubeWatchStatusResp(monitors=monitors)
+        response.response(request.context())
+
+    @classmethod
+    def sandesh_handle_kube_event_queue_status_request(cls, request):
+        queues = []
+        kube_manager = cls.get_instance()
+        if kube_manager is not None and kube_manager.vnc is not None:
+            for stats in kube_manager.vnc.get_event_queue_stats():
+                queues.append(introspect.KubeEventQueue(
+                    name=stats.name,
+                    depth=stats.get_depth(),
+                    events=stats.events,
+                    avg_lag_msecs=int(stats.get_avg_lag() * 1000),
+                    max_lag_msecs=int(stats.max_lag * 1000)))
+
+        response = introspect.KubeEventQueueStatusResp(queues=queues)
+        response.response(request.context())
+
+    @classmethod
+    def sandesh_handle_kube_latency_status_request(cls, request):
+        stages = []
+        kube_manager = cls.get_instance()
+        if kube_manager is not None and kube_manager.vnc is not None:
+            for stats in kube_manager.vnc.get_latency_stats():
+                for stage in stats.stages:
+                    stages.append(introspect.KubeStageLatency(
+                        operation=stats.name,
+                        stage=stage.name,
+                        count=stage.count,
+                        avg_msecs=int(stage.get_avg() * 1000),
+                        max_msecs=int(stage.max * 1000)))
+
+        response = introspect.KubeLatencyStatusResp(stages=stages)
+        response.response(request.context())
+
     @classmethod
     def sandesh_handle_mastership_status_request(cls, request):
         kube_manager = cls.get_instance()
@@ -199,6 +252,12 @@ def run_kube_manager(km_logger, args, kube_api_skip, event_queue,
         KubeNetworkManager.sandesh_handle_greenlet_stack_list_request
     introspect.KubeApiConnectionStatus.handle_request =\
         KubeNetworkManager.sandesh_handle_kube_api_connection_status_request
+    introspect.KubeWatchStatus.handle_request =\
+        KubeNetworkManager.sandesh_handle_kube_watch_status_request
+    introspect.KubeEventQueueStatus.handle_request =\
+        KubeNetworkManager.sandesh_handle_kube_event_queue_status_request
+    introspect.KubeLatencyStatus.handle_request =\
+        KubeNetworkManager.sandesh_handle_kube_latency_status_request
     introspect.MastershipStatus.handle_request =\
         KubeNetworkManager.sandesh_handle_mastership_status_request
 
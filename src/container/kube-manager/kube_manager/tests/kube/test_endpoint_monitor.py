@@ -0,0 +1,73 @@
+#
+# Copyright (c) 2017 Juniper Networks, Inc. All rights reserved.
+#
+
+import mock
+import unittest
+
+from gevent.queue import Queue
+
+from kube_manager.kube import endpoint_monitor
+from kube_manager.kube import kube_monitor
+
+
+class EndPointMonitorTest(unittest.TestCase):
+    def setUp(self):
+        self.args = mock.Mock()
+        self.args.orchestrator = 'kubernetes'
+        self.args.token = ''
+        self.args.kube_object_cache = 'False'
+        self.args.kubernetes_api_server = 'localhost'
+        self.args.kubernetes_api_port = '8080'
+        self.args.kube_list_page_size = '500'
+        self.q = Queue()
+        with mock.patch.object(kube_monitor.KubeMonitor,
+                               '_is_kube_api_server_alive',
+                               return_value=True),\
+             mock.patch.object(kube_monitor.KubeMonitor, 'init_monitor'):
+            self.monitor = endpoint_monitor.EndPointMonitor(
+                args=self.args, logger=mock.Mock(), q=self.q)
+
+    @staticmethod
+    def _event(event_type, name, ips):
+        return {'type': event_type, 'object': {
+            'kind': 'Endpoints',
+            'metadata': {'name': name, 'namespace': 'ns', 'uid': name},
+            'subsets': [{'addresses': [{'ip': ip} for ip in ips]}]}}
+
+    def test_coalesce_queued_events(self):
+        self.monitor.process_event(self._event('ADDED', 'svc1', ['1.1.1.1']))
+        self.monitor.process_event(self._event('ADDED', 'svc2', ['2.2.2.2']))
+        self.monitor.process_event(
+            self._event('MODIFIED', 'svc1', ['1.1.1.1', '1.1.1.2']))
+        self.monitor.process_event(
+            self._event('MODIFIED', 'svc1', ['1.1.1.3']))
+        self.assertEqual(self.q.qsize(), 2)
+        self.assertEqual(self.monitor.events_coalesced, 2)
+
+        event = self.q.get()
+        self.assertEqual(event['type'], 'ADDED')
+        self.assertEqual(event['object']['subsets'][0]['addresses'],
+                         [{'ip': '1.1.1.3'}])
+        events = [self.q.get()]
+
+        # Events of endpoints being processed are queued.
+        event.pop('dequeued')()
+        self.assertEqual(self.monitor._queued_events.keys(), [('ns', 'svc2')])
+        self.monitor.process_event(
+            self._event('MODIFIED', 'svc1', ['1.1.1.4']))
+        self.assertEqual(self.q.qsize(), 1)
+
+        # Deletes are never merged, nor merged into.
+        self.monitor.process_event(self._event('DELETED', 'svc1', []))
+        self.monitor.process_event(self._event('ADDED', 'svc1', ['1.1.1.5']))
+        events += [self.q.get(), self.q.get(), self.q.get()]
+        self.assertEqual([e['type'] for e in events[1:]],
+                         ['MODIFIED', 'DELETED', 'ADDED'])
+        self.assertEqual(self.monitor.events_coalesced, 2)
+
+        # Dequeued events are not kept.
+        for event in events:
+            if 'dequeued' in event:
+                event.pop('dequeued')()
+        self.assertEqual(self.monitor._queued_events, {})
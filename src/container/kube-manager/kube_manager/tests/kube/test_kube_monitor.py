@@ -0,0 +1,207 @@
+#
+# Copyright (c) 2017 Juniper Networks, Inc. All rights reserved.
+#
+
+import BaseHTTPServer
+import json
+import mock
+import SocketServer
+import threading
+import unittest
+import urlparse
+
+from kube_manager.kube import kube_monitor
+
+
+class FakeResponse(object):
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+
+    def json(self):
+        return self.data
+
+    def close(self):
+        pass
+
+
+class FakeKubeApiHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        self.server.requests.append(
+            (url.path, dict(urlparse.parse_qsl(url.query))))
+        status, objs = self.server.responses.pop(0)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        # one chunk per object, as the api server does for watches
+        for obj in objs:
+            data = json.dumps(obj) + '\n'
+            self.wfile.write('%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.write('0\r\n\r\n')
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeKubeApiServer(SocketServer.ThreadingMixIn,
+                        BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, responses):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           FakeKubeApiHandler)
+        self.requests = []
+        self.responses = responses
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class KubeMonitorTest(unittest.TestCase):
+    def setUp(self):
+        self.args = mock.Mock()
+        self.args.orchestrator = 'kubernetes'
+        self.args.token = ''
+        self.args.kube_object_cache = 'False'
+        self.args.kubernetes_api_server = 'localhost'
+        self.args.kubernetes_api_port = '8080'
+        self.args.kube_list_page_size = '2'
+        with mock.patch.object(kube_monitor.KubeMonitor,
+                               '_is_kube_api_server_alive',
+                               return_value=True):
+            self.monitor = kube_monitor.KubeMonitor(
+                args=self.args, logger=mock.Mock(), resource_name='pods')
+        self.events = []
+        self.monitor.process_event = self.events.append
+
+    @staticmethod
+    def _page(names, continue_token=None):
+        metadata = {'resourceVersion': '10'}
+        if continue_token:
+            metadata['continue'] = continue_token
+        return {'kind': 'PodList', 'metadata': metadata,
+                'items': [{'metadata': {'name': name}} for name in names]}
+
+    def test_init_monitor_pages(self):
+        pages = [FakeResponse(self._page(['pod1', 'pod2'], 'token1')),
+                 FakeResponse(self._page(['pod3']))]
+        with mock.patch.object(kube_monitor.requests, 'get',
+                               side_effect=pages) as get:
+            self.monitor.init_monitor()
+
+        # one request per page, no request per entry
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(get.call_args_list[0][1]['params'], {'limit': 2})
+        self.assertEqual(get.call_args_list[1][1]['params'],
+                         {'limit': 2, 'continue': 'token1'})
+        self.assertEqual(
+            [(e['type'], e['object']['kind'], e['object']['metadata']['name'])
+             for e in self.events],
+            [('ADDED', 'Pod', 'pod1'), ('ADDED', 'Pod', 'pod2'),
+             ('ADDED', 'Pod', 'pod3')])
+        self.assertIsNotNone(self.monitor.init_sync_duration)
+
+    def test_init_monitor_expired_list(self):
+        pages = [FakeResponse(self._page(['pod1', 'pod2'], 'token1')),
+                 FakeResponse({}, status_code=410),
+                 FakeResponse(self._page(['pod1', 'pod2'], 'token2')),
+                 FakeResponse(self._page(['pod3']))]
+        with mock.patch.object(kube_monitor.requests, 'get',
+                               side_effect=pages) as get:
+            self.monitor.init_monitor()
+
+        self.assertEqual(get.call_count, 4)
+        # relisted from the start
+        self.assertEqual(get.call_args_list[2][1]['params'], {'limit': 2})
+        self.assertEqual([e['object']['metadata']['name']
+                          for e in self.events],
+                         ['pod1', 'pod2', 'pod1', 'pod2', 'pod3'])
+
+
+class KubeMonitorWatchTest(unittest.TestCase):
+    @staticmethod
+    def _pod(name, resource_version):
+        return {'metadata': {'name': name,
+                             'resourceVersion': resource_version}}
+
+    def _event(self, event_type, name, resource_version):
+        obj = self._pod(name, resource_version)
+        obj['kind'] = 'Pod'
+        return {'type': event_type, 'object': obj}
+
+    def test_watch_resume(self):
+        responses = [
+            (200, [{'kind': 'PodList', 'metadata': {'resourceVersion': '10'},
+                    'items': [self._pod('pod1', '5')]}]),
+            # the watch is closed after two events
+            (200, [self._event('ADDED', 'pod2', '11'),
+                   self._event('MODIFIED', 'pod2', '12')]),
+            # history since 12 compacted away
+            (200, [{'type': 'ERROR',
+                    'object': {'kind': 'Status', 'code': 410,
+                               'message': 'too old resource version'}}]),
+            (200, [{'kind': 'PodList', 'metadata': {'resourceVersion': '20'},
+                    'items': [self._pod('pod1', '5'),
+                              self._pod('pod2', '12')]}]),
+            (200, []),
+        ]
+        server = FakeKubeApiServer(responses)
+        self.addCleanup(server.stop)
+
+        args = mock.Mock()
+        args.orchestrator = 'kubernetes'
+        args.token = ''
+        args.kube_object_cache = 'False'
+        args.kubernetes_api_server = '127.0.0.1'
+        args.kubernetes_api_port = server.server_address[1]
+        args.kube_list_page_size = '0'
+        monitor = kube_monitor.KubeMonitor(
+            args=args, logger=mock.Mock(), resource_name='pods')
+        events = []
+        monitor.process_event = events.append
+
+        monitor.init_monitor()
+        monitor.register_monitor()
+        for _ in range(20):
+            if not server.responses:
+                break
+            monitor.process()
+
+        self.assertEqual([params for _, params in server.requests], [
+            {},
+            {'watch': 'true', 'resourceVersion': '10'},
+            {'watch': 'true', 'resourceVersion': '12'},
+            {},
+            {'watch': 'true', 'resourceVersion': '20'}])
+        self.assertEqual([(e['type'], e['object']['metadata']['name'])
+                          for e in events],
+                         [('ADDED', 'pod1'), ('ADDED', 'pod2'),
+                          ('MODIFIED', 'pod2'), ('ADDED', 'pod1'),
+                          ('ADDED', 'pod2')])
+        self.assertEqual(monitor.watch_reconnects, 1)
+        self.assertEqual(monitor.watch_relists, 1)
+        self.assertEqual(monitor.resource_version, '20')
+        self.assertEqual(monitor.events_received, 2)
+        self.assertTrue('receive_time' in events[1])
+
+
+class WatchStreamDecoderTest(unittest.TestCase):
+    def test_feed(self):
+        decoder = kube_monitor.WatchStreamDecoder()
+        self.assertEqual(decoder.feed('{"a": '), [])
+        self.assertEqual(decoder.feed('1'), [])
+        # end of an event, a whole one and the start of another
+        self.assertEqual(decoder.feed('}\n{"b": 2}\n{"c"'),
+                         ['{"a": 1}', '{"b": 2}'])
+        self.assertEqual(decoder.feed(': 3}\n\n'), ['{"c": 3}'])
+        self.assertEqual(decoder.feed('{"d": 4}\n'), ['{"d": 4}'])
@@ -370,4 +370,26 @@ class ConfigDBTest(unittest.TestCase):
         config_db.ProjectKM.delete('project')
     # end test_add_delete_sg(self):
 
+    def test_add_update_delete_vrouter(self):
+        vr = VirtualRouter(name="host1", virtual_router_ip_address="1.1.1.1")
+        vr_dict = self.obj_to_dict(vr)
+        vr_dict['uuid'] = 'vr'
+        config_db.VirtualRouterKM._object_db.object_read = mock.Mock(return_value=(True, [vr_dict]))
+        config_db.VirtualRouterKM.locate('vr')
+        self.assertEqual(config_db.VirtualRouterKM.get_name_to_uuid('host1'), 'vr')
+        self.assertEqual(config_db.VirtualRouterKM.get_ip_addr_to_uuid('1.1.1.1'), 'vr')
+
+        vr_dict['fq_name'] = vr_dict['fq_name'][:-1] + ['host2']
+        vr_dict['virtual_router_ip_address'] = '1.1.1.2'
+        config_db.VirtualRouterKM.get('vr').update(vr_dict)
+        self.assertIsNone(config_db.VirtualRouterKM.get_name_to_uuid('host1'))
+        self.assertIsNone(config_db.VirtualRouterKM.get_ip_addr_to_uuid('1.1.1.1'))
+        self.assertEqual(config_db.VirtualRouterKM.get_name_to_uuid('host2'), 'vr')
+        self.assertEqual(config_db.VirtualRouterKM.get_ip_addr_to_uuid('1.1.1.2'), 'vr')
+
+        config_db.VirtualRouterKM.delete('vr')
+        self.assertIsNone(config_db.VirtualRouterKM.get_name_to_uuid('host2'))
+        self.assertIsNone(config_db.VirtualRouterKM.get_ip_addr_to_uuid('1.1.1.2'))
+    # end test_add_update_delete_vrouter
+
 #end ConfigDBTest(unittest.TestCase):
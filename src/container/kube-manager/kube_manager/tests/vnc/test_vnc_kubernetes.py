@@ -3,12 +3,17 @@
 #
 
 
+import time
 import unittest
+import uuid
 
+import gevent
+from gevent.queue import Queue
 from mock import patch, Mock
 
 from vnc_api.vnc_api import Domain, Project, NetworkIpam, VirtualNetwork, VnSubnetsType
 from kube_manager.vnc import vnc_kubernetes
+from kube_manager.vnc.config_db import VirtualMachineKM
 from kube_manager.tests.vnc.db_mock import DBBaseKM, DBMock
 from kube_manager.tests.vnc.vnc_api_mock import VncApiMock
 
@@ -209,3 +214,128 @@ class VncKubernetesTest(unittest.TestCase):
         api.virtual_network_create(net)
 
         vnc_kubernetes.VncKubernetes(self.args, Mock())
+
+    @patch("kube_manager.vnc.db.KubeNetworkManagerDB", new=DBMock)
+    @patch("kube_manager.vnc.vnc_kubernetes.VncApi", new=VncApiMock)
+    @patch("kube_manager.vnc.vnc_kubernetes.VncAmqpHandle", new=Mock())
+    def test_event_workers(self):
+        self.args.kube_event_workers = '4'
+        q = Queue()
+        vnc = vnc_kubernetes.VncKubernetes(self.args, Mock(), q=q)
+        processed = []
+        running = []
+
+        def _process(event):
+            name = event['object']['metadata']['name']
+            processed.append(name)
+            running.append(name)
+            # yield so that the other workers get a chance to run
+            gevent.sleep(0)
+            if event['object']['kind'] == 'Namespace':
+                # processed alone
+                self.assertEqual(running, [name])
+            running.remove(name)
+        vnc.pod_mgr.process = _process
+        vnc.namespace_mgr.process = _process
+
+        events = []
+        for ns in ('ns1', 'ns2', 'ns3'):
+            events.append({'type': 'ADDED', 'receive_time': time.time(),
+                           'object': {'kind': 'Namespace',
+                                      'metadata': {'name': ns}}})
+            for i in range(3):
+                events.append({'type': 'ADDED', 'receive_time': time.time(),
+                               'object': {'kind': 'Pod', 'metadata': {
+                                   'name': '%s-pod%d' % (ns, i),
+                                   'namespace': ns}}})
+        for event in events:
+            q.put(event)
+        greenlet = gevent.spawn(vnc.vnc_process)
+        gevent.sleep(0.1)
+        greenlet.kill()
+
+        names = [e['object']['metadata']['name'] for e in events]
+        self.assertEqual(sorted(processed), sorted(names))
+        for ns in ('ns1', 'ns2', 'ns3'):
+            self.assertEqual([n for n in processed if n.startswith(ns)],
+                             [n for n in names if n.startswith(ns)])
+        stats = vnc.get_event_queue_stats()
+        self.assertEqual(len(stats), 5)
+        self.assertEqual(stats[0].events, len(events))
+        self.assertEqual(sum(s.events for s in stats[1:]), len(events))
+        vnc._stop_event_workers()
+
+    @patch("kube_manager.vnc.db.KubeNetworkManagerDB", new=DBMock)
+    @patch("kube_manager.vnc.vnc_kubernetes.VncApi", new=VncApiMock)
+    @patch("kube_manager.vnc.vnc_kubernetes.VncAmqpHandle", new=Mock())
+    def test_timer_full_sync(self):
+        self.args.kube_full_sync_interval = '3600'
+        vnc = vnc_kubernetes.VncKubernetes(self.args, Mock(), q=Queue())
+
+        def _locate_pod_vm():
+            vm_uuid = str(uuid.uuid4())
+            VirtualMachineKM.locate(vm_uuid, {
+                'fq_name': [vm_uuid],
+                'annotations': {'key_value_pair': [
+                    {'key': 'owner', 'value': 'k8s'},
+                    {'key': 'cluster', 'value': 'cluster'}]}})
+            return vm_uuid
+
+        with patch.object(vnc.pod_mgr, '_create_pod_event') as create_event:
+            # The first run checks all the objects.
+            vm1_uuid = _locate_pod_vm()
+            vnc.vnc_timer()
+            self.assertEqual([c[0][1] for c in create_event.call_args_list],
+                             [vm1_uuid])
+
+            # The next runs only check the objects which changed.
+            create_event.reset_mock()
+            vnc.vnc_timer()
+            self.assertFalse(create_event.called)
+            vm2_uuid = _locate_pod_vm()
+            vnc.vnc_timer()
+            self.assertEqual([c[0][1] for c in create_event.call_args_list],
+                             [vm2_uuid])
+
+            # Until the full sync interval is over.
+            create_event.reset_mock()
+            vnc._last_full_sync -= 3600
+            vnc.vnc_timer()
+            self.assertEqual(
+                sorted(c[0][1] for c in create_event.call_args_list),
+                sorted([vm1_uuid, vm2_uuid]))
+
+        stages = ['network-policy', 'ingress', 'service', 'pod', 'namespace']
+        self.assertEqual([s.name for s in vnc.full_sync_latency.stages],
+                         stages)
+        self.assertEqual([s.count for s in vnc.full_sync_latency.stages],
+                         [2] * len(stages))
+        self.assertEqual([s.count for s in vnc.timer_latency.stages],
+                         [2] * len(stages))
+
+    @patch("kube_manager.vnc.db.KubeNetworkManagerDB", new=DBMock)
+    @patch("kube_manager.vnc.vnc_kubernetes.VncApi", new=VncApiMock)
+    @patch("kube_manager.vnc.vnc_kubernetes.VncAmqpHandle", new=Mock())
+    def test_timer_retry_changed(self):
+        self.args.kube_full_sync_interval = '3600'
+        vnc = vnc_kubernetes.VncKubernetes(self.args, Mock(), q=Queue())
+        vnc.vnc_timer()
+
+        vm_uuid = str(uuid.uuid4())
+        VirtualMachineKM.locate(vm_uuid, {
+            'fq_name': [vm_uuid],
+            'annotations': {'key_value_pair': [
+                {'key': 'owner', 'value': 'k8s'},
+                {'key': 'cluster', 'value': 'cluster'}]}})
+        with patch.object(vnc.pod_mgr, '_create_pod_event',
+                          side_effect=Exception('queue failed')):
+            vnc.vnc_timer()
+
+        # The vm is checked again on the next run.
+        with patch.object(vnc.pod_mgr, '_create_pod_event') as create_event:
+            vnc.vnc_timer()
+            self.assertEqual([c[0][1] for c in create_event.call_args_list],
+                             [vm_uuid])
+            create_event.reset_mock()
+            vnc.vnc_timer()
+            self.assertFalse(create_event.called)
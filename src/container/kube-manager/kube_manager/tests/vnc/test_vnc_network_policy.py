@@ -5,6 +5,8 @@
 import unittest
 import uuid
 
+from mock import patch
+
 from kube_manager.tests.vnc.test_case import KMTestCase
 from kube_manager.common.kube_config_db import (NetworkPolicyKM)
 from kube_manager.vnc import vnc_kubernetes_config as kube_config
@@ -197,6 +199,8 @@ class VncNetworkPolicyTest(KMTestCase):
     def _get_default_application_policy_set(self):
         aps_fq_name = [VncSecurityPolicy.default_policy_management_name,
             self.cluster_name()]
+        # Firewall policy insertions are batched, write the pending ones.
+        VncSecurityPolicy.flush_aps_update()
         return self._vnc_lib.application_policy_set_read(
             id=VncSecurityPolicy.cluster_aps_uuid)
 
@@ -580,3 +584,89 @@ class VncNetworkPolicyTest(KMTestCase):
             self._validate_network_policy_resources(np_name, np_uuid_dict[i],
                 np_spec, validate_delete=True)
 
+    def test_add_network_policy_batched_aps_update(self):
+        np_spec = {
+                  'podSelector': {},
+                  'ingress': [{}]
+              }
+        np_uuid_dict = {}
+        test_range = range(1, 4)
+        ref_update = VncSecurityPolicy.vnc_lib.ref_update
+        aps_updates = []
+        def aps_ref_update(obj_type, *args):
+            if obj_type == 'application-policy-set':
+                aps_updates.append(args)
+            return ref_update(obj_type, *args)
+        with patch.object(VncSecurityPolicy, 'aps_update_interval', 60),\
+             patch.object(VncSecurityPolicy.vnc_lib, 'ref_update',
+                          side_effect=aps_ref_update):
+            for i in test_range:
+                np_name = "-".join([unittest.TestCase.id(self), str(i)])
+                np_uuid_dict[i] = self._add_update_network_policy(np_name,
+                                                                  np_spec)
+            self.assertEqual(len(aps_updates), 0)
+            # The tail policies moved by each insertion are written once.
+            pending_updates = len(VncSecurityPolicy._aps_pending_updates)
+            self.assertTrue(pending_updates <= len(test_range) + 2)
+            aps_obj = self._get_default_application_policy_set()
+            self.assertEqual(len(aps_updates), pending_updates)
+
+        fw_policy_sequences = {}
+        for fw_policy in aps_obj.get_firewall_policy_refs() or []:
+            fw_policy_sequences[fw_policy['to'][-1]] =\
+                float(fw_policy['attr'].get_sequence())
+        sequences = []
+        for i in test_range:
+            np_name = "-".join([unittest.TestCase.id(self), str(i)])
+            sequences.append(fw_policy_sequences[
+                VncSecurityPolicy.get_firewall_policy_name(
+                    np_name, self.ns_name, False)])
+        self.assertEqual(sequences, sorted(sequences))
+        # Policies are inserted before the deny all tail policy.
+        deny_all_fw_policy = FirewallPolicyKM.get(
+            VncSecurityPolicy.deny_all_fw_policy_uuid)
+        self.assertTrue(sequences[-1] <
+                        fw_policy_sequences[deny_all_fw_policy.name])
+
+        for i in test_range:
+            np_name = "-".join([unittest.TestCase.id(self), str(i)])
+            self._delete_network_policy(np_name, np_uuid_dict[i])
+
+    def test_add_network_policy_aps_update_retry(self):
+        np_spec = {
+                  'podSelector': {},
+                  'ingress': [{}]
+              }
+        np_name = unittest.TestCase.id(self)
+        ref_update = VncSecurityPolicy.vnc_lib.ref_update
+        aps_updates = []
+        def fail_first_aps_update(obj_type, *args):
+            if obj_type == 'application-policy-set':
+                aps_updates.append(args)
+                if len(aps_updates) == 1:
+                    raise Exception('update failed')
+            return ref_update(obj_type, *args)
+        with patch.object(VncSecurityPolicy, 'aps_update_interval', 60),\
+             patch.object(VncSecurityPolicy.vnc_lib, 'ref_update',
+                          side_effect=fail_first_aps_update):
+            np_uuid = self._add_update_network_policy(np_name, np_spec)
+            VncSecurityPolicy._aps_update_greenlet.kill()
+            VncSecurityPolicy._update_aps()
+            self.assertEqual(len(aps_updates), 1)
+            # The failed update is kept pending and rescheduled.
+            self.assertTrue(VncSecurityPolicy._aps_pending_updates)
+            self.assertIsNotNone(VncSecurityPolicy._aps_update_greenlet)
+            self.assertEqual(VncSecurityPolicy._aps_update_retry_interval,
+                VncSecurityPolicy.aps_update_max_retry_interval)
+            self._get_default_application_policy_set()
+            self.assertFalse(VncSecurityPolicy._aps_pending_updates)
+            self.assertIsNone(VncSecurityPolicy._aps_update_retry_interval)
+
+        # A failed removal from the APS is raised, before the policy delete.
+        with patch.object(VncSecurityPolicy.vnc_lib, 'ref_update',
+                          side_effect=Exception('update failed')):
+            self.assertRaises(Exception,
+                VncSecurityPolicy.remove_firewall_policy, np_name,
+                self.ns_name)
+
+        self._delete_network_policy(np_name, np_uuid)
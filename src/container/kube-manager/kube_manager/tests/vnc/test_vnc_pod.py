@@ -15,6 +15,7 @@ from kube_manager.vnc.config_db import (
     VirtualNetworkKM, VirtualMachineKM, VirtualMachineInterfaceKM)
 from kube_manager.vnc import vnc_kubernetes_config as kube_config
 from kube_manager.vnc.config_db import TagKM
+from kube_manager.vnc.vnc_kubernetes import VncKubernetes
 from kube_manager.vnc.label_cache import XLabelCache
 from kube_manager.tests.vnc.db_mock import DBBaseKM
 
@@ -236,6 +237,10 @@ class VncPodTestClusterProjectDefined(VncPodTest):
         self._assert_virtual_network(vn_obj_uuid)
         self._assert_virtual_machine(testpod.uuid, self.cluster_project,
                                      proj_obj, vn_obj_uuid)
+        latency = VncKubernetes.get_instance().pod_mgr.pod_add_latency
+        self.assertEqual([stage.name for stage in latency.stages],
+                         ['network', 'vm', 'vmi', 'iip', 'vrouter', 'tags',
+                          'total'])
 
         self._delete_pod(testpod)
 
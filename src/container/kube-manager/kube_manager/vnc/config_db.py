@@ -12,6 +12,7 @@ from bitstring import BitArray
 from vnc_api.vnc_api import (KeyValuePair)
 from kube_manager.vnc.vnc_kubernetes_config import VncKubernetesConfig as vnc_kube_config
 from kube_manager.sandesh.kube_introspect import ttypes as introspect
+from kube_manager.common.utils import KeyWatchers
 
 INVALID_VLAN_ID = 4096
 MAX_VLAN_ID = 4095
@@ -24,10 +25,28 @@ class DBBaseKM(DBBase):
     # Infra annotations that will be added on objects with custom annotations.
     ann_fq_name_infra_key = ["project", "cluster", "owner"]
 
+    # Watchers of the uuids of newly cached objects.
+    _created_watchers = KeyWatchers()
+
     def __init__(self, uuid, obj_dict=None):
         # By default there are no annotations added on an object.
         self.ann_fq_name = None
 
+    @classmethod
+    def watch_created(cls):
+        """Get a set collecting the uuids of objects of this type cached
+        from now on."""
+        return cls._created_watchers.watch(cls)
+
+    @classmethod
+    def locate(cls, uuid, *args):
+        if uuid in cls._dict:
+            return cls._dict[uuid]
+        obj = super(DBBaseKM, cls).locate(uuid, *args)
+        if obj is not None:
+            cls._created_watchers.notify(cls, uuid)
+        return obj
+
     @staticmethod
     def get_infra_annotations():
         """Get infra annotations."""
@@ -759,23 +778,34 @@ class VirtualRouterKM(DBBaseKM):
     _ann_fq_name_to_uuid = {}
     _fq_name_to_uuid = {}
     _ip_addr_to_uuid = {}
+    _name_to_uuid = {}
 
     def __init__(self, uuid, obj_dict=None):
         super(VirtualRouterKM, self).__init__(uuid, obj_dict)
         self.uuid = uuid
+        self.name = None
+        self.virtual_router_ip_address = None
         self.virtual_machines = set()
         self.update(obj_dict)
 
     def update(self, obj=None):
         if obj is None:
             obj = self.read_obj(self.uuid)
-        self.name = obj['fq_name'][-1]
+        name = obj['fq_name'][-1]
+        if name != self.name:
+            self.delete_name_to_uuid(self.uuid, self.name)
+            self.build_name_to_uuid(self.uuid, name)
+        self.name = name
         self.fq_name = obj['fq_name']
         self.annotations = obj.get('annotations', None)
         self.build_fq_name_to_uuid(self.uuid, obj)
         self.update_multiple_refs('virtual_machine', obj)
 
-        self.virtual_router_ip_address = obj.get('virtual_router_ip_address')
+        ip_addr = obj.get('virtual_router_ip_address')
+        if ip_addr != self.virtual_router_ip_address:
+            self.delete_ip_addr_to_uuid(
+                self.uuid, self.virtual_router_ip_address)
+        self.virtual_router_ip_address = ip_addr
         if self.virtual_router_ip_address:
             self.build_ip_addr_to_uuid(
                 self.uuid, self.virtual_router_ip_address)
@@ -786,16 +816,36 @@ class VirtualRouterKM(DBBaseKM):
             return
         obj = cls._dict[uuid]
         obj.update_multiple_refs('virtual_machine', {})
+        cls.delete_name_to_uuid(uuid, obj.name)
+        cls.delete_ip_addr_to_uuid(uuid, obj.virtual_router_ip_address)
         del cls._dict[uuid]
 
     @classmethod
     def build_ip_addr_to_uuid(cls, uuid, ip_addr):
         cls._ip_addr_to_uuid[tuple(ip_addr)] = uuid
 
+    @classmethod
+    def delete_ip_addr_to_uuid(cls, uuid, ip_addr):
+        if ip_addr and cls._ip_addr_to_uuid.get(tuple(ip_addr)) == uuid:
+            del cls._ip_addr_to_uuid[tuple(ip_addr)]
+
     @classmethod
     def get_ip_addr_to_uuid(cls, ip_addr):
         return cls._ip_addr_to_uuid.get(tuple(ip_addr))
 
+    @classmethod
+    def build_name_to_uuid(cls, uuid, name):
+        cls._name_to_uuid[name] = uuid
+
+    @classmethod
+    def delete_name_to_uuid(cls, uuid, name):
+        if name and cls._name_to_uuid.get(name) == uuid:
+            del cls._name_to_uuid[name]
+
+    @classmethod
+    def get_name_to_uuid(cls, name):
+        return cls._name_to_uuid.get(name)
+
     @classmethod
     def sandesh_handle_db_list_request(cls, req):
         """ Reply to Virtual Router DB lookup/introspect request. """
@@ -1810,6 +1860,9 @@ class ApplicationPolicySetKM(DBBaseKM):
 
     def __init__(self, uuid, obj_dict=None):
         self.uuid = uuid
+        # Firewall policies of this APS, indexed by uuid, with their fq_name
+        # and sequence in the APS.
+        self.firewall_policies = {}
         super(ApplicationPolicySetKM, self).__init__(uuid, obj_dict)
         obj_dict = self.update(obj_dict)
 
@@ -1819,6 +1872,10 @@ class ApplicationPolicySetKM(DBBaseKM):
         self.name = obj['fq_name'][-1]
         self.fq_name = obj['fq_name']
         self.parent_uuid = obj.get('parent_uuid', None)
+        self.firewall_policies = {}
+        for ref in obj.get('firewall_policy_refs', []):
+            self.firewall_policies[ref['uuid']] =\
+                (ref['to'], ref['attr']['sequence'])
         self.build_fq_name_to_uuid(self.uuid, obj)
         return obj
 
@@ -1890,6 +1947,7 @@ class FirewallPolicyKM(DBBaseKM):
         # section of an APS contains policy's that are meant to enforce
         # deafult behavior in the APS.
         self.tail = False
+        self.owner = None
         self.spec = None
 
         super(FirewallPolicyKM, self).__init__(uuid, obj_dict)
@@ -1905,6 +1963,8 @@ class FirewallPolicyKM(DBBaseKM):
             for kvp in self.annotations['key_value_pair'] or []:
                 if kvp['key'] == 'tail':
                     self.tail = kvp['value']
+                elif kvp['key'] == 'owner':
+                    self.owner = kvp['value']
                 elif kvp['key'] == 'deny_all_rule_uuid':
                     self.deny_all_rule_uuid = kvp['value']
                 elif kvp['key'] == 'egress_deny_all_rule_uuid':
@@ -15,7 +15,8 @@ from kube_manager.vnc.config_db import (
 from kube_manager.vnc.vnc_common import VncCommon
 from kube_manager.vnc.vnc_kubernetes_config \
     import VncKubernetesConfig as vnc_kube_config
-from vnc_api.vnc_api import NoIdError
+from vnc_api.vnc_api import (
+    LoadbalancerPool, NoIdError, VirtualMachineInterface)
 from kube_manager.vnc.label_cache import XLabelCache
 
 
@@ -50,8 +51,23 @@ class VncEndpoints(VncCommon):
 
         return None
 
+    @staticmethod
+    def _get_pool_obj(pool):
+        # A member only needs the fq_name of its pool, which is cached.
+        pool_obj = LoadbalancerPool()
+        pool_obj.uuid = pool.uuid
+        pool_obj.fq_name = pool.fq_name
+        return pool_obj
+
+    @staticmethod
+    def _get_vmi_obj(vmi_id):
+        # Tags are set on a vmi by uuid, there is no need to read it.
+        vmi_obj = VirtualMachineInterface()
+        vmi_obj.uuid = vmi_id
+        return vmi_obj
+
     def _vnc_create_member(self, pool, pod_id, vmi_id, protocol_port):
-        pool_obj = self.service_lb_pool_mgr.read(pool.uuid)
+        pool_obj = self._get_pool_obj(pool)
         address = None
         annotations = {
             'vmi': vmi_id,
@@ -104,87 +120,86 @@ class VncEndpoints(VncCommon):
 
         return LoadbalancerPoolKM.get(lb_listener.loadbalancer_pool)
 
-    def _add_pod_to_service(self, service_id, pod_id, port=None):
-        lb = LoadbalancerKM.get(service_id)
-        if not lb:
-            return
-        vm = VirtualMachineKM.get(pod_id)
-        if not vm:
-            return
-
-        for lb_listener_id in lb.loadbalancer_listeners:
-            pool = self._get_loadbalancer_pool(lb_listener_id, port)
-            if not pool:
-                continue
-
-            for vmi_id in vm.virtual_machine_interfaces:
-                vmi = VirtualMachineInterfaceKM.get(vmi_id)
-                if not vmi:
+    def _get_service_member_delta(self, lb, pod_ids, ports):
+        """
+        Get the changes to the members of the pools of a service, for its
+        pods to be the given ones on the given ports.
+        Return the list of (pool, pod_id, vmi_id, port) of the members to
+        create and the list of members to delete.
+        """
+        members_to_add = []
+        members_to_remove = []
+        pools_seen = set()
+        for port in ports:
+            for lb_listener_id in lb.loadbalancer_listeners:
+                pool = self._get_loadbalancer_pool(lb_listener_id, port)
+                if not pool or pool.uuid in pools_seen:
                     continue
+                pools_seen.add(pool.uuid)
 
+                pool_vmi_ids = set()
                 for member_id in pool.members:
                     member = LoadbalancerMemberKM.get(member_id)
-                    if member and member.vmi == vmi_id:
-                        break
-                else:
-                    self.logger.debug(
-                        "Creating LB member for Pod/VM: %s in LB: %s with "
-                        "target-port: %d"
-                        % (vm.fq_name, lb.name, port['port']))
-                    member_obj = self._vnc_create_member(
-                        pool, pod_id, vmi_id, port['port'])
-
-                    try:
-                        vmi_obj = self._vnc_lib.virtual_machine_interface_read(
-                                      id = vmi_id)
-                    except:
-                        raise
-
-                    # Attach the service label to underlying pod vmi.
-                    self._labels.append(vmi_id,
-                        self._labels.get_service_label(lb.service_name))
-                    # Set tags on the vmi.
-                    self._vnc_lib.set_tags(vmi_obj,
-                        self._labels.get_labels_dict(vmi_id))
-
-                    LoadbalancerMemberKM.locate(member_obj.uuid)
-
-    def _remove_pod_from_service(self, service_id, pod_id, port=None):
-        lb = LoadbalancerKM.get(service_id)
-        if not lb:
-            return
-
-        for lb_listener_id in lb.loadbalancer_listeners:
-            pool = self._get_loadbalancer_pool(lb_listener_id, port)
-            if not pool:
-                continue
-
-            for member_id in pool.members:
-                member = LoadbalancerMemberKM.get(member_id)
-                if member and member.vm == pod_id:
-                    self.logger.debug(
-                        "Delete LB member for Pod/VM: %s from LB: %s"
-                        % (pod_id, lb.name))
-
-                    try:
-                        vmi_obj = self._vnc_lib.virtual_machine_interface_read(
-                                      id = member.vmi)
-
-                        # Remove service member label from vmi.
-                        svc_member_label = self._labels.get_service_label(
-                            lb.service_name)
-                        for k,v in svc_member_label.iteritems():
-                            self._vnc_lib.unset_tag(vmi_obj, k)
-
-                    except NoIdError:
-                        # VMI has already been deleted. Nothing to unset/remove.
-                        pass
-                    except:
-                        raise
-
-                    self.service_lb_member_mgr.delete(member_id)
-                    LoadbalancerMemberKM.delete(member.uuid)
-                    break
+                    if not member:
+                        continue
+                    pool_vmi_ids.add(member.vmi)
+                    if member.vm and member.vm not in pod_ids:
+                        members_to_remove.append(member)
+
+                for pod_id in pod_ids:
+                    vm = VirtualMachineKM.get(pod_id)
+                    if not vm:
+                        continue
+                    for vmi_id in vm.virtual_machine_interfaces:
+                        if vmi_id in pool_vmi_ids or\
+                           not VirtualMachineInterfaceKM.get(vmi_id):
+                            continue
+                        members_to_add.append(
+                            (pool, pod_id, vmi_id, port['port']))
+
+        return members_to_add, members_to_remove
+
+    def _update_service_members(self, lb, members_to_add, members_to_remove):
+        """
+        Apply the changes to the members of the pools of a service.
+        The service label is set or unset once per vmi.
+        """
+        svc_member_label = self._labels.get_service_label(lb.service_name)
+
+        added_vmi_ids = set()
+        for pool, pod_id, vmi_id, port in members_to_add:
+            self.logger.debug(
+                "Creating LB member for Pod/VM: %s in LB: %s with "
+                "target-port: %d" % (pod_id, lb.name, port))
+            member_obj = self._vnc_create_member(pool, pod_id, vmi_id, port)
+            LoadbalancerMemberKM.locate(member_obj.uuid)
+            added_vmi_ids.add(vmi_id)
+
+        for vmi_id in added_vmi_ids:
+            # Attach the service label to underlying pod vmi.
+            self._labels.append(vmi_id, svc_member_label)
+            # Set tags on the vmi.
+            self._vnc_lib.set_tags(self._get_vmi_obj(vmi_id),
+                self._labels.get_labels_dict(vmi_id))
+
+        removed_vmi_ids = set(member.vmi for member in members_to_remove
+                              if member.vmi)
+        for vmi_id in removed_vmi_ids:
+            try:
+                # Remove service member label from vmi.
+                vmi_obj = self._get_vmi_obj(vmi_id)
+                for k,v in svc_member_label.iteritems():
+                    self._vnc_lib.unset_tag(vmi_obj, k)
+            except NoIdError:
+                # VMI has already been deleted. Nothing to unset/remove.
+                pass
+
+        for member in members_to_remove:
+            self.logger.debug(
+                "Delete LB member for Pod/VM: %s from LB: %s"
+                % (member.vm, lb.name))
+            self.service_lb_member_mgr.delete(member.uuid)
+            LoadbalancerMemberKM.delete(member.uuid)
 
     def _get_pods_attached_to_service(self, service_id, port=None):
         """
@@ -258,23 +273,18 @@ class VncEndpoints(VncCommon):
                 "not exist".format(name))
             return
 
+        lb = LoadbalancerKM.get(service_id)
+        if not lb:
+            return
+
         event_pod_ids = self._get_pods_from_event(event)
         ports = self._get_ports_from_event(event)
 
-        for port in ports:
-
-            attached_pod_ids = self._get_pods_attached_to_service(
-                service_id, port)
-
-            # If Pod present only in event, add Pod to Service
-            for pod_id in event_pod_ids.difference(attached_pod_ids):
-                self._add_pod_to_service(service_id, pod_id, port)
-
-            # If Pod not present in event, delete Pod from Service
-            for pod_id in attached_pod_ids.difference(event_pod_ids):
-                self._remove_pod_from_service(service_id, pod_id, port)
-
-            # If Pod present in both lists, do nothing
+        # Members of Pods present only in event are added to the Service,
+        # members of Pods not present in event are deleted from it.
+        members_to_add, members_to_remove = self._get_service_member_delta(
+            lb, event_pod_ids, ports)
+        self._update_service_members(lb, members_to_add, members_to_remove)
 
     def vnc_endpoint_delete(self, name, namespace, event):
         # Does service exists in contrail-api server?
@@ -295,9 +305,14 @@ class VncEndpoints(VncCommon):
                 "Pods listed in the received event differ from actual pods "
                 "attached to service {}".format(name))
 
+        lb = LoadbalancerKM.get(service_id)
+        if not lb:
+            return
+
         # Actual members are source of truth. Delete them'all
-        for pod_id in attached_pod_ids:
-            self._remove_pod_from_service(service_id, pod_id)
+        members_to_add, members_to_remove = self._get_service_member_delta(
+            lb, set(), [None])
+        self._update_service_members(lb, [], members_to_remove)
 
     def process(self, event):
         event_type = event['type']
@@ -306,12 +321,15 @@ class VncEndpoints(VncCommon):
         name = event['object']['metadata'].get('name')
         uid = event['object']['metadata'].get('uid')
 
-        print("%s - Got %s %s %s:%s:%s"
-              % (self._name, event_type, kind, namespace, name, uid))
         self.logger.debug(
             "%s - Got %s %s %s:%s:%s"
             % (self._name, event_type, kind, namespace, name, uid))
 
+        # Later events of these endpoints are no longer merged into this one.
+        dequeued = event.pop('dequeued', None)
+        if dequeued:
+            dequeued()
+
         if event['type'] in ('ADDED', 'MODIFIED'):
             self.vnc_endpoint_add(name, namespace, event)
         elif event['type'] == 'DELETED':
@@ -21,6 +21,7 @@ from vnc_kubernetes_config import VncKubernetesConfig as vnc_kube_config
 from vnc_security_policy import VncSecurityPolicy
 from vnc_common import VncCommon
 from kube_manager.common.utils import get_fip_pool_fq_name_from_dict_string
+from kube_manager.common.utils import take_keys
 from kube_manager.vnc.label_cache import XLabelCache
 from cStringIO import StringIO
 from cfgm_common.utils import cgitb_hook
@@ -44,6 +45,9 @@ class VncIngress(VncCommon):
         self.service_ll_mgr = ServiceLbListenerManager()
         self.service_lb_pool_mgr = ServiceLbPoolManager()
         self.service_lb_member_mgr = ServiceLbMemberManager()
+        # Uuids of the loadbalancers to be checked by the next timer run.
+        self._created_lbs = LoadbalancerKM.watch_created()
+        self._deleted_ingresses = IngressKM.watch_deleted()
 
     def _get_project(self, ns_name):
         proj_fq_name = vnc_kube_config.cluster_project_fq_name(ns_name)
@@ -816,36 +820,46 @@ class VncIngress(VncCommon):
             self._queue.put(event)
         return
 
-    def _sync_ingress_lb(self):
-        lb_uuid_set = set(LoadbalancerKM.keys())
-        ingress_uuid_set = set(IngressKM.keys())
-        deleted_ingress_set = lb_uuid_set - ingress_uuid_set
-        for uuid in deleted_ingress_set:
-            lb = LoadbalancerKM.get(uuid)
-            if not lb:
-                continue
-            if not lb.annotations:
-                continue
-            owner = None
-            kind = None
-            cluster = None
-            for kvp in lb.annotations['key_value_pair'] or []:
-                if kvp['key'] == 'cluster':
-                    cluster = kvp['value']
-                elif kvp['key'] == 'owner':
-                    owner = kvp['value']
-                elif kvp['key'] == 'kind':
-                    kind = kvp['value']
-
-                if cluster == vnc_kube_config.cluster_name() and \
-                   owner == 'k8s' and \
-                   kind == self._k8s_event_type:
-                    self._create_ingress_event('delete', uuid, lb)
-                    break
+    def _sync_ingress_lb(self, full_sync=True):
+        # Changed keys are put back if the sync fails, except for those whose
+        # delete event was already queued.
+        with take_keys(self._created_lbs,
+                       self._deleted_ingresses) as changed_uuid_set:
+            if full_sync:
+                lb_uuid_set = set(LoadbalancerKM.keys())
+            else:
+                # A loadbalancer can only have lost its ingress if either of
+                # them changed since the last run.
+                lb_uuid_set = set(changed_uuid_set)
+            deleted_ingress_set = set(uuid for uuid in lb_uuid_set
+                                      if uuid not in IngressKM)
+            for uuid in deleted_ingress_set:
+                lb = LoadbalancerKM.get(uuid)
+                if not lb:
+                    continue
+                if not lb.annotations:
+                    continue
+                owner = None
+                kind = None
+                cluster = None
+                for kvp in lb.annotations['key_value_pair'] or []:
+                    if kvp['key'] == 'cluster':
+                        cluster = kvp['value']
+                    elif kvp['key'] == 'owner':
+                        owner = kvp['value']
+                    elif kvp['key'] == 'kind':
+                        kind = kvp['value']
+
+                    if cluster == vnc_kube_config.cluster_name() and \
+                       owner == 'k8s' and \
+                       kind == self._k8s_event_type:
+                        self._create_ingress_event('delete', uuid, lb)
+                        changed_uuid_set.discard(uuid)
+                        break
         return
 
-    def ingress_timer(self):
-        self._sync_ingress_lb()
+    def ingress_timer(self, full_sync=True):
+        self._sync_ingress_lb(full_sync)
 
     def process(self, event):
         event_type = event['type']
@@ -854,8 +868,6 @@ class VncIngress(VncCommon):
         name = event['object']['metadata'].get('name')
         uid = event['object']['metadata'].get('uid')
 
-        print("%s - Got %s %s %s:%s:%s"
-              %(self._name, event_type, kind, ns_name, name, uid))
         self._logger.debug("%s - Got %s %s %s:%s:%s"
               %(self._name, event_type, kind, ns_name, name, uid))
 
@@ -7,11 +7,14 @@ VNC management for kubernetes
 """
 
 import gevent
-from gevent.queue import Empty
+from gevent.lock import Semaphore
+from gevent.queue import Empty, Queue
 
 import requests
+import time
 import argparse
 import uuid
+import zlib
 
 from cStringIO import StringIO
 from cfgm_common import importutils
@@ -21,6 +24,8 @@ from cfgm_common.utils import cgitb_hook
 from cfgm_common.vnc_amqp import VncAmqpHandle
 from vnc_api.vnc_api import *
 import kube_manager.common.args as kube_args
+from kube_manager.common.utils import EventQueueStats, StageLatencyStats, \
+    SharedExclusiveLock
 from config_db import *
 import db
 import label_cache
@@ -44,6 +49,15 @@ from vnc_security_policy import VncSecurityPolicy
 class VncKubernetes(VncCommon):
 
     _vnc_kubernetes = None
+    # With more than one event worker, the events of these kinds, which
+    # only change objects of their namespace, are processed in parallel.
+    # The events of other kinds are processed alone, as they change objects
+    # shared by all namespaces: Namespace label updates change the network
+    # policies of other namespaces, NetworkPolicy and Ingress events change
+    # the cluster application policy set and firewall policies.
+    PARALLEL_EVENT_KINDS = frozenset(['Pod', 'Service', 'Endpoints'])
+    # Label tags are shared by all namespaces.
+    _tags_lock = Semaphore()
 
     def __init__(self, args=None, logger=None, q=None, kube=None,
                  vnc_kubernetes_config_dict=None):
@@ -51,6 +65,18 @@ class VncKubernetes(VncCommon):
         self.args = args
         self.logger = logger
         self.q = q
+        self.event_queue_stats = EventQueueStats('events', self.q)
+        # With more than one event worker, the events are spread on the
+        # workers by namespace and each worker processes its events in
+        # order, so that a slow namespace does not delay the others.
+        self._event_worker_queues = []
+        self._event_worker_stats = []
+        self._event_worker_greenlets = []
+        self._event_lock = SharedExclusiveLock()
+        # Time spent in the timers, apart from their full sync runs.
+        self.timer_latency = StageLatencyStats('timer')
+        self.full_sync_latency = StageLatencyStats('timer-full-sync')
+        self._last_full_sync = None
         self.kube = kube
         self._cluster_pod_ipam_fq_name = None
         self._cluster_service_ipam_fq_name = None
@@ -475,12 +501,26 @@ class VncKubernetes(VncCommon):
         return self._cluster_ip_fabric_ipam_fq_name
 
     def vnc_timer(self):
+        # The timers only check the objects which changed since their last
+        # run, but for a full sync of all the objects on the first run and
+        # every kube_full_sync_interval seconds after.
+        now = time.time()
+        full_sync = self._last_full_sync is None or \
+            now - self._last_full_sync >= int(self.args.kube_full_sync_interval)
+        latency = self.full_sync_latency if full_sync else self.timer_latency
         try:
-            self.network_policy_mgr.network_policy_timer()
-            self.ingress_mgr.ingress_timer()
-            self.service_mgr.service_timer()
-            self.pod_mgr.pod_timer()
-            self.namespace_mgr.namespace_timer()
+            with latency.stage('network-policy'):
+                self.network_policy_mgr.network_policy_timer(full_sync)
+            with latency.stage('ingress'):
+                self.ingress_mgr.ingress_timer(full_sync)
+            with latency.stage('service'):
+                self.service_mgr.service_timer(full_sync)
+            with latency.stage('pod'):
+                self.pod_mgr.pod_timer(full_sync)
+            with latency.stage('namespace'):
+                self.namespace_mgr.namespace_timer(full_sync)
+            if full_sync:
+                self._last_full_sync = now
         except Exception as e:
             string_buf = StringIO()
             cgitb_hook(file=string_buf, format="text")
@@ -488,32 +528,15 @@ class VncKubernetes(VncCommon):
             self.logger.error("vnc_timer: %s - %s" %(self._name, err_msg))
 
     def vnc_process(self):
+        self._start_event_workers()
         while True:
             try:
                 event = self.q.get()
-                event_type = event['type']
-                kind = event['object'].get('kind')
-                metadata = event['object']['metadata']
-                namespace = metadata.get('namespace')
-                name = metadata.get('name')
-                uid = metadata.get('uid')
-                if kind == 'Pod':
-                    self.pod_mgr.process(event)
-                elif kind == 'Service':
-                    self.service_mgr.process(event)
-                elif kind == 'Namespace':
-                    self.namespace_mgr.process(event)
-                elif kind == 'NetworkPolicy':
-                    self.network_policy_mgr.process(event)
-                elif kind == 'Endpoints':
-                    self.endpoints_mgr.process(event)
-                elif kind == 'Ingress':
-                    self.ingress_mgr.process(event)
+                self.event_queue_stats.record(event)
+                if self._event_worker_queues:
+                    self._get_event_worker_queue(event).put(event)
                 else:
-                    print("%s - Event %s %s %s:%s:%s not handled"
-                        %(self._name, event_type, kind, namespace, name, uid))
-                    self.logger.error("%s - Event %s %s %s:%s:%s not handled"
-                        %(self._name, event_type, kind, namespace, name, uid))
+                    self._process_event(event)
             except Empty:
                 gevent.sleep(0)
             except Exception as e:
@@ -522,6 +545,91 @@ class VncKubernetes(VncCommon):
                 err_msg = string_buf.getvalue()
                 self.logger.error("%s - %s" %(self._name, err_msg))
 
+    def _start_event_workers(self):
+        num_workers = int(self.args.kube_event_workers)
+        if num_workers <= 1 or self._event_worker_greenlets:
+            return
+        for worker in range(num_workers):
+            queue = Queue()
+            stats = EventQueueStats('worker-%d' % worker, queue)
+            self._event_worker_queues.append(queue)
+            self._event_worker_stats.append(stats)
+            self._event_worker_greenlets.append(
+                gevent.spawn(self._event_worker, queue, stats))
+
+    def _stop_event_workers(self):
+        gevent.killall(self._event_worker_greenlets)
+        self._event_worker_greenlets = []
+        self._event_worker_queues = []
+        self._event_worker_stats = []
+
+    @staticmethod
+    def get_event_partition_key(event):
+        # Events of a namespace, and of the namespace itself, end up in the
+        # same partition, and are processed in order. Objects which are not
+        # in a namespace all end up in the same partition.
+        obj = event['object']
+        metadata = obj.get('metadata', {})
+        if obj.get('kind') == 'Namespace':
+            key = metadata.get('name')
+        else:
+            key = metadata.get('namespace')
+        return (key or '').encode('utf-8')
+
+    def _get_event_worker_queue(self, event):
+        key = self.get_event_partition_key(event)
+        worker = zlib.crc32(key) % len(self._event_worker_queues)
+        return self._event_worker_queues[worker]
+
+    def _event_worker(self, queue, stats):
+        while True:
+            event = queue.get()
+            stats.record(event)
+            if event['object'].get('kind') in self.PARALLEL_EVENT_KINDS:
+                lock = self._event_lock.shared()
+            else:
+                lock = self._event_lock.exclusive()
+            try:
+                with lock:
+                    self._process_event(event)
+            except Exception as e:
+                string_buf = StringIO()
+                cgitb_hook(file=string_buf, format="text")
+                err_msg = string_buf.getvalue()
+                self.logger.error("%s - %s" %(self._name, err_msg))
+
+    def get_event_queue_stats(self):
+        return [self.event_queue_stats] + self._event_worker_stats
+
+    def get_latency_stats(self):
+        return [self.pod_mgr.pod_add_latency, self.timer_latency,
+                self.full_sync_latency]
+
+    def _process_event(self, event):
+        event_type = event['type']
+        kind = event['object'].get('kind')
+        metadata = event['object']['metadata']
+        namespace = metadata.get('namespace')
+        name = metadata.get('name')
+        uid = metadata.get('uid')
+        if kind == 'Pod':
+            self.pod_mgr.process(event)
+        elif kind == 'Service':
+            self.service_mgr.process(event)
+        elif kind == 'Namespace':
+            self.namespace_mgr.process(event)
+        elif kind == 'NetworkPolicy':
+            self.network_policy_mgr.process(event)
+        elif kind == 'Endpoints':
+            self.endpoints_mgr.process(event)
+        elif kind == 'Ingress':
+            self.ingress_mgr.process(event)
+        else:
+            print("%s - Event %s %s %s:%s:%s not handled"
+                %(self._name, event_type, kind, namespace, name, uid))
+            self.logger.error("%s - Event %s %s %s:%s:%s not handled"
+                %(self._name, event_type, kind, namespace, name, uid))
+
     @classmethod
     def get_instance(cls):
         return VncKubernetes._vnc_kubernetes
@@ -532,6 +640,7 @@ class VncKubernetes(VncCommon):
         if inst is None:
             return
         inst.rabbit.close()
+        inst._stop_event_workers()
         for obj_cls in DBBaseKM.get_obj_type_map().values():
             obj_cls.reset()
         DBBase.clear()
@@ -541,12 +650,15 @@ class VncKubernetes(VncCommon):
     @classmethod
     def create_tags(cls, type, value):
         if cls._vnc_kubernetes:
-            cls.get_instance().tags_mgr.create(type, value)
+            # in the order the label cache decided to create or delete them
+            with cls._tags_lock:
+                cls.get_instance().tags_mgr.create(type, value)
 
     @classmethod
     def delete_tags(cls, type, value):
         if cls._vnc_kubernetes:
-            cls.get_instance().tags_mgr.delete(type, value)
+            with cls._tags_lock:
+                cls.get_instance().tags_mgr.delete(type, value)
 
     @classmethod
     def get_tags(cls, kv_dict, create=False):
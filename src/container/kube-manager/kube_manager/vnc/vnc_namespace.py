@@ -21,6 +21,7 @@ from kube_manager.vnc.vnc_kubernetes_config import (
     VncKubernetesConfig as vnc_kube_config)
 from kube_manager.vnc.vnc_common import VncCommon
 from kube_manager.vnc.label_cache import XLabelCache
+from kube_manager.common.utils import take_keys
 from kube_manager.vnc.vnc_pod import VncPod
 from vnc_security_policy import VncSecurityPolicy
 
@@ -43,6 +44,10 @@ class VncNamespace(VncCommon):
             virtual_network_read(fq_name=ip_fabric_fq_name)
         self._ip_fabric_policy = None
         self._cluster_service_policy = None
+        # Uuids of the projects, and of the namespaces of the projects, to
+        # be checked by the next timer run.
+        self._created_projects = ProjectKM.watch_created()
+        self._deleted_namespaces = NamespaceKM.watch_deleted()
 
     def _get_namespace(self, ns_name):
         """
@@ -518,7 +523,20 @@ class VncNamespace(VncCommon):
             # Raise it up to be logged.
             raise
 
-    def _sync_namespace_project(self):
+    def _get_changed_projects(self, project_uuid_set, namespace_uuid_set):
+        """Get the projects created, and the projects of the namespaces
+        deleted, since the last timer run.
+        """
+        projects = [ProjectKM.get(uuid) for uuid in project_uuid_set]
+        if namespace_uuid_set:
+            # Projects are not indexed by namespace, but namespace deletes
+            # are rare.
+            projects.extend(project for project in ProjectKM.objects()
+                if project.uuid not in project_uuid_set and
+                project.get_k8s_namespace_uuid() in namespace_uuid_set)
+        return [project for project in projects if project]
+
+    def _sync_namespace_project(self, full_sync=True):
         """Sync vnc project objects with K8s namespace object.
 
         This method walks vnc project local cache and validates that
@@ -526,25 +544,38 @@ class VncNamespace(VncCommon):
         If a kubernetes namespace object is not found for this project,
         then construct and simulates a delete event for the namespace,
         so the vnc project can be cleaned up.
+        Unless a full sync is asked for, only the projects which changed
+        since the last run are walked. The changes not walked are kept
+        for the next run if the sync fails.
         """
-        for project in ProjectKM.objects():
-            k8s_namespace_uuid = project.get_k8s_namespace_uuid()
-            # Proceed only if this project is tagged with a k8s namespace.
-            if k8s_namespace_uuid and not\
-                   self._get_namespace(k8s_namespace_uuid):
-                event = {}
-                dict_object = {}
-                dict_object['kind'] = 'Namespace'
-                dict_object['metadata'] = {}
-                dict_object['metadata']['uid'] = k8s_namespace_uuid
-                dict_object['metadata']['name'] = project.get_k8s_namespace_name()
-
-                event['type'] = 'DELETED'
-                event['object'] = dict_object
-                self._queue.put(event)
-
-    def namespace_timer(self):
-        self._sync_namespace_project()
+        with take_keys(self._created_projects) as project_uuid_set,\
+             take_keys(self._deleted_namespaces) as namespace_uuid_set:
+            if full_sync:
+                projects = ProjectKM.objects()
+            else:
+                projects = self._get_changed_projects(project_uuid_set,
+                                                      namespace_uuid_set)
+            for project in projects:
+                k8s_namespace_uuid = project.get_k8s_namespace_uuid()
+                # Proceed only if this project is tagged with a k8s namespace.
+                if k8s_namespace_uuid and not\
+                       self._get_namespace(k8s_namespace_uuid):
+                    event = {}
+                    dict_object = {}
+                    dict_object['kind'] = 'Namespace'
+                    dict_object['metadata'] = {}
+                    dict_object['metadata']['uid'] = k8s_namespace_uuid
+                    dict_object['metadata']['name'] =\
+                        project.get_k8s_namespace_name()
+
+                    event['type'] = 'DELETED'
+                    event['object'] = dict_object
+                    self._queue.put(event)
+                project_uuid_set.discard(project.uuid)
+                namespace_uuid_set.discard(k8s_namespace_uuid)
+
+    def namespace_timer(self, full_sync=True):
+        self._sync_namespace_project(full_sync)
 
     def _get_namespace_firewall_ingress_rule_name(self, ns_name):
         return "-".join([vnc_kube_config.cluster_name(),
@@ -625,8 +656,6 @@ class VncNamespace(VncCommon):
         name = event['object']['metadata'].get('name')
         ns_id = event['object']['metadata'].get('uid')
         labels = dict(event['object']['metadata'].get('labels', {}))
-        print("%s - Got %s %s %s:%s"
-              %(self._name, event_type, kind, name, ns_id))
         self._logger.debug("%s - Got %s %s %s:%s"
                            %(self._name, event_type, kind, name, ns_id))
 
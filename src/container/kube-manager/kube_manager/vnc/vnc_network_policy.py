@@ -604,7 +604,7 @@ class VncNetworkPolicy(VncCommon):
             self._create_network_policy_event('delete', sg.uuid)
         return
 
-    def network_policy_timer(self):
+    def network_policy_timer(self, full_sync=True):
         #self._sync_np_sg()
         return
 
@@ -616,8 +616,6 @@ class VncNetworkPolicy(VncCommon):
         uid = event['object']['metadata'].get('uid')
 
 
-        print("%s - Got %s %s %s:%s:%s"
-              %(self._name, event_type, kind, namespace, name, uid))
         self._logger.debug("%s - Got %s %s %s:%s:%s"
               %(self._name, event_type, kind, namespace, name, uid))
 
@@ -7,6 +7,7 @@ VNC pod management for kubernetes
 """
 
 import json
+import time
 import uuid
 
 from cStringIO import StringIO
@@ -25,6 +26,7 @@ from kube_manager.common.kube_config_db import (NamespaceKM, PodKM)
 from kube_manager.vnc.vnc_kubernetes_config import (
     VncKubernetesConfig as vnc_kube_config)
 from kube_manager.vnc.label_cache import XLabelCache
+from kube_manager.common.utils import StageLatencyStats, take_keys
 
 from cStringIO import StringIO
 from cfgm_common.utils import cgitb_hook
@@ -43,6 +45,14 @@ class VncPod(VncCommon):
         self._queue = vnc_kube_config.queue()
         self._args = vnc_kube_config.args()
         self._logger = vnc_kube_config.logger()
+        self.pod_add_latency = StageLatencyStats('pod-add')
+        # Host vmi uuid of the host ips of nested pods.
+        self._host_vmi_cache = {}
+        # Uuids of the vms to be checked by the next pod timer run.
+        self._created_vms = VirtualMachineKM.watch_created()
+        self._deleted_pods = PodKM.watch_deleted()
+        # Uuids of the pod vms which could not be linked to their vrouter.
+        self._unlinked_vms = set()
         if not VncPod.vnc_pod_instance:
             VncPod.vnc_pod_instance = self
 
@@ -162,7 +172,7 @@ class VncPod(VncCommon):
         else:
             return self._args.ip_fabric_forwarding
 
-    def _create_iip(self, pod_name, pod_namespace, vn_obj, vmi):
+    def _create_iip(self, pod_name, pod_namespace, vn_obj, vmi_obj):
         # Instance-ip for pods are ALWAYS allocated from pod ipam on this
         # VN. Get the subnet uuid of the pod ipam on this VN, so we can request
         # an IP from it.
@@ -190,10 +200,6 @@ class VncPod(VncCommon):
                              display_name=display_name)
         iip_obj.uuid = iip_uuid
         iip_obj.add_virtual_network(vn_obj)
-
-        # Creation of iip requires the vmi vnc object.
-        vmi_obj = self._vnc_lib.virtual_machine_interface_read(
-            fq_name=vmi.fq_name)
         iip_obj.add_virtual_machine_interface(vmi_obj)
 
         InstanceIpKM.add_annotations(self, iip_obj, pod_namespace, pod_name)
@@ -204,9 +210,29 @@ class VncPod(VncCommon):
         InstanceIpKM.locate(iip_obj.uuid)
         return iip_obj
 
+    @staticmethod
+    def _is_host_vmi(vm_vmi, host_ip):
+        if not vm_vmi or not vm_vmi.host_id:
+            return False
+        for iip_id in vm_vmi.instance_ips:
+            iip = InstanceIpKM.get(iip_id)
+            if iip and iip.address == host_ip:
+                return True
+        return False
+
     def _get_host_vmi(self, pod_name):
         host_ip = self._get_host_ip(pod_name)
         if host_ip:
+            # The host vmi of a host ip is looked up in the instance ips
+            # once, and then taken from the cache for as long as it holds
+            # the host ip.
+            vmi_id = self._host_vmi_cache.get(host_ip)
+            if vmi_id:
+                vm_vmi = VirtualMachineInterfaceKM.get(vmi_id)
+                if self._is_host_vmi(vm_vmi, host_ip):
+                    return vm_vmi
+                del self._host_vmi_cache[host_ip]
+
             net_fq_name = vnc_kube_config.cluster_default_network_fq_name()
             iip = InstanceIpKM.get_object(host_ip, net_fq_name)
 
@@ -214,6 +240,7 @@ class VncPod(VncCommon):
                 for vmi_id in iip.virtual_machine_interfaces:
                     vm_vmi = VirtualMachineInterfaceKM.get(vmi_id)
                     if vm_vmi and vm_vmi.host_id:
+                        self._host_vmi_cache[host_ip] = vmi_id
                         return vm_vmi
 
         return None
@@ -262,7 +289,7 @@ class VncPod(VncCommon):
             vmi_uuid = self._vnc_lib.virtual_machine_interface_update(vmi_obj)
 
         VirtualMachineInterfaceKM.locate(vmi_uuid)
-        return vmi_uuid
+        return vmi_obj
 
     def _create_vm(self, pod_namespace, pod_id, pod_name, labels):
         vm_name = VncCommon.make_name(pod_name, pod_id)
@@ -292,23 +319,33 @@ class VncPod(VncCommon):
         if vr_uuid is None:
             self._logger.debug("%s - Vrouter %s Not Found for Pod %s"
                 %(self._name, node_ip, vm_obj.uuid))
+            self._unlinked_vms.add(vm_obj.uuid)
             return
 
+        # The vrouter uuid is known from the cache, there is no need to
+        # read the vrouter before referring to it.
         try:
-            vrouter_obj = self._vnc_lib.virtual_router_read(id=vr_uuid)
-        except Exception as e:
+            self._vnc_lib.ref_update('virtual-router', vr_uuid,
+                'virtual-machine', vm_obj.uuid, None, 'ADD')
+        except NoIdError:
             self._logger.debug("%s - Vrouter %s Not Found for Pod %s"
                 %(self._name, node_ip, vm_obj.uuid))
             string_buf = StringIO()
             cgitb_hook(file=string_buf, format="text")
             err_msg = string_buf.getvalue()
             self._logger.error("_link_vm_to_node: %s - %s" %(self._name, err_msg))
+            self._unlinked_vms.add(vm_obj.uuid)
+            return
+        except Exception as e:
+            # Linking is retried by the pod timer.
+            self._logger.error("%s - Failed to link Pod %s to Vrouter %s: %s"
+                %(self._name, vm_obj.uuid, node_ip, str(e)))
+            self._unlinked_vms.add(vm_obj.uuid)
             return
 
-        self._vnc_lib.ref_update('virtual-router', vrouter_obj.uuid,
-            'virtual-machine', vm_obj.uuid, None, 'ADD')
+        self._unlinked_vms.discard(vm_obj.uuid)
         if vm:
-            vm.virtual_router = vrouter_obj.uuid
+            vm.virtual_router = vr_uuid
 
     def _check_pod_uuid_change(self, pod_uuid, pod_name):
         vm_fq_name = [pod_name]
@@ -365,14 +402,19 @@ class VncPod(VncCommon):
         else:
             self._check_pod_uuid_change(pod_id, pod_name)
 
-        vn_obj = self._get_network(pod_id, pod_name, pod_namespace)
+        start = time.time()
+        latency = self.pod_add_latency
+        with latency.stage('network'):
+            vn_obj = self._get_network(pod_id, pod_name, pod_namespace)
         if not vn_obj:
             return
 
-        vm_obj = self._create_vm(pod_namespace, pod_id, pod_name, labels)
-        vmi_uuid = self._create_vmi(pod_name, pod_namespace, pod_id, vm_obj, vn_obj,
-                                    vm_vmi)
-        vmi = VirtualMachineInterfaceKM.get(vmi_uuid)
+        with latency.stage('vm'):
+            vm_obj = self._create_vm(pod_namespace, pod_id, pod_name, labels)
+        with latency.stage('vmi'):
+            vmi_obj = self._create_vmi(pod_name, pod_namespace, pod_id, vm_obj,
+                                       vn_obj, vm_vmi)
+        vmi_uuid = vmi_obj.uuid
 
         if self._is_pod_nested() and vm_vmi:
             # Pod is nested.
@@ -385,11 +427,7 @@ class VncPod(VncCommon):
                                      None, 'ADD')
 
             # get host id for vm vmi
-            vr_uuid = None
-            for vr in VirtualRouterKM.values():
-                if vr.name == vm_vmi.host_id:
-                    vr_uuid = vr.uuid
-                    break
+            vr_uuid = VirtualRouterKM.get_name_to_uuid(vm_vmi.host_id)
             if not vr_uuid:
                 self._logger.error("No virtual-router object found for host: "
                                    + vm_vmi.host_id
@@ -400,10 +438,12 @@ class VncPod(VncCommon):
                                      'virtual-machine', vm_obj.uuid, None,
                                      'ADD')
 
-        self._create_iip(pod_name, pod_namespace, vn_obj, vmi)
+        with latency.stage('iip'):
+            self._create_iip(pod_name, pod_namespace, vn_obj, vmi_obj)
 
         if not self._is_pod_nested():
-            self._link_vm_to_node(vm_obj, pod_node, node_ip)
+            with latency.stage('vrouter'):
+                self._link_vm_to_node(vm_obj, pod_node, node_ip)
 
         vm = VirtualMachineKM.locate(pod_id)
         if vm:
@@ -411,7 +451,9 @@ class VncPod(VncCommon):
             vm.pod_node = pod_node
             vm.node_ip = node_ip
             self._set_label_to_pod_cache(labels, vm)
-            self._set_tags_on_pod_vmi(pod_id)
+            with latency.stage('tags'):
+                self._set_tags_on_pod_vmi(pod_id, vmi_obj)
+            latency.record('total', time.time() - start)
             return vm
 
     def vnc_pod_update(self, pod_id, pod_name, pod_namespace, pod_node, node_ip, labels,
@@ -501,29 +543,42 @@ class VncPod(VncCommon):
             self._queue.put(event)
         return
 
-    def _sync_pod_vm(self):
-        vm_uuid_set = set(VirtualMachineKM.keys())
-        pod_uuid_set = set(PodKM.keys())
-        deleted_pod_set = vm_uuid_set - pod_uuid_set
-        for pod_uuid in deleted_pod_set:
-            vm = VirtualMachineKM.get(pod_uuid)
-            if not vm or\
-               vm.owner != 'k8s' or\
-               vm.cluster != vnc_kube_config.cluster_name():
-                continue
-            self._create_pod_event('delete', pod_uuid, vm)
-        for uuid in pod_uuid_set:
-            vm = VirtualMachineKM.get(uuid)
-            if not vm or\
-               vm.owner != 'k8s' or\
-               vm.cluster != vnc_kube_config.cluster_name():
-                continue
-            if not vm.virtual_router and vm.pod_node and vm.node_ip:
-                self._link_vm_to_node(vm, vm.pod_node, vm.node_ip)
+    def _sync_pod_vm(self, full_sync=True):
+        with take_keys(self._created_vms, self._deleted_pods) as uuid_set:
+            if full_sync:
+                pod_uuid_set = set(PodKM.keys())
+                deleted_pod_set = set(VirtualMachineKM.keys()) - pod_uuid_set
+                unlinked_vm_set = pod_uuid_set
+            else:
+                # A vm can only have lost its pod if either of them changed
+                # since the last run, and can only be unlinked if it was
+                # just created or could not be linked before.
+                deleted_pod_set = set(uuid for uuid in uuid_set
+                                      if uuid not in PodKM)
+                unlinked_vm_set = (uuid_set | self._unlinked_vms) - \
+                    deleted_pod_set
+            for pod_uuid in deleted_pod_set:
+                vm = VirtualMachineKM.get(pod_uuid)
+                if vm and vm.owner == 'k8s' and\
+                   vm.cluster == vnc_kube_config.cluster_name():
+                    self._create_pod_event('delete', pod_uuid, vm)
+                uuid_set.discard(pod_uuid)
+            for uuid in unlinked_vm_set:
+                vm = VirtualMachineKM.get(uuid)
+                if uuid not in PodKM or not vm or\
+                   vm.owner != 'k8s' or\
+                   vm.cluster != vnc_kube_config.cluster_name():
+                    self._unlinked_vms.discard(uuid)
+                elif not vm.virtual_router and vm.pod_node and vm.node_ip:
+                    # Vms which fail to link are kept in _unlinked_vms.
+                    self._link_vm_to_node(vm, vm.pod_node, vm.node_ip)
+                else:
+                    self._unlinked_vms.discard(uuid)
+                uuid_set.discard(uuid)
         return
 
-    def pod_timer(self):
-        self._sync_pod_vm()
+    def pod_timer(self, full_sync=True):
+        self._sync_pod_vm(full_sync)
         return
 
     def process(self, event):
@@ -534,8 +589,6 @@ class VncPod(VncCommon):
         pod_id = event['object']['metadata'].get('uid')
         labels = event['object']['metadata'].get('labels', {})
 
-        print("%s - Got %s %s %s:%s:%s"
-              %(self._name, event_type, kind, pod_namespace, pod_name, pod_id))
         self._logger.debug("%s - Got %s %s %s:%s:%s"
                            %(self._name, event_type, kind, pod_namespace,
                              pod_name, pod_id))
@@ -17,6 +17,7 @@ from kube_manager.vnc.config_db import (FirewallPolicyKM, FirewallRuleKM,
                                         AddressGroupKM)
 from kube_manager.vnc.vnc_common import VncCommon
 import collections
+import gevent
 import json
 
 class FWSimpleAction(Enum):
@@ -414,6 +415,15 @@ class VncSecurityPolicy(VncCommon):
     allow_all_fw_policy_uuid = None
     deny_all_fw_policy_uuid = None
     ingress_svc_fw_policy_uuid = None
+    # Seconds during which the changes of the firewall policy refs of the
+    # APS are batched, a policy moved several times is written once.
+    aps_update_interval = 0.1
+    # Upper bound of the delay before a failed APS update is retried. The
+    # delay doubles with each consecutive failure.
+    aps_update_max_retry_interval = 30
+    _aps_pending_updates = {}
+    _aps_update_greenlet = None
+    _aps_update_retry_interval = None
 
     def __init__(self, vnc_lib, get_tags_fn):
         self._k8s_event_type = 'VncSecurityPolicy'
@@ -434,6 +444,11 @@ class VncSecurityPolicy(VncCommon):
         VncSecurityPolicy.allow_all_fw_policy_uuid = None
         VncSecurityPolicy.deny_all_fw_policy_uuid = None
         VncSecurityPolicy.ingress_svc_fw_policy_uuid = None
+        if VncSecurityPolicy._aps_update_greenlet is not None:
+            VncSecurityPolicy._aps_update_greenlet.kill()
+            VncSecurityPolicy._aps_update_greenlet = None
+        VncSecurityPolicy._aps_pending_updates = {}
+        VncSecurityPolicy._aps_update_retry_interval = None
 
     @staticmethod
     def construct_sequence_number(seq_num):
@@ -802,29 +817,108 @@ class VncSecurityPolicy(VncCommon):
         return rule_uuid
 
     @classmethod
-    def _move_trailing_firewall_policies(cls, aps_obj, tail_sequence):
+    def _get_aps_firewall_policies(cls):
+        """Firewall policies of the cluster APS, from our cache with the
+        changes not yet written to the api server applied.
+        """
+        aps = ApplicationPolicySetKM.locate(cls.cluster_aps_uuid)
+        fw_policies = dict(aps.firewall_policies)
+        for fw_policy_uuid, ref in cls._aps_pending_updates.iteritems():
+            if ref is None:
+                fw_policies.pop(fw_policy_uuid, None)
+            else:
+                fw_policies[fw_policy_uuid] = ref
+        return fw_policies
+
+    @classmethod
+    def _set_aps_firewall_policy(cls, fw_policy_uuid, sequence):
+        fw_policy = FirewallPolicyKM.locate(fw_policy_uuid)
+        cls._aps_pending_updates[fw_policy_uuid] =\
+            (fw_policy.fq_name, sequence.get_sequence())
+
+    @classmethod
+    def _schedule_aps_update(cls, interval=None):
+        # Firewall policies added within the update interval are written to
+        # the APS together.
+        if cls._aps_update_greenlet is None:
+            if interval is None:
+                interval = cls.aps_update_interval
+            cls._aps_update_greenlet = gevent.spawn_later(
+                interval, cls._update_aps)
+
+    @classmethod
+    def _write_aps_firewall_policy(cls, fw_policy_uuid, ref):
+        """Write the ref of one firewall policy of the cluster APS, or
+        remove it if ref is None. The other refs of the APS, including the
+        ones we have not been notified of yet, are left alone.
+        """
+        if ref is None:
+            cls.vnc_lib.ref_update('application-policy-set',
+                cls.cluster_aps_uuid, 'firewall-policy', fw_policy_uuid,
+                None, 'DELETE')
+        else:
+            cls.vnc_lib.ref_update('application-policy-set',
+                cls.cluster_aps_uuid, 'firewall-policy', fw_policy_uuid,
+                None, 'ADD', FirewallSequence(sequence=ref[1]))
+
+        # Our cache is refreshed from the notification of this update, until
+        # then it holds what was written.
+        aps = ApplicationPolicySetKM.locate(cls.cluster_aps_uuid)
+        if ref is None:
+            aps.firewall_policies.pop(fw_policy_uuid, None)
+        else:
+            aps.firewall_policies[fw_policy_uuid] = ref
+        # A change made while the update was in flight stays pending.
+        if fw_policy_uuid in cls._aps_pending_updates and\
+           cls._aps_pending_updates[fw_policy_uuid] == ref:
+            del cls._aps_pending_updates[fw_policy_uuid]
+
+    @classmethod
+    def _update_aps(cls, retry=True):
+        cls._aps_update_greenlet = None
+        for fw_policy_uuid, ref in cls._aps_pending_updates.items():
+            try:
+                cls._write_aps_firewall_policy(fw_policy_uuid, ref)
+            except Exception as e:
+                # Pending changes are kept and the update is retried, backing
+                # off while the failures persist.
+                if cls._aps_update_retry_interval is None:
+                    cls._aps_update_retry_interval = cls.aps_update_interval
+                cls._aps_update_retry_interval = min(
+                    cls._aps_update_retry_interval * 2,
+                    cls.aps_update_max_retry_interval)
+                vnc_kube_config.logger().error(
+                    "Failed to update application policy set %s, retrying in "
+                    "%s seconds: %s" % (cls.cluster_aps_uuid,
+                                        cls._aps_update_retry_interval,
+                                        str(e)))
+                cls._schedule_aps_update(cls._aps_update_retry_interval)
+                if not retry:
+                    raise
+                return
+        cls._aps_update_retry_interval = None
+
+    @classmethod
+    def flush_aps_update(cls):
+        """Write the pending APS changes now, raising if a write fails."""
+        if cls._aps_update_greenlet is not None:
+            cls._aps_update_greenlet.kill()
+        cls._update_aps(retry=False)
+
+    @classmethod
+    def _move_trailing_firewall_policies(cls, tail_sequence):
         sequence_num = float(tail_sequence.get_sequence())
         if cls.deny_all_fw_policy_uuid:
             sequence = cls.construct_sequence_number(sequence_num)
-            try:
-                fw_policy_obj = cls.vnc_lib.firewall_policy_read(
-                                    id=cls.deny_all_fw_policy_uuid)
-            except NoIdError:
-                raise
-            aps_obj.add_firewall_policy(fw_policy_obj, sequence)
+            cls._set_aps_firewall_policy(cls.deny_all_fw_policy_uuid, sequence)
             sequence_num += 1
 
         if cls.allow_all_fw_policy_uuid:
             sequence = cls.construct_sequence_number(sequence_num)
-            try:
-                fw_policy_obj = cls.vnc_lib.firewall_policy_read(
-                                    id=cls.allow_all_fw_policy_uuid)
-            except NoIdError:
-                raise
-            aps_obj.add_firewall_policy(fw_policy_obj, sequence)
+            cls._set_aps_firewall_policy(cls.allow_all_fw_policy_uuid,
+                                         sequence)
             sequence_num += 1
 
-        cls.vnc_lib.application_policy_set_update(aps_obj)
         return cls.construct_sequence_number(sequence_num)
 
     @classmethod
@@ -832,52 +926,26 @@ class VncSecurityPolicy(VncCommon):
         if not cls.cluster_aps_uuid:
             raise Exception("Cluster Application Policy Set not available.")
 
-        aps_obj = cls.vnc_lib.application_policy_set_read(
-            id=cls.cluster_aps_uuid)
+        # The position of the policy is determined from our cache of the
+        # APS and of its firewall policies, and the APS is updated later.
+        fw_policies = cls._get_aps_firewall_policies()
 
-        try:
-            new_fw_policy_obj = cls.vnc_lib.firewall_policy_read(
-                                    id=fw_policy_uuid)
-        except NoIdError:
-            raise
+        # Return if the firewall policy is already found on this APS.
+        if fw_policy_uuid in fw_policies:
+            return
 
-        last_obj = False
         last_entry_sequence = None
-        last_k8s_obj = None
         last_k8s_obj_sequence = None
-        fw_policy_refs = aps_obj.get_firewall_policy_refs()
-        for fw_policy in fw_policy_refs if fw_policy_refs else []:
-            try:
-                fw_policy_obj = cls.vnc_lib.firewall_policy_read(
-                                    id=fw_policy['uuid'])
-            except NoIdError:
-                # TBD Error handling.
-                pass
-
-            # Return if the firewall policy is already found on this APS.
-            if new_fw_policy_obj.get_fq_name() == fw_policy_obj.get_fq_name():
-                return
-
-            k8s_obj = False
-            last_obj = False
-
-            annotations = fw_policy_obj.get_annotations()
-            if annotations:
-                for kvp in annotations.get_key_value_pair() or []:
-                    if kvp.key == 'owner' and kvp.value == 'k8s':
-                        k8s_obj = True
-                    elif kvp.key == 'tail' and kvp.value == 'True':
-                        last_obj = True
-
-            if k8s_obj and last_obj:
-                last_k8s_obj = fw_policy_obj
-                last_k8s_obj_sequence = fw_policy['attr'].get_sequence()
+        for policy_uuid, (fq_name, fw_policy_sequence) in fw_policies.iteritems():
+            fw_policy = FirewallPolicyKM.get(policy_uuid)
+            if fw_policy and fw_policy.owner == 'k8s' and\
+               fw_policy.tail == 'True':
+                last_k8s_obj_sequence = fw_policy_sequence
 
             if not last_entry_sequence:
-                last_entry_sequence = fw_policy['attr'].get_sequence()
-            elif float(last_entry_sequence) < float(fw_policy['attr'].get_sequence()):
-                   last_entry_sequence = fw_policy['attr'].get_sequence()
-
+                last_entry_sequence = fw_policy_sequence
+            elif float(last_entry_sequence) < float(fw_policy_sequence):
+                last_entry_sequence = fw_policy_sequence
 
         #
         # Determine the sequence number.
@@ -885,40 +953,33 @@ class VncSecurityPolicy(VncCommon):
 
         # Start with presumption that this is the first.
         sequence = cls.construct_sequence_number('1.0')
-        if len(fw_policy_refs if fw_policy_refs else []):
+        if len(fw_policies):
             last_k8s_fw_policy_sequence = \
                 cls.construct_sequence_number(
                     float(last_entry_sequence) + float('1.0'))
             if last_k8s_obj_sequence:
-                tail_sequence = cls._move_trailing_firewall_policies(aps_obj,
+                # Move the existing last k8s FW policy to the end of the list.
+                tail_sequence = cls._move_trailing_firewall_policies(
                                     last_k8s_fw_policy_sequence)
                 if append_after_tail:
                     sequence = cls.construct_sequence_number(
                         float(tail_sequence.get_sequence()))
                 else:
                     sequence = FirewallSequence(sequence=last_k8s_obj_sequence)
-                # Move the existing last k8s FW policy to the end of the list.
             else:
                 sequence = last_k8s_fw_policy_sequence
 
-        aps_obj.add_firewall_policy(new_fw_policy_obj, sequence)
-        cls.vnc_lib.application_policy_set_update(aps_obj)
+        cls._set_aps_firewall_policy(fw_policy_uuid, sequence)
+        cls._schedule_aps_update()
 
     @classmethod
     def remove_firewall_policy(cls, name, namespace, is_global=False):
         if not cls.cluster_aps_uuid:
             raise Exception("Cluster Application Policy Set not available.")
 
-        aps_obj = cls.vnc_lib.application_policy_set_read(
-            id=cls.cluster_aps_uuid)
-
-        try:
-            pm_obj = cls.vnc_lib.policy_management_read(
-                fq_name=aps_obj.get_parent_fq_name())
-        except NoIdError:
-            raise
-
-        fw_policy_fq_name = pm_obj.get_fq_name() +\
+        aps = ApplicationPolicySetKM.locate(cls.cluster_aps_uuid)
+        pm = PolicyManagementKM.locate(aps.parent_uuid)
+        fw_policy_fq_name = pm.fq_name +\
             [cls.get_firewall_policy_name(name, namespace, is_global)]
 
         fw_policy_uuid = FirewallPolicyKM.get_fq_name_to_uuid(fw_policy_fq_name)
@@ -927,13 +988,9 @@ class VncSecurityPolicy(VncCommon):
             # We are not aware of this firewall policy.
             return
 
-        try:
-            fw_policy_obj = cls.vnc_lib.firewall_policy_read(id=fw_policy_uuid)
-        except NoIdError:
-            raise
-
-        aps_obj.del_firewall_policy(fw_policy_obj)
-        cls.vnc_lib.application_policy_set_update(aps_obj)
+        # The firewall policy is deleted after its removal from the APS,
+        # so the ref is removed right away and a failure is raised.
+        cls._write_aps_firewall_policy(fw_policy_uuid, None)
 
     @classmethod
     def add_firewall_rule(cls, fw_policy_uuid, fw_rule_uuid):
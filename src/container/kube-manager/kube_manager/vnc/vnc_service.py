@@ -17,6 +17,7 @@ import link_local_manager as ll_mgr
 from vnc_kubernetes_config import VncKubernetesConfig as vnc_kube_config
 from vnc_common import VncCommon
 from kube_manager.common.utils import get_fip_pool_fq_name_from_dict_string
+from kube_manager.common.utils import take_keys
 from kube_manager.vnc.label_cache import XLabelCache
 
 class VncService(VncCommon):
@@ -35,6 +36,9 @@ class VncService(VncCommon):
         self._queue = vnc_kube_config.queue()
         self.kube = vnc_kube_config.kube()
         self._fip_pool_obj = None
+        # Uuids of the loadbalancers to be checked by the next timer run.
+        self._created_lbs = LoadbalancerKM.watch_created()
+        self._deleted_services = ServiceKM.watch_deleted()
 
         # Cache kubernetes API server params.
         self._kubernetes_api_server = self._args.kubernetes_api_server
@@ -532,36 +536,46 @@ class VncService(VncCommon):
             self._queue.put(event)
         return
 
-    def _sync_service_lb(self):
-        lb_uuid_set = set(LoadbalancerKM.keys())
-        service_uuid_set = set(ServiceKM.keys())
-        deleted_uuid_set = lb_uuid_set - service_uuid_set
-        for uuid in deleted_uuid_set:
-            lb = LoadbalancerKM.get(uuid)
-            if not lb:
-                continue
-            if not lb.annotations:
-                continue
-            owner = None
-            kind = None
-            cluster = None
-            for kvp in lb.annotations['key_value_pair'] or []:
-                if kvp['key'] == 'cluster':
-                    cluster = kvp['value']
-                elif kvp['key'] == 'owner':
-                    owner = kvp['value']
-                elif kvp['key'] == 'kind':
-                    kind = kvp['value']
-
-                if cluster == vnc_kube_config.cluster_name() and \
-                   owner == 'k8s' and \
-                   kind == self._k8s_event_type:
-                    self._create_service_event('delete', uuid, lb)
-                    break
+    def _sync_service_lb(self, full_sync=True):
+        # Changed keys are put back if the sync fails, except for those whose
+        # delete event was already queued.
+        with take_keys(self._created_lbs,
+                       self._deleted_services) as changed_uuid_set:
+            if full_sync:
+                lb_uuid_set = set(LoadbalancerKM.keys())
+            else:
+                # A loadbalancer can only have lost its service if either of
+                # them changed since the last run.
+                lb_uuid_set = set(changed_uuid_set)
+            deleted_uuid_set = set(uuid for uuid in lb_uuid_set
+                                   if uuid not in ServiceKM)
+            for uuid in deleted_uuid_set:
+                lb = LoadbalancerKM.get(uuid)
+                if not lb:
+                    continue
+                if not lb.annotations:
+                    continue
+                owner = None
+                kind = None
+                cluster = None
+                for kvp in lb.annotations['key_value_pair'] or []:
+                    if kvp['key'] == 'cluster':
+                        cluster = kvp['value']
+                    elif kvp['key'] == 'owner':
+                        owner = kvp['value']
+                    elif kvp['key'] == 'kind':
+                        kind = kvp['value']
+
+                    if cluster == vnc_kube_config.cluster_name() and \
+                       owner == 'k8s' and \
+                       kind == self._k8s_event_type:
+                        self._create_service_event('delete', uuid, lb)
+                        changed_uuid_set.discard(uuid)
+                        break
         return
 
-    def service_timer(self):
-        self._sync_service_lb()
+    def service_timer(self, full_sync=True):
+        self._sync_service_lb(full_sync)
         return
 
     def process(self, event):
@@ -577,9 +591,6 @@ class VncService(VncCommon):
         loadBalancerIp  = event['object']['spec'].get('loadBalancerIP', None)
         externalIps  = event['object']['spec'].get('externalIPs', [])
 
-        print("%s - Got %s %s %s:%s:%s"
-              %(self._name, event_type, kind,
-              service_namespace, service_name, service_id))
         self.logger.debug("%s - Got %s %s %s:%s:%s"
               %(self._name, event_type, kind,
               service_namespace, service_name, service_id))